@@ -0,0 +1,133 @@
+"""Token-bucket admission control for the USSD endpoint.
+
+Each phone number and each service code gets a bucket of `burst` tokens
+refilled at `rate` per second; a hop takes one token from both, and only
+when both have one. Buckets are two floats per key in a plain dict. A bucket
+that has refilled completely is indistinguishable from a new one, so idle
+buckets are dropped by a sweep that runs inline every few seconds (or as soon
+as the table grows past its bound).
+"""
+
+import contextlib
+import os
+import threading
+import time
+
+from .instrumentation import REGISTRY
+
+USSD_PHONE_RATE = float(os.getenv('USSD_PHONE_RATE', '1'))  # hops per second per phone number (0 = no limit)
+USSD_PHONE_BURST = float(os.getenv('USSD_PHONE_BURST', '10'))
+USSD_SERVICE_CODE_RATE = float(os.getenv('USSD_SERVICE_CODE_RATE', '200'))  # hops per second per shortcode (0 = no limit)
+USSD_SERVICE_CODE_BURST = float(os.getenv('USSD_SERVICE_CODE_BURST', '400'))
+ADMISSION_MAX_BUCKETS = int(os.getenv('ADMISSION_MAX_BUCKETS', '100000'))
+ADMISSION_SWEEP_INTERVAL = float(os.getenv('ADMISSION_SWEEP_INTERVAL', '10'))  # seconds
+
+ADMISSION_REJECTED = REGISTRY.counter(
+    'fwis_ussd_rejected_total', 'USSD hops refused by admission control, by the limit that was hit', ['limit']
+)
+
+
+class TokenBuckets:
+    """Token buckets for many keys sharing one rate and burst"""
+
+    def __init__(self, rate, burst, max_buckets=ADMISSION_MAX_BUCKETS, sweep_interval=ADMISSION_SWEEP_INTERVAL):
+        self.rate = rate
+        self.burst = burst
+        self.max_buckets = max_buckets
+        self.sweep_interval = sweep_interval
+        self._buckets = {}  # key -> [tokens, last refill (monotonic)]
+        self._lock = threading.Lock()
+        self._next_sweep = 0.0  # set by the first sweep, on the clock take() is given
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def take(self, key, now=None):
+        """Take one token for key; False if its bucket is empty"""
+        if self.rate <= 0:
+            return True
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            bucket = self._refill_locked(key, now)
+            if bucket[0] < 1:
+                return False
+            bucket[0] -= 1
+            return True
+
+    def _refill_locked(self, key, now):
+        """key's bucket ([tokens, last refill]) brought up to now, created full if missing"""
+        if now >= self._next_sweep or len(self._buckets) > self.max_buckets:
+            self._sweep_locked(now)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [self.burst, now]
+            return bucket
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        return bucket
+
+    def sweep(self, now=None):
+        """Drop buckets that have refilled completely; returns how many were removed"""
+        with self._lock:
+            return self._sweep_locked(now if now is not None else time.monotonic())
+
+    def _sweep_locked(self, now):
+        self._next_sweep = now + self.sweep_interval
+        idle = [key for key, (tokens, at) in self._buckets.items()
+                if tokens + (now - at) * self.rate >= self.burst]
+        for key in idle:
+            del self._buckets[key]
+        removed = len(idle)
+        if len(self._buckets) > self.max_buckets:
+            # Still over the bound with every bucket in use: forget the oldest half
+            # (a forgotten caller just starts again from a full bucket)
+            for key in list(self._buckets)[:len(self._buckets) - self.max_buckets // 2]:
+                del self._buckets[key]
+                removed += 1
+        self.evictions += removed
+        return removed
+
+
+class AdmissionController:
+    """Per-phone-number and per-service-code limits in front of USSDService.handle_ussd"""
+
+    def __init__(self, phone_rate=USSD_PHONE_RATE, phone_burst=USSD_PHONE_BURST,
+                 service_code_rate=USSD_SERVICE_CODE_RATE, service_code_burst=USSD_SERVICE_CODE_BURST):
+        self.phones = TokenBuckets(phone_rate, phone_burst)
+        self.service_codes = TokenBuckets(service_code_rate, service_code_burst)
+
+    def admit(self, phone_number, service_code):
+        """Return None if the hop may proceed, else the name of the limit it hit.
+
+        Both buckets are checked before either is charged, so a refused hop
+        costs nothing: a hop turned away by the shortcode limit does not use
+        up the caller's own allowance, and one refused by the phone limit does
+        not use up the shortcode's. The phone limit is reported first.
+        """
+        now = time.monotonic()
+        limits = [(name, buckets, key) for name, buckets, key in (
+            ('phone', self.phones, phone_number),
+            ('service_code', self.service_codes, service_code),
+        ) if buckets.rate > 0]
+        # Always locked in the same order (phones, then service codes)
+        with contextlib.ExitStack() as stack:
+            for _, buckets, _ in limits:
+                stack.enter_context(buckets._lock)
+            charged = []
+            for name, buckets, key in limits:
+                bucket = buckets._refill_locked(key, now)
+                if bucket[0] < 1:
+                    ADMISSION_REJECTED.inc(1, name)
+                    return name
+                charged.append(bucket)
+            for bucket in charged:
+                bucket[0] -= 1
+        return None
+
+    def stats(self):
+        return {
+            'phone_buckets': len(self.phones),
+            'service_code_buckets': len(self.service_codes),
+            'rejected': {labels[0]: count for labels, count in ADMISSION_REJECTED.values().items()},
+        }
@@ -0,0 +1,232 @@
+"""Farming advice as data.
+
+Each rule has an optional `group` (only the first matching rule of a group
+applies), a `when` mapping of conditions that must all hold, and advice
+lines per language. Supported conditions:
+
+    temp_above / temp_below          degrees C, strict comparison
+    humidity_above / humidity_below  percent, strict comparison
+    conditions / not_conditions      condition classes (see CONDITION_CLASSES)
+    regions                          location names the rule is limited to
+    dry_days_at_least                days in a row without rain (from the history)
+    rain_week_above                  mm of rain over the last 7 days, strict comparison
+
+The trend conditions never hold when the reading carries no `trends`
+(no observation history for the location yet).
+
+Rules are compiled once into checks over a bucketed key, so the advice for
+any (temperature bucket, humidity band, condition class, language, region,
+trend bucket) is computed once and then served from a bounded cache.
+"""
+
+import os
+from functools import lru_cache
+from .gazetteer import normalize_place_name
+from .instrumentation import STAGE_SECONDS
+
+ADVICE_CACHE_SIZE = int(os.getenv('ADVICE_CACHE_SIZE', '1024'))
+
+DEFAULT_LANGUAGE = 'en'
+
+# Checked in order; the first class with a matching keyword wins
+CONDITION_CLASSES = (
+    ('wet', ('rain', 'drizzle', 'thunderstorm')),
+    ('bright', ('sun', 'clear')),
+)
+OTHER_CONDITION = 'other'
+
+ADVICE_INTRO = {
+    'en': "FARMING TIPS:\n",
+    'luo': "PUONJ MAG PURO:\n", # FARMING TIPS
+}
+
+DEFAULT_ADVICE = {
+    'en': ("- Practice good farming based on current conditions and your specific crop needs.",),
+    'luo': ("- Tim pur maber kendo luw puonj mag puro mapile.",), # Farm well and follow regular farming advice.
+}
+
+_DRY_SEASON_TEXT = {
+    'en': (
+        "- Sunny/Dry Season: Harvest mature crops. Irrigate efficiently, preferably in the evening or early morning.",
+        "- Sunny/Dry Season: Implement pest control measures as needed.",
+    ),
+    'luo': (
+        "- Kinde oro: Keyo cham mochek. Pwodhi kodi odhiambo kata gokinyi.", # Harvest mature crops. Irrigate in the evening or early morning.
+        "- Kinde oro: Bed motang' gi kute/kuodi. Tim chenro mag kweroogi.", # Watch for pests. Implement pest control.
+    ),
+}
+
+ADVICE_RULES = [
+    {
+        'id': 'rainy_season',
+        'group': 'season',
+        'when': {'conditions': ('wet',)},
+        'text': {
+            'en': (
+                "- Rainy Season: Plant suitable crops and vegetables. Ensure good drainage.",
+                "- Rainy Season: Monitor crops for diseases common in wet conditions.",
+            ),
+            'luo': (
+                "- Kinde koth: Pidho cham kod povrigo. Ket laro ne pi.", # Plant crops and vegetables. Manage water runoff.
+                "- Kinde koth: Ng'i kodi pile mondo kik two mar koth ogogi.", # Monitor crops regularly for rain-related diseases.
+            ),
+        },
+    },
+    {
+        'id': 'dry_season_hot',
+        'group': 'season',
+        'when': {'temp_above': 28},
+        'text': _DRY_SEASON_TEXT,
+    },
+    {
+        'id': 'dry_season_bright',
+        'group': 'season',
+        'when': {'conditions': ('bright',)},
+        'text': _DRY_SEASON_TEXT,
+    },
+    {
+        'id': 'general',
+        'group': 'season',
+        'when': {},
+        'text': {
+            'en': ("- General Conditions: Maintain your farm. Follow your planting and harvesting schedule.",),
+            'luo': ("- Tim pur motegno. Luw chenro mar puro ni mondo iyud keyo mang'eny.",), # Farm diligently. Follow your farming schedule.
+        },
+    },
+    {
+        'id': 'high_humidity',
+        'when': {'humidity_above': 75},
+        'text': {
+            'en': ("- High humidity: Be vigilant for fungal diseases.",),
+            'luo': ("- Piny obo ahinya. Ng'i kodi maber mondo two fungal kik donji.",), # Watch for fungal diseases.
+        },
+    },
+    {
+        'id': 'cool_weather',
+        'when': {'temp_below': 18, 'not_conditions': ('wet',)},
+        'text': {
+            'en': ("- Cool weather: Protect sensitive crops from potential cold damage.",),
+            'luo': ("- Piny ng'ich matin. Rit kodi moko ma yotnegi koyo.",), # Protect sensitive crops from cold.
+        },
+    },
+    {
+        'id': 'dry_spell',
+        'when': {'dry_days_at_least': 5, 'not_conditions': ('wet',)},
+        'text': {
+            'en': ("- No rain for 5+ days: Mulch around crops and water seedlings early or late in the day.",),
+            'luo': ("- Koth ok ochwe ndalo 5 kata moloyo. Um lowo mar cham gi buya, kendo ol pi ne yiend cham manyien okinyi kata odhiambo.",), # No rain for 5+ days: mulch, water seedlings morning or evening.
+        },
+    },
+    {
+        'id': 'wet_week',
+        'when': {'rain_week_above': 50},
+        'text': {
+            'en': ("- Over 50mm of rain this week: Clear drainage channels and hold off on fertilizer.",),
+            'luo': ("- Koth mang'eny ochwe jumbani (moloyo 50mm). Los yore mag pi kendo kik iket mbolea sani.",), # Heavy rain this week: clear drainage, hold off on fertilizer.
+        },
+    },
+]
+
+
+@lru_cache(maxsize=256)
+def classify_condition(description):
+    """Map an OpenWeatherMap description to a condition class"""
+    description = (description or '').lower()
+    for name, keywords in CONDITION_CLASSES:
+        if any(keyword in description for keyword in keywords):
+            return name
+    return OTHER_CONDITION
+
+
+class AdviceEngine:
+    """Compiled, memoized evaluation of ADVICE_RULES"""
+
+    def __init__(self, rules=ADVICE_RULES, cache_size=ADVICE_CACHE_SIZE):
+        whens = [rule.get('when', {}) for rule in rules]
+        self._temp_above = sorted({w['temp_above'] for w in whens if 'temp_above' in w})
+        self._temp_below = sorted({w['temp_below'] for w in whens if 'temp_below' in w})
+        self._humidity_above = sorted({w['humidity_above'] for w in whens if 'humidity_above' in w})
+        self._humidity_below = sorted({w['humidity_below'] for w in whens if 'humidity_below' in w})
+        self._dry_days = sorted({w['dry_days_at_least'] for w in whens if 'dry_days_at_least' in w})
+        self._rain_week_above = sorted({w['rain_week_above'] for w in whens if 'rain_week_above' in w})
+        self._has_regions = any('regions' in w for w in whens)
+        self._rules = [self._compile(rule) for rule in rules]
+        self._evaluate = lru_cache(maxsize=cache_size)(self._evaluate_uncached)
+
+    @staticmethod
+    def _bucket(value, above, below):
+        # One flag per threshold: enough to decide every rule, nothing more
+        return tuple(value > t for t in above) + tuple(value < t for t in below)
+
+    def _compile(self, rule):
+        when = rule.get('when', {})
+        checks = []
+        if 'temp_above' in when:
+            i = self._temp_above.index(when['temp_above'])
+            checks.append(lambda key, i=i: key[0][i])
+        if 'temp_below' in when:
+            i = len(self._temp_above) + self._temp_below.index(when['temp_below'])
+            checks.append(lambda key, i=i: key[0][i])
+        if 'humidity_above' in when:
+            i = self._humidity_above.index(when['humidity_above'])
+            checks.append(lambda key, i=i: key[1][i])
+        if 'humidity_below' in when:
+            i = len(self._humidity_above) + self._humidity_below.index(when['humidity_below'])
+            checks.append(lambda key, i=i: key[1][i])
+        if 'conditions' in when:
+            allowed = frozenset(when['conditions'])
+            checks.append(lambda key: key[2] in allowed)
+        if 'not_conditions' in when:
+            excluded = frozenset(when['not_conditions'])
+            checks.append(lambda key: key[2] not in excluded)
+        if 'regions' in when:
+            regions = frozenset(normalize_place_name(r) for r in when['regions'])
+            checks.append(lambda key: key[4] in regions)
+        if 'dry_days_at_least' in when:
+            i = self._dry_days.index(when['dry_days_at_least'])
+            checks.append(lambda key, i=i: key[5] is not None and key[5][i])
+        if 'rain_week_above' in when:
+            i = len(self._dry_days) + self._rain_week_above.index(when['rain_week_above'])
+            checks.append(lambda key, i=i: key[5] is not None and key[5][i])
+        return rule.get('group'), tuple(checks), rule['text']
+
+    def _trend_bucket(self, trends):
+        if not trends:
+            return None
+        dry_days = trends.get('dry_days', 0)
+        rain_week = trends.get('rain_week_mm', 0.0)
+        return tuple(dry_days >= t for t in self._dry_days) + tuple(rain_week > t for t in self._rain_week_above)
+
+    def _evaluate_uncached(self, temp_bucket, humidity_band, condition_class, language, region, trend_bucket=None):
+        key = (temp_bucket, humidity_band, condition_class, language, region, trend_bucket)
+        lines = []
+        matched_groups = set()
+        for group, checks, text in self._rules:
+            if group is not None and group in matched_groups:
+                continue
+            if all(check(key) for check in checks):
+                lines.extend(text.get(language) or text[DEFAULT_LANGUAGE])
+                if group is not None:
+                    matched_groups.add(group)
+        if not lines:
+            lines = DEFAULT_ADVICE[language]
+        return ADVICE_INTRO[language] + '\n'.join(lines)
+
+    def advise(self, weather_data, language='en', region=None):
+        """Return the localized farming tips text for a weather reading (and its optional `trends`)"""
+        if language not in ADVICE_INTRO:
+            language = DEFAULT_LANGUAGE
+        temp = weather_data.get('temperature', 0)
+        humidity = weather_data.get('humidity', 0)
+        with STAGE_SECONDS.time('advice'):
+            return self._evaluate(
+                self._bucket(temp, self._temp_above, self._temp_below),
+                self._bucket(humidity, self._humidity_above, self._humidity_below),
+                classify_condition(weather_data.get('description', '')),
+                language,
+                normalize_place_name(region) if self._has_regions and region else None,
+                self._trend_bucket(weather_data.get('trends'))
+            )
+
+    def cache_info(self):
+        return self._evaluate.cache_info()
@@ -0,0 +1,427 @@
+"""Severe-weather SMS alerts for farmers who have used the USSD service.
+
+Three parts:
+  - rules checked against each location's 3-hourly forecast (evaluate_forecast),
+  - a subscriber registry fed from USSD usage (SubscriberRegistry),
+  - a dispatcher that sends each alert as a few bulk SMS calls under a rate
+    limit, retries failures and never sends the same alert to a number twice
+    (SmsDispatcher), even with every worker process running the pipeline.
+AlertPipeline ties them together on a background thread.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict, namedtuple
+from datetime import datetime, timezone
+from .gazetteer import normalize_place_name
+from .instrumentation import REGISTRY
+from .localization import CATALOG, DEFAULT_LANGUAGE
+
+logger = logging.getLogger(__name__)
+
+ALERTS_ENABLED = os.getenv('ALERTS_ENABLED', '0').lower() in ('1', 'true', 'yes')
+ALERT_INTERVAL = int(os.getenv('ALERT_INTERVAL', '1800'))  # seconds between forecast checks
+ALERT_WINDOW_HOURS = int(os.getenv('ALERT_WINDOW_HOURS', '24'))
+HEAVY_RAIN_3H_MM = float(os.getenv('HEAVY_RAIN_3H_MM', '10'))  # one 3-hour slot at least this wet...
+HEAVY_RAIN_WINDOW_MM = float(os.getenv('HEAVY_RAIN_WINDOW_MM', '25'))  # ...or this much over the window
+SUBSCRIBER_DB_PATH = os.getenv('SUBSCRIBER_DB_PATH', 'subscribers.sqlite3')
+SMS_API_URL = os.getenv('SMS_API_URL', '')  # empty = Africa's Talking SDK; else an AT-compatible endpoint
+SMS_SENDER_ID = os.getenv('SMS_SENDER_ID', '')
+SMS_BATCH_SIZE = int(os.getenv('SMS_BATCH_SIZE', '1000'))  # recipients per bulk call
+SMS_RATE_LIMIT = float(os.getenv('SMS_RATE_LIMIT', '2'))  # bulk calls per second
+SMS_MAX_RETRIES = int(os.getenv('SMS_MAX_RETRIES', '3'))
+SMS_BACKOFF = float(os.getenv('SMS_BACKOFF', '1.0'))  # seconds, doubled per retry
+SMS_TIMEOUT = float(os.getenv('SMS_TIMEOUT', '30'))  # seconds per bulk call
+
+# Rules as data: a rule fires on the first 3-hourly slot in the window that matches it;
+# the event it announces runs until the slots stop matching
+ALERT_RULES = (
+    {'id': 'thunderstorm', 'weather_ids': (200, 299)},
+    {'id': 'heavy_rain', 'rain_3h_mm': HEAVY_RAIN_3H_MM, 'rain_window_mm': HEAVY_RAIN_WINDOW_MM},
+)
+
+# starts_at..ends_at spans the run of consecutive matching 3-hourly slots
+Alert = namedtuple('Alert', ['rule', 'location', 'starts_at', 'rain_mm', 'ends_at'], defaults=(None,))
+SLOT_SECONDS = 3 * 3600
+
+ALERTS_TRIGGERED = REGISTRY.counter('fwis_alerts_triggered_total', 'Alerts raised by forecast rules', ['rule'])
+SMS_CALLS = REGISTRY.counter('fwis_sms_calls_total', 'Bulk SMS API calls', ['outcome'])
+SMS_RECIPIENTS = REGISTRY.counter('fwis_sms_recipients_total', 'Alert recipients, by outcome', ['outcome'])
+
+
+def evaluate_forecast(forecast, location, now=None, window_hours=ALERT_WINDOW_HOURS, rules=ALERT_RULES):
+    """Return the Alerts a formatted forecast (from WeatherService.get_forecast) triggers.
+
+    Only 3-hourly slots starting within window_hours of now are considered.
+    """
+    if not forecast or 'error' in forecast:
+        return []
+    now = now if now is not None else time.time()
+    window = [item for item in forecast.get('forecast', ()) if now - 3 * 3600 < item['dt'] <= now + window_hours * 3600]
+    rain = [item.get('rain', {}).get('3h', 0.0) for item in window]
+    window_rain = sum(rain)
+
+    alerts = []
+    for rule in rules:
+        first = None
+        if 'weather_ids' in rule:
+            low, high = rule['weather_ids']
+            matches = [low <= item['weather'][0]['id'] <= high for item in window]
+            first = matches.index(True) if any(matches) else None
+        elif 'rain_3h_mm' in rule:
+            matches = [mm > 0 for mm in rain]  # the event lasts while it keeps raining
+            first = next((i for i, mm in enumerate(rain) if mm >= rule['rain_3h_mm']), None)
+            if first is None and window_rain >= rule['rain_window_mm']:
+                first = matches.index(True)
+        if first is not None:
+            last = first
+            while last + 1 < len(window) and matches[last + 1]:
+                last += 1
+            alerts.append(Alert(
+                rule['id'], location, window[first]['dt'], round(window_rain, 1), window[last]['dt'] + SLOT_SECONDS
+            ))
+    return alerts
+
+
+def alert_key(alert):
+    """Identity of a new weather event for deduplication: rule, location and when it starts"""
+    return f"{alert.rule}:{normalize_place_name(alert.location)}:{int(alert.starts_at)}"
+
+
+def render_alert(alert, language, utc_offset=0, catalog=CATALOG):
+    """Localized SMS text for an alert"""
+    entries = catalog.get(language) or catalog[DEFAULT_LANGUAGE]
+    starts = datetime.fromtimestamp(alert.starts_at + utc_offset, timezone.utc)
+    day_abbrev = starts.strftime('%a')
+    when = f"{entries['day_names'].get(day_abbrev, day_abbrev)} {starts.strftime('%H:%M')}"
+    return entries[f"alert_{alert.rule}_tpl"].format(location=alert.location, when=when, rain_mm=alert.rain_mm)
+
+
+class _SQLiteBacked:
+    """Per-thread SQLite connections (WAL) so several workers can share the file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+
+class SubscriberRegistry(_SQLiteBacked):
+    """Phone numbers that have used the USSD service, with their language and location.
+
+    record() is called on USSD hops, so it only writes when something changed.
+    """
+
+    def __init__(self, path=SUBSCRIBER_DB_PATH):
+        super().__init__(path)
+        self._known = {}
+        self._lock = threading.Lock()
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS subscribers ("
+            "phone_number TEXT PRIMARY KEY, language TEXT NOT NULL, location TEXT NOT NULL, "
+            "first_seen REAL NOT NULL, last_seen REAL NOT NULL)"
+        )
+
+    def record(self, phone_number, language, location):
+        if not phone_number:
+            return
+        value = (language, location)
+        if self._known.get(phone_number) == value:
+            return
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO subscribers (phone_number, language, location, first_seen, last_seen) "
+            "VALUES (?, ?, ?, ?, ?) ON CONFLICT(phone_number) DO UPDATE SET "
+            "language = excluded.language, location = excluded.location, last_seen = excluded.last_seen",
+            (phone_number, language, location, now, now)
+        )
+        with self._lock:
+            self._known[phone_number] = value
+
+    def record_many(self, rows):
+        """Bulk-load (phone_number, language, location) rows, e.g. from an import"""
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN")
+        conn.executemany(
+            "INSERT INTO subscribers (phone_number, language, location, first_seen, last_seen) "
+            "VALUES (?, ?, ?, ?, ?) ON CONFLICT(phone_number) DO UPDATE SET "
+            "language = excluded.language, location = excluded.location, last_seen = excluded.last_seen",
+            [(phone, language, location, now, now) for phone, language, location in rows]
+        )
+        conn.execute("COMMIT")
+
+    def by_location(self):
+        """Return {location: [(phone_number, language), ...]}"""
+        groups = defaultdict(list)
+        for phone_number, language, location in self._conn().execute(
+            "SELECT phone_number, language, location FROM subscribers"
+        ):
+            groups[location].append((phone_number, language))
+        return dict(groups)
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM subscribers").fetchone()[0]
+
+
+def _accepted_numbers(response):
+    """Numbers Africa's Talking accepted, from a bulk send response"""
+    recipients = response.get('SMSMessageData', {}).get('Recipients', [])
+    return {r['number'] for r in recipients if r.get('status') == 'Success'}
+
+
+class AfricasTalkingSmsSender:
+    """Bulk SMS through the Africa's Talking SDK (imported on first send)"""
+
+    def __init__(self, username, api_key, sender_id=SMS_SENDER_ID):
+        self.username = username
+        self.api_key = api_key
+        self.sender_id = sender_id or None
+        self._sms = None
+
+    def send(self, message, recipients):
+        if self._sms is None:
+            import africastalking
+            africastalking.initialize(username=self.username, api_key=self.api_key)
+            self._sms = africastalking.SMS
+        response = self._sms.send(message, list(recipients), sender_id=self.sender_id, enqueue=True)
+        return _accepted_numbers(response)
+
+
+class HttpSmsSender:
+    """Bulk SMS via an Africa's Talking-compatible REST endpoint (SMS_API_URL), e.g. a local fake"""
+
+    def __init__(self, url, username, api_key, sender_id=SMS_SENDER_ID, timeout=SMS_TIMEOUT):
+        self.url = url
+        self.username = username
+        self.api_key = api_key
+        self.sender_id = sender_id
+        self.timeout = timeout
+
+    def send(self, message, recipients):
+        import requests
+
+        data = {'username': self.username, 'to': ','.join(recipients), 'message': message, 'enqueue': 1}
+        if self.sender_id:
+            data['from'] = self.sender_id
+        response = requests.post(
+            self.url, data=data, timeout=self.timeout,
+            headers={'apiKey': self.api_key, 'Accept': 'application/json'}
+        )
+        response.raise_for_status()
+        return _accepted_numbers(response.json())
+
+
+def create_sms_sender(username, api_key, url=SMS_API_URL):
+    if url:
+        return HttpSmsSender(url, username, api_key)
+    return AfricasTalkingSmsSender(username, api_key)
+
+
+class SmsDispatcher(_SQLiteBacked):
+    """Sends alerts as rate-limited bulk SMS calls, with retries and per-number deduplication.
+
+    Each number is claimed for an alert key in the database before it is
+    sent, and only the process whose INSERT created the row sends it, so
+    workers running the pipeline side by side never alert a number twice.
+    Claims the provider did not accept are released for the next run.
+    Alerts for the same rule and location whose event windows overlap or
+    adjoin share one key (see event_key), so an ongoing storm is only
+    announced once.
+    """
+
+    def __init__(self, sender, path=SUBSCRIBER_DB_PATH, batch_size=SMS_BATCH_SIZE, rate_limit=SMS_RATE_LIMIT,
+                 max_retries=SMS_MAX_RETRIES, backoff=SMS_BACKOFF):
+        super().__init__(path)
+        self.sender = sender
+        self.batch_size = batch_size
+        self.min_interval = 1.0 / rate_limit if rate_limit > 0 else 0.0
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._next_call_at = 0.0
+        self._rate_lock = threading.Lock()
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS sent_alerts ("
+            "alert_key TEXT NOT NULL, phone_number TEXT NOT NULL, sent_at REAL NOT NULL, "
+            "PRIMARY KEY (alert_key, phone_number))"
+        )
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS alert_events ("
+            "alert_key TEXT PRIMARY KEY, rule TEXT NOT NULL, location TEXT NOT NULL, "
+            "starts_at REAL NOT NULL, ends_at REAL NOT NULL)"
+        )
+
+    def _wait_for_slot(self):
+        with self._rate_lock:
+            now = time.monotonic()
+            wait = self._next_call_at - now
+            self._next_call_at = max(now, self._next_call_at) + self.min_interval
+        if wait > 0:
+            time.sleep(wait)
+
+    def already_sent(self, key):
+        return {row[0] for row in self._conn().execute(
+            "SELECT phone_number FROM sent_alerts WHERE alert_key = ?", (key,)
+        )}
+
+    def _transaction(self, work):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")  # serializes with other workers' claims
+        try:
+            result = work(conn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    def event_key(self, alert, retention=7 * 86400):
+        """Key of the known event alert belongs to (same rule and location, windows overlapping or
+        adjoining), extending that event's window; a new event gets alert_key(alert)"""
+        location = normalize_place_name(alert.location)
+        ends_at = alert.ends_at if alert.ends_at is not None else alert.starts_at + SLOT_SECONDS
+
+        def work(conn):
+            conn.execute("DELETE FROM alert_events WHERE ends_at < ?", (alert.starts_at - retention,))
+            row = conn.execute(
+                "SELECT alert_key FROM alert_events WHERE rule = ? AND location = ? AND ends_at >= ? "
+                "AND starts_at <= ? ORDER BY starts_at LIMIT 1",
+                (alert.rule, location, alert.starts_at - SLOT_SECONDS, ends_at + SLOT_SECONDS)
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE alert_events SET ends_at = MAX(ends_at, ?) WHERE alert_key = ?", (ends_at, row[0]))
+                return row[0]
+            key = alert_key(alert)
+            conn.execute(
+                "INSERT OR IGNORE INTO alert_events (alert_key, rule, location, starts_at, ends_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, alert.rule, location, alert.starts_at, ends_at)
+            )
+            return key
+
+        return self._transaction(work)
+
+    def _claim(self, key, numbers):
+        """Reserve numbers for key; return those this process reserved (the rest are sent or in flight)"""
+        now = time.time()
+
+        def work(conn):
+            return [number for number in numbers if conn.execute(
+                "INSERT OR IGNORE INTO sent_alerts (alert_key, phone_number, sent_at) VALUES (?, ?, ?)",
+                (key, number, now)
+            ).rowcount]
+
+        return self._transaction(work)
+
+    def _release(self, key, numbers):
+        self._transaction(lambda conn: conn.executemany(
+            "DELETE FROM sent_alerts WHERE alert_key = ? AND phone_number = ?", [(key, number) for number in numbers]
+        ))
+
+    def dispatch(self, key, message, recipients):
+        """Send message to every recipient not yet alerted under key; return how many were accepted"""
+        pending = self._claim(key, list(dict.fromkeys(recipients)))
+        SMS_RECIPIENTS.inc(len(recipients) - len(pending), 'duplicate')
+        delivered = 0
+
+        for attempt in range(self.max_retries + 1):
+            if not pending:
+                break
+            if attempt:
+                time.sleep(self.backoff * (2 ** (attempt - 1)))
+            failed = []
+            for start in range(0, len(pending), self.batch_size):
+                batch = pending[start:start + self.batch_size]
+                self._wait_for_slot()
+                try:
+                    accepted = self.sender.send(message, batch) & set(batch)
+                except Exception as e:
+                    logger.warning("Bulk SMS call for %s (%d recipients) failed: %s", key, len(batch), e)
+                    SMS_CALLS.inc(1, 'error')
+                    failed.extend(batch)
+                    continue
+                SMS_CALLS.inc(1, 'ok')
+                delivered += len(accepted)
+                failed.extend(number for number in batch if number not in accepted)
+            pending = failed
+
+        SMS_RECIPIENTS.inc(delivered, 'sent')
+        if pending:
+            self._release(key, pending)  # the next run tries them again
+            SMS_RECIPIENTS.inc(len(pending), 'failed')
+            logger.warning("Gave up on %d recipients for %s after %d retries", len(pending), key, self.max_retries)
+        return delivered
+
+
+class AlertPipeline:
+    """Checks subscribers' forecasts on a schedule and sends any new alerts.
+
+    should_run() lets several workers share one pipeline: only the worker for
+    which it returns True does the work (e.g. the shared snapshot refresher).
+    """
+
+    def __init__(self, weather_service, subscribers, dispatcher, interval=ALERT_INTERVAL,
+                 should_run=None, catalog=CATALOG):
+        self.weather_service = weather_service
+        self.subscribers = subscribers
+        self.dispatcher = dispatcher
+        self.interval = interval
+        self.should_run = should_run
+        self.catalog = catalog
+        self.last_run = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self, now=None):
+        """Evaluate every subscribed location and dispatch new alerts; return numbers alerted"""
+        delivered = 0
+        for location, recipients in self.subscribers.by_location().items():
+            forecast = self.weather_service.get_forecast(location)
+            alerts = evaluate_forecast(forecast, location, now)
+            if not alerts:
+                continue
+            utc_offset = forecast.get('utc_offset', 0)
+            by_language = defaultdict(list)
+            for phone_number, language in recipients:
+                by_language[language].append(phone_number)
+            for alert in alerts:
+                ALERTS_TRIGGERED.inc(1, alert.rule)
+                key = self.dispatcher.event_key(alert)
+                for language, numbers in by_language.items():
+                    message = render_alert(alert, language, utc_offset, self.catalog)
+                    delivered += self.dispatcher.dispatch(key, message, numbers)
+        self.last_run = time.time()
+        return delivered
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self.should_run is None or self.should_run():
+                try:
+                    self.run_once()
+                except Exception as e:
+                    logger.exception("Error running weather alerts: %s", e)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="weather-alerts", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
@@ -1,58 +1,310 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Blueprint, Flask, Response, current_app, request, jsonify, render_template
 from dotenv import load_dotenv
+from werkzeug.local import LocalProxy
+import logging
 import os
-from services.weather_service import WeatherService
-from services.ussd_service import USSDService
+import time
+from werkzeug.http import http_date
 
-# Load environment variables
+# Load environment variables before the services read their settings at import
 load_dotenv()
 
-app = Flask(__name__)
-weather_service = WeatherService()
-ussd_service = USSDService()
+from services.weather_service import WeatherService, WEATHER_BATCH_MAX_LOCATIONS
+from services.ussd_service import USSDService
+from services.deadline import Deadline, USSD_DEADLINE
+from services.instrumentation import REGISTRY, STAGE_SECONDS
+from services.http_cache import EncodedBodyCache, validators_for
+from services.history import HISTORY_RETENTION_DAYS
+from services.admission import AdmissionController
+from services.alerts import ALERTS_ENABLED, AlertPipeline, SmsDispatcher, SubscriberRegistry, create_sms_sender
+
+# Quiet by default; LOG_LEVEL=DEBUG brings back per-request tracing
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'WARNING').upper())
+logger = logging.getLogger(__name__)
+
+web = Blueprint('web', __name__)
+# The services of the app handling the current request (see create_app)
+weather_service = LocalProxy(lambda: current_app.extensions['weather_service'])
+ussd_service = LocalProxy(lambda: current_app.extensions['ussd_service'])
+admission = LocalProxy(lambda: current_app.extensions['admission'])
+body_cache = LocalProxy(lambda: current_app.extensions['body_cache'])
+NOT_MODIFIED = REGISTRY.counter(
+    'fwis_http_not_modified_total', 'Weather API revalidations answered with 304', ['endpoint', 'source']
+)
+
+
+def create_services(weather_service=None, ussd_service=None, admission=None):
+    """Build the services shared by every route, in either serving mode.
+
+    One WeatherService is shared by the web API and USSD. Clients that are
+    slow to create or import (geocoder, HTTP session, Africa's Talking) are
+    built on first use, so this returns quickly.
+    """
+    weather_service = weather_service if weather_service is not None else WeatherService()
+    if ussd_service is None:
+        # Callers are only recorded when there are alerts to send them
+        subscribers = SubscriberRegistry() if ALERTS_ENABLED else None
+        ussd_service = USSDService(weather_service=weather_service, subscribers=subscribers)
+    services = {
+        'weather_service': weather_service,
+        'ussd_service': ussd_service,
+        'admission': admission if admission is not None else AdmissionController(),
+        'body_cache': EncodedBodyCache(),
+    }
+    if ALERTS_ENABLED and ussd_service.subscribers is not None:
+        services['alerts'] = _start_alerts(weather_service, ussd_service)
+    return services
+
+
+def create_app(weather_service=None, ussd_service=None, admission=None):
+    """Build the Flask app around the shared services (see create_services)"""
+    app = Flask(__name__)
+    app.extensions.update(create_services(weather_service, ussd_service, admission))
+    app.register_blueprint(web)
+    _register_metrics(app.extensions['weather_service'], app.extensions['ussd_service'], app.extensions['admission'])
+    return app
+
+
+def _start_alerts(weather_service, ussd_service):
+    sender = create_sms_sender(ussd_service.africastalking_username, ussd_service.africastalking_api_key)
+    shared_store = ussd_service.prefetcher.shared_store if ussd_service.prefetcher else None
+    pipeline = AlertPipeline(
+        weather_service, ussd_service.subscribers, SmsDispatcher(sender),
+        # With shared snapshots, alerts go out from the one refresher process only
+        should_run=shared_store.try_become_refresher if shared_store is not None else None
+    )
+    pipeline.start()
+    return pipeline
+
+
+_default_app = None
+
+
+def __getattr__(name):
+    # `app:app` (gunicorn, load_replay) builds the default app on first access, not on import
+    global _default_app
+    if name == 'app':
+        if _default_app is None:
+            _default_app = create_app()
+        return _default_app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _register_metrics(weather_service, ussd_service, admission, async_weather_service=None):
+    """Expose the services' existing counters alongside the hot-path timers"""
+    services = {'api': weather_service}
+    if ussd_service.weather_service is not weather_service:
+        services['ussd'] = ussd_service.weather_service
+    # Services with their own upstream client and request coalescing (the async one shares the cache)
+    clients = dict(services)
+    if async_weather_service is not None:
+        clients['async'] = async_weather_service
+    cache_events = ('hits', 'misses', 'stale_hits', 'refreshes', 'refresh_failures', 'evictions')
+
+    def per_service(read, services=services):
+        return {(name,): read(service) for name, service in services.items()}
+
+    def cache_counts():
+        counts = {}
+        for name, service in services.items():
+            stats = service.weather_cache.stats()
+            counts.update({(name, event): stats[event] for event in cache_events})
+        return counts
+
+    def coalescing_counts():
+        counts = {}
+        for name, service in clients.items():
+            stats = service.inflight.stats()
+            counts[(name, 'executed')] = stats['executions']
+            counts[(name, 'deduplicated')] = stats['deduplicated']
+        return counts
+
+    def geocode_counts():
+        counts = {}
+        for name, service in services.items():
+            for source, count in service.geocoder.stats().items():
+                counts[(name, source)] = count
+        return counts
+
+    def breaker_states():
+        return {
+            (name, state): int(service.upstream.breaker.state == state)
+            for name, service in services.items()
+            for state in ('closed', 'open', 'half_open')
+        }
+
+    def prefetch_ages():
+        prefetcher = ussd_service.prefetcher
+        if prefetcher is None:
+            return None
+        now = time.time()
+        return {
+            (location,): now - snapshot.refreshed_at
+            for location, snapshot in ((loc, prefetcher.get(loc)) for loc in prefetcher.locations)
+            if snapshot is not None
+        }
+
+    REGISTRY.gauge_callback('fwis_weather_cache_events_total', 'Weather cache lookups and refreshes, by outcome',
+                            cache_counts, ['service', 'event'], 'counter')
+    REGISTRY.gauge_callback('fwis_weather_cache_entries', 'Entries currently in the weather cache',
+                            lambda: per_service(lambda s: s.weather_cache.stats()['size']), ['service'])
+    REGISTRY.gauge_callback('fwis_upstream_calls_total', 'Weather fetches executed vs. coalesced onto an in-flight call',
+                            coalescing_counts, ['service', 'result'], 'counter')
+    REGISTRY.gauge_callback('fwis_geocode_lookups_total', 'Geocode lookups, by where they were answered',
+                            geocode_counts, ['service', 'source'], 'counter')
+    REGISTRY.gauge_callback('fwis_upstream_requests_total', 'HTTP requests sent to the weather API, including retries',
+                            lambda: per_service(lambda s: s.upstream.requests, clients), ['service'], 'counter')
+    REGISTRY.gauge_callback('fwis_upstream_retries_total', 'Retried weather API requests',
+                            lambda: per_service(lambda s: s.upstream.retries, clients), ['service'], 'counter')
+    REGISTRY.gauge_callback('fwis_circuit_breaker_rejected_total', 'Calls refused while the circuit breaker was open',
+                            lambda: per_service(lambda s: s.upstream.breaker.rejected), ['service'], 'counter')
+    REGISTRY.gauge_callback('fwis_circuit_breaker_state', 'Current circuit breaker state (1 for the active state)',
+                            breaker_states, ['service', 'state'])
+    REGISTRY.gauge_callback('fwis_ussd_degraded_responses_total', 'USSD replies served from stale data or "try again"',
+                            lambda: ussd_service.degraded_responses, metric_type='counter')
+    REGISTRY.gauge_callback('fwis_ussd_sessions', 'USSD sessions currently stored',
+                            lambda: len(ussd_service.sessions) if ussd_service.sessions is not None else None)
+    REGISTRY.gauge_callback('fwis_admission_buckets', 'Token buckets currently held by USSD admission control',
+                            lambda: {('phone',): len(admission.phones), ('service_code',): len(admission.service_codes)},
+                            ['limit'])
+    REGISTRY.gauge_callback('fwis_history_rows', 'Observations kept in the weather history',
+                            lambda: weather_service.history.stats()['rows'] if weather_service.history else None)
+    REGISTRY.gauge_callback('fwis_prefetch_age_seconds', 'Age of the prefetched weather snapshot per location',
+                            prefetch_ages, ['location'])
 
 # Web routes
-@app.route('/')
+@web.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/api/weather', methods=['GET'])
+def _validator_headers(response, validators):
+    response.headers['ETag'] = validators.etag
+    response.headers['Last-Modified'] = http_date(validators.last_modified)
+    response.headers['Cache-Control'] = validators.cache_control()
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+def _cached_weather_response(endpoint, location, load, peek):
+    """Serve weather data with ETag/Last-Modified/Cache-Control derived from its fetch time.
+
+    A revalidation matching a still-fresh cached entry gets a 304 straight from
+    the cache, without geocoding over the network or calling the upstream.
+    """
+    if_none_match = request.headers.get('If-None-Match')
+    if_modified_since = request.if_modified_since
+    if_modified_since = if_modified_since.timestamp() if if_modified_since else None
+    ttl = weather_service.weather_cache.ttl
+
+    if if_none_match or if_modified_since:
+        validators = validators_for(endpoint, location, peek(location), ttl)
+        if validators and validators.max_age > 0 and validators.matches(if_none_match, if_modified_since):
+            NOT_MODIFIED.inc(1, endpoint, 'peek')
+            return _validator_headers(Response(status=304), validators)
+
+    data = load(location)
+    validators = validators_for(endpoint, location, data, ttl)
+    if validators is None:
+        return jsonify(data)
+    if validators.matches(if_none_match, if_modified_since):
+        NOT_MODIFIED.inc(1, endpoint, 'load')
+        return _validator_headers(Response(status=304), validators)
+
+    body, encoding = body_cache.encode(validators.etag, data, request.headers.get('Accept-Encoding'))
+    response = Response(body, mimetype='application/json')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return _validator_headers(response, validators)
+
+@web.route('/api/weather', methods=['GET'])
 def get_weather():
     location = request.args.get('location')
     if not location:
         return jsonify({'error': 'Location is required'}), 400
     
-    weather_data = weather_service.get_weather(location)
-    return jsonify(weather_data)
+    return _cached_weather_response('weather', location, weather_service.get_weather, weather_service.peek_weather)
+
+@web.route('/api/weather/batch', methods=['GET', 'POST'])
+def get_weather_batch():
+    # GET ?location=A&location=B (or ?locations=A,B); POST {"locations": [...]}
+    if request.method == 'POST':
+        payload = request.get_json(silent=True) or {}
+        locations = payload.get('locations')
+        if not isinstance(locations, list) or not all(isinstance(loc, str) for loc in locations):
+            return jsonify({'error': 'locations must be a list of names'}), 400
+    else:
+        locations = request.args.getlist('location')
+        for names in request.args.getlist('locations'):
+            locations.extend(names.split(','))
+    locations = [loc.strip() for loc in locations if loc.strip()]
+    if not locations:
+        return jsonify({'error': 'At least one location is required'}), 400
+    if len(locations) > WEATHER_BATCH_MAX_LOCATIONS:
+        return jsonify({'error': f'At most {WEATHER_BATCH_MAX_LOCATIONS} locations per request'}), 400
+
+    return jsonify({'results': weather_service.get_weather_many(locations)})
 
-@app.route('/api/forecast', methods=['GET'])
+@web.route('/api/forecast', methods=['GET'])
 def get_forecast():
     location = request.args.get('location')
     if not location:
         return jsonify({'error': 'Location is required'}), 400
     
-    forecast_data = weather_service.get_forecast(location)
-    return jsonify(forecast_data)
+    return _cached_weather_response('forecast', location, weather_service.get_forecast, weather_service.peek_forecast)
+
+@web.route('/api/history', methods=['GET'])
+def get_history():
+    location = request.args.get('location')
+    if not location:
+        return jsonify({'error': 'Location is required'}), 400
+    days = request.args.get('days', 7, type=int)
+    if not 1 <= days <= HISTORY_RETENTION_DAYS:
+        return jsonify({'error': f'days must be between 1 and {HISTORY_RETENTION_DAYS}'}), 400
+
+    return jsonify(weather_service.get_history(location, days))
+
+@web.route('/health', methods=['GET'])
+def health():
+    status = {
+        'weather_cache': weather_service.cache_stats(),
+        'upstream': weather_service.upstream_status(),
+        'prefetch': ussd_service.prefetcher.status() if ussd_service.prefetcher else None,
+        'history': weather_service.history.stats() if weather_service.history else None,
+        'admission': admission.stats(),
+        'ussd_degraded_responses': ussd_service.degraded_responses
+    }
+    return jsonify(status)
+
+@web.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
 
 # USSD routes
-@app.route('/ussd', methods=['POST'])
+@web.route('/ussd', methods=['POST'])
 def ussd_callback():
+    # The gateway drops the session if we don't answer within a few seconds
+    deadline = Deadline(USSD_DEADLINE)
     try:
         session_id = request.values.get("sessionId", "")
         service_code = request.values.get("serviceCode", "")
         phone_number = request.values.get("phoneNumber", "")
         text = request.values.get("text", "")
-        
+
+        # Over-limit callers get a short END reply before any session or weather work
+        limit = admission.admit(phone_number, service_code)
+        if limit is not None:
+            return ussd_service.reject(session_id, text, limit)
+
         # Process the USSD request
-        response = ussd_service.handle_ussd(session_id, phone_number, text)
+        with STAGE_SECONDS.time('ussd_hop'):
+            response = ussd_service.handle_ussd(session_id, phone_number, text, deadline)
         return response
         
     except Exception as e:
         # Log the error for debugging
-        print(f"Error processing USSD request: {str(e)}")
+        logger.exception("Error processing USSD request: %s", e)
         return "CON An error occurred. Please try again later."
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
 
 
@@ -0,0 +1,204 @@
+"""Optional asyncio serving mode for /ussd and /api/* (aiohttp).
+
+The Flask app holds a worker thread for every request waiting on the weather
+API, so on slow-network days capacity drops to threads / upstream latency.
+Here the same services (see app.create_services) answer on an event loop and
+upstream waits go through AsyncWeatherService, so one process can keep many
+slow requests in flight. The USSD menu engine, sessions, cache, admission
+control and metrics are shared with the threaded mode.
+
+    gunicorn 'async_app:create_async_app()' --worker-class aiohttp.GunicornWebWorker
+"""
+
+import logging
+from aiohttp import web
+
+from app import NOT_MODIFIED, _register_metrics, create_services
+from services.async_weather_service import AsyncWeatherService
+from services.deadline import Deadline, USSD_DEADLINE
+from services.history import HISTORY_RETENTION_DAYS
+from services.http_cache import validators_for
+from services.instrumentation import REGISTRY, STAGE_SECONDS
+from services.weather_service import WEATHER_BATCH_MAX_LOCATIONS
+
+logger = logging.getLogger(__name__)
+
+routes = web.RouteTableDef()
+
+
+def create_async_app(weather_service=None, ussd_service=None, admission=None):
+    """Build the aiohttp app around the shared services plus an AsyncWeatherService over the same cache"""
+    app = web.Application()
+    services = create_services(weather_service, ussd_service, admission)
+    for name, service in services.items():
+        app[name] = service
+    app['async_weather_service'] = AsyncWeatherService(services['weather_service'])
+    app.add_routes(routes)
+    app.on_cleanup.append(_close_clients)
+    _register_metrics(services['weather_service'], services['ussd_service'], services['admission'],
+                      app['async_weather_service'])
+    return app
+
+
+async def _close_clients(app):
+    await app['async_weather_service'].close()
+
+
+def _json_error(message, status=400):
+    return web.json_response({'error': message}, status=status)
+
+
+def _validator_headers(response, validators):
+    response.headers['ETag'] = validators.etag
+    response.last_modified = validators.last_modified
+    response.headers['Cache-Control'] = validators.cache_control()
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+async def _cached_weather_response(request, endpoint, location, load, peek):
+    """Async twin of app._cached_weather_response: same validators, 304s and encoded bodies"""
+    weather = request.app['async_weather_service']
+    if_none_match = request.headers.get('If-None-Match')
+    if_modified_since = request.if_modified_since
+    if_modified_since = if_modified_since.timestamp() if if_modified_since else None
+    ttl = weather.weather_cache.ttl
+
+    if if_none_match or if_modified_since:
+        validators = validators_for(endpoint, location, await peek(location), ttl)
+        if validators and validators.max_age > 0 and validators.matches(if_none_match, if_modified_since):
+            NOT_MODIFIED.inc(1, endpoint, 'peek')
+            return _validator_headers(web.Response(status=304), validators)
+
+    data = await load(location)
+    validators = validators_for(endpoint, location, data, ttl)
+    if validators is None:
+        return web.json_response(data)
+    if validators.matches(if_none_match, if_modified_since):
+        NOT_MODIFIED.inc(1, endpoint, 'load')
+        return _validator_headers(web.Response(status=304), validators)
+
+    body, encoding = request.app['body_cache'].encode(
+        validators.etag, data, request.headers.get('Accept-Encoding')
+    )
+    response = web.Response(body=body, content_type='application/json')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return _validator_headers(response, validators)
+
+
+@routes.get('/api/weather')
+async def get_weather(request):
+    location = request.query.get('location')
+    if not location:
+        return _json_error('Location is required')
+    weather = request.app['async_weather_service']
+    return await _cached_weather_response(request, 'weather', location, weather.get_weather, weather.peek_weather)
+
+
+@routes.get('/api/weather/batch')
+@routes.post('/api/weather/batch')
+async def get_weather_batch(request):
+    # GET ?location=A&location=B (or ?locations=A,B); POST {"locations": [...]}
+    if request.method == 'POST':
+        try:
+            payload = await request.json()
+        except ValueError:
+            payload = None
+        locations = payload.get('locations') if isinstance(payload, dict) else None
+        if not isinstance(locations, list) or not all(isinstance(loc, str) for loc in locations):
+            return _json_error('locations must be a list of names')
+    else:
+        locations = request.query.getall('location', [])
+        for names in request.query.getall('locations', []):
+            locations.extend(names.split(','))
+    locations = [loc.strip() for loc in locations if loc.strip()]
+    if not locations:
+        return _json_error('At least one location is required')
+    if len(locations) > WEATHER_BATCH_MAX_LOCATIONS:
+        return _json_error(f'At most {WEATHER_BATCH_MAX_LOCATIONS} locations per request')
+
+    results = await request.app['async_weather_service'].get_weather_many(locations)
+    return web.json_response({'results': results})
+
+
+@routes.get('/api/forecast')
+async def get_forecast(request):
+    location = request.query.get('location')
+    if not location:
+        return _json_error('Location is required')
+    weather = request.app['async_weather_service']
+    return await _cached_weather_response(request, 'forecast', location, weather.get_forecast, weather.peek_forecast)
+
+
+@routes.get('/api/history')
+async def get_history(request):
+    location = request.query.get('location')
+    if not location:
+        return _json_error('Location is required')
+    try:
+        days = int(request.query.get('days', 7))
+    except ValueError:
+        days = 7
+    if not 1 <= days <= HISTORY_RETENTION_DAYS:
+        return _json_error(f'days must be between 1 and {HISTORY_RETENTION_DAYS}')
+
+    return web.json_response(await request.app['async_weather_service'].get_history(location, days))
+
+
+@routes.get('/health')
+async def health(request):
+    weather_service = request.app['weather_service']
+    ussd_service = request.app['ussd_service']
+    async_weather_service = request.app['async_weather_service']
+    status = {
+        'weather_cache': async_weather_service.cache_stats(),
+        'upstream': async_weather_service.upstream_status(),
+        'prefetch': ussd_service.prefetcher.status() if ussd_service.prefetcher else None,
+        'history': weather_service.history.stats() if weather_service.history else None,
+        'admission': request.app['admission'].stats(),
+        'ussd_degraded_responses': ussd_service.degraded_responses
+    }
+    return web.json_response(status)
+
+
+@routes.get('/metrics')
+async def metrics(request):
+    return web.Response(body=REGISTRY.render().encode(), headers={'Content-Type': 'text/plain; version=0.0.4'})
+
+
+@routes.post('/ussd')
+async def ussd_callback(request):
+    # The gateway drops the session if we don't answer within a few seconds
+    deadline = Deadline(USSD_DEADLINE)
+    ussd_service = request.app['ussd_service']
+    try:
+        form = await request.post()
+
+        def value(name):
+            # Form fields, else query string (like Flask's request.values)
+            return form.get(name, request.query.get(name, ""))
+
+        session_id = value("sessionId")
+        service_code = value("serviceCode")
+        phone_number = value("phoneNumber")
+        text = value("text")
+
+        # Over-limit callers get a short END reply before any session or weather work
+        limit = request.app['admission'].admit(phone_number, service_code)
+        if limit is not None:
+            return web.Response(text=ussd_service.reject(session_id, text, limit))
+
+        with STAGE_SECONDS.time('ussd_hop'):
+            response = await ussd_service.handle_ussd_async(
+                session_id, phone_number, text, request.app['async_weather_service'], deadline
+            )
+        return web.Response(text=response)
+
+    except Exception as e:
+        logger.exception("Error processing USSD request: %s", e)
+        return web.Response(text="CON An error occurred. Please try again later.")
+
+
+if __name__ == '__main__':
+    web.run_app(create_async_app())
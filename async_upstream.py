@@ -0,0 +1,138 @@
+import asyncio
+import os
+import random
+from .deadline import DeadlineExceeded
+from .upstream import (
+    RETRY_STATUSES, UPSTREAM_BACKOFF, UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_MAX_RETRIES, UPSTREAM_READ_TIMEOUT,
+    CircuitBreaker, CircuitOpenError,
+)
+
+# Connections are cheap for the event loop, so the async pool can be much larger than the threaded one
+UPSTREAM_ASYNC_POOL_MAXSIZE = int(os.getenv('UPSTREAM_ASYNC_POOL_MAXSIZE', '256'))  # keep-alive connections per host
+
+
+class UpstreamHTTPError(Exception):
+    """Non-success HTTP status from the upstream (the async counterpart of requests' HTTPError)"""
+
+    def __init__(self, status, url):
+        super().__init__(f"{status} from upstream for {url}")
+        self.status = status
+
+
+class AsyncUpstreamClient:
+    """Non-blocking counterpart of UpstreamClient (aiohttp, same retries and circuit breaker).
+
+    Waiting on the upstream holds a coroutine instead of a worker thread, so
+    slow responses no longer cap how many requests are in flight.
+    """
+
+    def __init__(self, pool_maxsize=UPSTREAM_ASYNC_POOL_MAXSIZE, max_retries=UPSTREAM_MAX_RETRIES,
+                 backoff=UPSTREAM_BACKOFF, timeout=(UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_READ_TIMEOUT), breaker=None):
+        self.pool_maxsize = pool_maxsize
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self._session = None
+        self.requests = 0
+        self.retries = 0
+
+    def _get_session(self):
+        """Pooled aiohttp.ClientSession, created (and aiohttp imported) on the first call in the running loop"""
+        if self._session is None or self._session.closed:
+            import aiohttp
+            connector = aiohttp.TCPConnector(limit=0, limit_per_host=self.pool_maxsize, keepalive_timeout=30)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def _sleep_before_retry(self, attempt, deadline=None):
+        # Full jitter, as in UpstreamClient
+        delay = random.uniform(0, self.backoff * (2 ** attempt))
+        if deadline is not None:
+            delay = min(delay, deadline.remaining())
+        await asyncio.sleep(delay)
+        self.retries += 1
+
+    def _attempt_timeout(self, timeout, deadline):
+        import aiohttp
+
+        connect, read = timeout
+        if deadline is not None:
+            connect, read = deadline.timeout(cap=connect), deadline.timeout(cap=read)
+        # total bounds the whole attempt by the deadline, like the per-phase caps do for requests
+        total = deadline.timeout() if deadline is not None else None
+        return aiohttp.ClientTimeout(total=total, sock_connect=connect, sock_read=read)
+
+    async def get_json(self, url, params=None, timeout=None, deadline=None):
+        """GET url and return the decoded JSON body.
+
+        Same contract as UpstreamClient.get_json: raises CircuitOpenError while
+        the breaker is open, DeadlineExceeded if there was no budget for even
+        one attempt, UpstreamHTTPError for a non-retryable status, or the last
+        aiohttp/timeout error once retries are used up.
+        """
+        import aiohttp
+
+        if deadline is not None and deadline.expired():
+            raise DeadlineExceeded(f"No time left to call {url}")
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {url}")
+
+        session = self._get_session()
+        last_error = None
+        recorded = False
+        try:
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    await self._sleep_before_retry(attempt - 1, deadline)
+                try:
+                    attempt_timeout = self._attempt_timeout(timeout or self.timeout, deadline)
+                except DeadlineExceeded:
+                    break
+                self.requests += 1
+                try:
+                    async with session.get(url, params=params, timeout=attempt_timeout) as response:
+                        if response.status in RETRY_STATUSES:
+                            last_error = UpstreamHTTPError(response.status, url)
+                            continue
+                        if response.status >= 400:
+                            # Other 4xx errors are our fault, not an upstream outage
+                            recorded = True
+                            self.breaker.record_success()
+                            raise UpstreamHTTPError(response.status, url)
+                        data = await response.json(content_type=None)
+                except (asyncio.TimeoutError, aiohttp.ClientConnectionError) as e:
+                    last_error = e
+                    continue
+                recorded = True
+                self.breaker.record_success()
+                return data
+
+            if last_error is None:
+                # Budget ran out before the first attempt; says nothing about upstream health
+                raise DeadlineExceeded(f"No time left to call {url}")
+            recorded = True
+            self.breaker.record_failure()
+            raise last_error
+        except (aiohttp.ClientError, ValueError):
+            # Bad or truncated bodies (JSONDecodeError, ClientPayloadError...): the upstream call failed
+            if not recorded:
+                recorded = True
+                self.breaker.record_failure()
+            raise
+        finally:
+            if not recorded:
+                # Never reached an outcome (no budget, cancelled, unexpected error): free a half-open trial
+                self.breaker.release()
+
+    def stats(self):
+        return {
+            'breaker': self.breaker.stats(),
+            'requests': self.requests,
+            'retries': self.retries
+        }
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
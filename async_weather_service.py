@@ -0,0 +1,218 @@
+import asyncio
+import functools
+import logging
+from .async_upstream import AsyncUpstreamClient, UpstreamHTTPError
+from .deadline import DeadlineExceeded
+from .gazetteer import normalize_place_name
+from .instrumentation import STAGE_SECONDS
+from .singleflight import AsyncSingleFlight
+from .upstream import CircuitOpenError
+from .weather_service import _POSTPROCESSORS, _by_spelling, OPENWEATHERMAP_API_KEY, WEATHER_UNITS
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncWeatherService:
+    """asyncio front end to a WeatherService for the async serving mode.
+
+    Shares the WeatherService's cache (same TTL and stale-while-revalidate
+    rules), geocoder, history and circuit breaker, so both modes see the same
+    data; only the upstream calls differ, going through a non-blocking pooled
+    client. Stale entries are refreshed by a background task instead of a
+    thread. Everything else that may block (geocode cache and Nominatim
+    lookups, history reads and appends) runs on the default executor.
+    """
+
+    def __init__(self, weather_service):
+        self.sync = weather_service
+        self.base_url = weather_service.base_url
+        self.weather_cache = weather_service.weather_cache
+        self.geocoder = weather_service.geocoder
+        self.history = weather_service.history
+        self.inflight = AsyncSingleFlight()
+        # One breaker per upstream host, whichever mode calls it
+        self.upstream = AsyncUpstreamClient(breaker=weather_service.upstream.breaker)
+        self._refresh_tasks = set()
+
+    async def _get_coordinates(self, location, deadline=None, allow_network=True):
+        """Get latitude and longitude from location name; only gazetteer hits stay on the loop"""
+        coords = self.geocoder.lookup_gazetteer(location)
+        if coords:
+            return coords
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, functools.partial(self.sync._get_coordinates, location, deadline, allow_network)
+        )
+
+    async def _get_weather_data(self, endpoint, params, deadline=None):
+        """Make request to OpenWeatherMap API; errors are logged and return None, as in WeatherService"""
+        import aiohttp
+
+        try:
+            if not OPENWEATHERMAP_API_KEY:
+                logger.error("OpenWeatherMap API key is not configured")
+                return None
+
+            return await self.upstream.get_json(endpoint, params=params, deadline=deadline)
+
+        except DeadlineExceeded:
+            logger.warning("No time left in the request budget for the weather API")
+            return None
+        except CircuitOpenError:
+            logger.warning("Weather API circuit breaker is open, skipping upstream call")
+            return None
+        except asyncio.TimeoutError:
+            logger.warning("Request to weather API timed out")
+            return None
+        except UpstreamHTTPError as http_err:
+            logger.warning("HTTP error occurred: %s", http_err)
+            return None
+        except aiohttp.ClientError as req_err:
+            logger.warning("Request error occurred: %s", req_err)
+            return None
+        except Exception as e:
+            logger.exception("Unexpected error in _get_weather_data: %s", e)
+            return None
+
+    async def _get_cached_weather_data(self, endpoint, lat, lon, refresh=False, deadline=None):
+        """Async twin of WeatherService._get_cached_weather_data (same cache, same semantics)"""
+        params = {
+            'lat': lat,
+            'lon': lon,
+            'appid': OPENWEATHERMAP_API_KEY,
+            'units': WEATHER_UNITS
+        }
+        key = self.sync._cache_key(endpoint, lat, lon)
+        postprocess = _POSTPROCESSORS.get(endpoint)
+
+        async def fetch(deadline=None):
+            with STAGE_SECONDS.time('upstream_fetch'):
+                data = await self._get_weather_data(f"{self.base_url}/{endpoint}", params, deadline)
+            if data is not None and endpoint == 'weather' and self.history is not None:
+                # The history append takes a file lock and writes every column: keep it off the loop
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self.sync._record_observation, lat, lon, data
+                )
+            if data is not None and postprocess is not None:
+                data = postprocess(data)
+            return data
+
+        async def loader():
+            # Concurrent misses/refreshes for the same key share one upstream call;
+            # deadline-bound calls are coalesced apart from the others
+            try:
+                return await self.inflight.do(
+                    self.sync._flight_key(key, deadline),
+                    lambda: fetch(deadline),
+                    timeout=deadline.remaining() if deadline is not None else None
+                )
+            except TimeoutError:
+                logger.warning("Timed out waiting for in-flight %s request", endpoint)
+                return None
+
+        if refresh:
+            value = await loader()
+            if value is None:
+                return self.weather_cache.peek(key)
+            return self.weather_cache.put(key, value)
+
+        entry, start_refresh = self.weather_cache.lookup(key)
+        if entry is None:
+            value = await loader()
+            if value is None:
+                return None
+            return self.weather_cache.put(key, value)
+        if start_refresh:
+            task = asyncio.get_running_loop().create_task(
+                self._refresh(key, lambda: self.inflight.do(key, fetch))
+            )
+            self._refresh_tasks.add(task)  # keep a reference until it finishes
+            task.add_done_callback(self._refresh_tasks.discard)
+        return entry
+
+    async def _refresh(self, key, loader):
+        value = None
+        try:
+            value = await loader()
+        except Exception as e:
+            logger.warning("Error refreshing cache entry %s: %s", key, e)
+        finally:
+            self.weather_cache.refresh_done(key, value)
+
+    async def get_weather(self, location, refresh=False, deadline=None):
+        """Get current weather for a location"""
+        if not location:
+            return {"error": "No location provided"}
+
+        logger.debug("Getting weather for location: %s", location)
+        lat, lon = await self._get_coordinates(location, deadline)
+        if not lat or not lon:
+            return {"error": f"Could not find coordinates for location: {location}"}
+
+        entry = await self._get_cached_weather_data('weather', lat, lon, refresh, deadline)
+        if not entry:
+            return {"error": "Failed to get weather data"}
+        return self.sync._format_weather(entry)
+
+    async def get_forecast(self, location, refresh=False, deadline=None):
+        """Get 5-day weather forecast"""
+        if not location:
+            return {"error": "No location provided"}
+
+        logger.debug("Getting forecast for location: %s", location)
+        lat, lon = await self._get_coordinates(location, deadline)
+        if not lat or not lon:
+            return {"error": f"Could not find coordinates for location: {location}"}
+
+        entry = await self._get_cached_weather_data('forecast', lat, lon, refresh, deadline)
+        if not entry:
+            return {"error": "Failed to get forecast data"}
+        return self.sync._format_forecast(entry)
+
+    async def get_weather_many(self, locations, deadline=None):
+        """Get current weather for several locations at once (see WeatherService.get_weather_many).
+
+        All misses are fetched concurrently on the loop; there is no worker pool to size.
+        """
+        unique = {}
+        for location in locations:
+            if location and location.strip():
+                unique.setdefault(normalize_place_name(location), location)
+
+        async def one(location):
+            try:
+                return await self.get_weather(location, deadline=deadline)
+            except Exception as e:
+                logger.exception("Error getting weather for %s in batch: %s", location, e)
+                return {"error": "Failed to get weather data"}
+
+        results = await asyncio.gather(*(one(location) for location in unique.values()))
+        return _by_spelling(locations, unique, dict(zip(unique.values(), results)))
+
+    async def get_history(self, location, days=7):
+        """WeatherService.get_history on the default executor (it may geocode over the network)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.sync.get_history, location, days)
+
+    async def peek_weather(self, location):
+        """Last cached current weather without any network I/O, or None (geocode cache read on the executor)"""
+        return await asyncio.get_running_loop().run_in_executor(None, self.sync.peek_weather, location)
+
+    async def peek_forecast(self, location):
+        """Last cached forecast without any network I/O, or None (geocode cache read on the executor)"""
+        return await asyncio.get_running_loop().run_in_executor(None, self.sync.peek_forecast, location)
+
+    def upstream_status(self):
+        """Return circuit breaker state and retry counters for the async weather API client"""
+        return self.upstream.stats()
+
+    def cache_stats(self):
+        """Return weather cache counters (shared with WeatherService) and async request coalescing counts"""
+        stats = self.weather_cache.stats()
+        stats['coalesced'] = self.inflight.stats()
+        return stats
+
+    async def close(self):
+        for task in list(self._refresh_tasks):
+            task.cancel()
+        await self.upstream.close()
@@ -0,0 +1,15 @@
+import importlib.util
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# In a flat checkout (the repository not named services/ under the project root)
+# map it to the services package the app imports, as conftest.py does for the tests
+if 'services' not in sys.modules and importlib.util.find_spec('services') is None:
+    spec = importlib.util.spec_from_file_location(
+        'services', os.path.join(ROOT, '__init__.py'), submodule_search_locations=[ROOT]
+    )
+    package = importlib.util.module_from_spec(spec)
+    sys.modules['services'] = package
+    spec.loader.exec_module(package)
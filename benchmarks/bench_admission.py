@@ -0,0 +1,59 @@
+"""USSD admission control: per-hop check cost and who gets refused.
+
+Simulates one phone stuck in a retry loop alongside many normal callers
+sharing the shortcode, on a virtual clock, then times a single bucket check.
+
+Usage: python -m benchmarks.bench_admission [--callers 2000] [--seconds 60] [--hammer-rate 50]
+"""
+import argparse
+import random
+import time
+
+from services.admission import AdmissionController, TokenBuckets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--callers', type=int, default=2000, help='normal phones dialling during the run')
+    parser.add_argument('--seconds', type=int, default=60, help='simulated duration')
+    parser.add_argument('--hammer-rate', type=float, default=50, help='hops per second from the misbehaving phone')
+    parser.add_argument('--checks', type=int, default=200000)
+    parser.add_argument('--seed', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    controller = AdmissionController()
+    # Normal callers: a 4-hop session, a few seconds between hops
+    events = []
+    for i in range(args.callers):
+        at = rng.uniform(0, args.seconds)
+        for _ in range(4):
+            events.append((at, f"+2567{i:08d}"))
+            at += rng.uniform(2, 8)
+    hammer = '+256700000000'
+    events += [(i / args.hammer_rate, hammer) for i in range(int(args.seconds * args.hammer_rate))]
+    events.sort()
+
+    refused = {'normal': 0, 'hammer': 0}
+    total = {'normal': 0, 'hammer': 0}
+    for at, phone in events:
+        who = 'hammer' if phone == hammer else 'normal'
+        total[who] += 1
+        # Drive the buckets on the virtual clock
+        if not controller.phones.take(phone, at) or not controller.service_codes.take('*384#', at):
+            refused[who] += 1
+    for who in ('normal', 'hammer'):
+        print(f"{who:7s} hops {total[who]:7d}  refused {refused[who]:7d} ({refused[who] / max(1, total[who]):.1%})")
+    print(f"buckets held at the end: {len(controller.phones)} phone, {len(controller.service_codes)} service code")
+
+    buckets = TokenBuckets(rate=1, burst=10)
+    phones = [f"+2567{i:08d}" for i in range(10000)]
+    started = time.perf_counter()
+    for i in range(args.checks):
+        buckets.take(phones[i % len(phones)])
+    per_check = (time.perf_counter() - started) / args.checks * 1e6
+    print(f"take(): {per_check:.2f} us per check over {len(phones)} phones")
+
+
+if __name__ == '__main__':
+    main()
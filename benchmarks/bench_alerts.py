@@ -0,0 +1,71 @@
+"""Alert fan-out against the local stand-in: how many bulk SMS calls for N subscribers.
+
+Seeds N subscribers across a few districts, runs the alert pipeline once
+against the stand-in forecast and SMS endpoint, then runs it again to show
+that nobody is alerted twice.
+
+Usage: python -m benchmarks.bench_alerts [--subscribers 20000] [--sms-failure-rate 0.01]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.fake_upstream import FakeUpstream
+
+LOCATIONS = ['Gulu', 'Lira', 'Kitgum', 'Amuru']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--subscribers', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--rate-limit', type=float, default=20, help='bulk calls per second')
+    parser.add_argument('--latency', type=float, default=0.05, help='stand-in latency per call (s)')
+    parser.add_argument('--sms-failure-rate', type=float, default=0.01, help='fraction of recipients rejected')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of calls answered with 503')
+    parser.add_argument('--seed', type=int, default=3)
+    args = parser.parse_args()
+
+    fake = FakeUpstream(latency=args.latency, error_rate=args.error_rate, seed=args.seed,
+                        sms_failure_rate=args.sms_failure_rate).start()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.environ['OPENWEATHERMAP_API_KEY'] = 'benchmark'
+        os.environ['OPENWEATHERMAP_BASE_URL'] = f"{fake.url}/data/2.5"
+        os.environ['GEOCODE_CACHE_PATH'] = os.path.join(workdir, 'geocode.sqlite3')
+        os.environ['HISTORY_PATH'] = os.path.join(workdir, 'history')
+        from services.alerts import AlertPipeline, HttpSmsSender, SmsDispatcher, SubscriberRegistry
+        from services.weather_service import WeatherService
+
+        db = os.path.join(workdir, 'subscribers.sqlite3')
+        rng = random.Random(args.seed)
+        subscribers = SubscriberRegistry(db)
+        subscribers.record_many(
+            (f"+2567{i:08d}", rng.choice(['en', 'luo']), rng.choice(LOCATIONS))
+            for i in range(args.subscribers)
+        )
+        dispatcher = SmsDispatcher(
+            HttpSmsSender(fake.sms_url, 'sandbox', 'benchmark'), path=db,
+            batch_size=args.batch_size, rate_limit=args.rate_limit, backoff=0.1
+        )
+        pipeline = AlertPipeline(WeatherService(), subscribers, dispatcher)
+
+        for label in ('first run', 'second run'):
+            before = fake.snapshot_counts()
+            started = time.perf_counter()
+            delivered = pipeline.run_once()
+            elapsed = time.perf_counter() - started
+            counts = fake.snapshot_counts()
+            calls = counts.get('/version1/messaging', 0) - before.get('/version1/messaging', 0)
+            print(f"{label}: {delivered} recipients alerted in {calls} bulk calls, {elapsed:.2f}s")
+
+        duplicates = sum(1 for n in fake.sms_received.values() if n > 1)
+        alerted = len({number for number, _ in fake.sms_received})
+        print(f"{len(subscribers)} subscribers, {alerted} numbers received {len(fake.sms_received)} alerts, "
+              f"{duplicates} of those more than once")
+    fake.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""Concurrent-session capacity of the threaded (Flask) and async (aiohttp) serving modes.
+
+Both modes run in this process against the local upstream stand-in with
+injected latency. The weather cache is disabled so every weather, forecast
+and tips screen waits on the stand-in, as on a day the cache cannot hide a
+slow network. For each level of concurrency, that many simulated phones run
+sessions back to back for a fixed time:
+  threaded  hops go through the Flask app, each holding one of --threads
+            worker threads for its whole duration (a gunicorn gthread worker)
+  async     hops go over HTTP to the aiohttp app on a single event loop
+Reports hops/s and hop latency (including any wait for a free worker).
+
+Usage: python -m benchmarks.bench_async [--levels 16,64,256] [--threads 32] [--latency 0.5] [--duration 10]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import threading
+import time
+
+from benchmarks.fake_upstream import FakeUpstream
+from benchmarks.load_replay import percentile
+from benchmarks.traces import generate_sessions
+
+
+def configure_environment(fake, workdir):
+    """Point the app at the stand-in; must run before the app is imported"""
+    os.environ['OPENWEATHERMAP_API_KEY'] = 'benchmark'
+    os.environ['OPENWEATHERMAP_BASE_URL'] = f"{fake.url}/data/2.5"
+    os.environ['NOMINATIM_DOMAIN'] = fake.netloc
+    os.environ['NOMINATIM_SCHEME'] = 'http'
+    os.environ.setdefault('AFRICASTALKING_USERNAME', 'sandbox')
+    os.environ.setdefault('AFRICASTALKING_API_KEY', 'benchmark')
+    os.environ['GEOCODE_CACHE_PATH'] = os.path.join(workdir, 'geocode.sqlite3')
+    os.environ['HISTORY_PATH'] = os.path.join(workdir, 'history')
+    os.environ['SUBSCRIBER_DB_PATH'] = os.path.join(workdir, 'subscribers.sqlite3')
+    os.environ['WEATHER_CACHE_MAX_ENTRIES'] = '0'  # every data screen waits on the stand-in
+    os.environ['PREFETCH_ENABLED'] = '0'
+    os.environ['USSD_PHONE_RATE'] = '0'  # measure capacity, not admission control
+    os.environ['USSD_SERVICE_CODE_RATE'] = '0'
+
+
+def summarize(mode, level, latencies, elapsed):
+    latencies.sort()
+    print(f"{mode:8s} {level:6d} {len(latencies) / elapsed:9.1f} " + " ".join(
+        f"{percentile(latencies, p) * 1000:8.1f}" for p in (0.5, 0.95, 0.99)))
+
+
+def run_threaded(app, sessions, level, threads, duration):
+    workers = threading.BoundedSemaphore(threads)
+    latencies = []
+    stop_at = time.monotonic() + duration
+
+    def phone(offset):
+        client = app.test_client()
+        i = offset
+        while time.monotonic() < stop_at:
+            session = sessions[i % len(sessions)]
+            for text in session['hops']:
+                started = time.perf_counter()
+                with workers:
+                    body = client.post('/ussd', data={
+                        'sessionId': f"{session['session_id']}-{i}",
+                        'serviceCode': session['service_code'],
+                        'phoneNumber': session['phone_number'],
+                        'text': text,
+                    }).get_data(as_text=True)
+                latencies.append(time.perf_counter() - started)
+                if body.startswith('END'):
+                    break
+            i += level
+
+    started = time.perf_counter()
+    phones = [threading.Thread(target=phone, args=(n,)) for n in range(level)]
+    for thread in phones:
+        thread.start()
+    for thread in phones:
+        thread.join()
+    return latencies, time.perf_counter() - started
+
+
+async def run_async(app, sessions, level, duration):
+    import aiohttp
+    from aiohttp.test_utils import TestServer
+
+    latencies = []
+    stop_at = time.monotonic() + duration
+    server = TestServer(app)
+    await server.start_server()
+    url = str(server.make_url('/ussd'))
+    connector = aiohttp.TCPConnector(limit=0)
+
+    async def phone(client, offset):
+        i = offset
+        while time.monotonic() < stop_at:
+            session = sessions[i % len(sessions)]
+            for text in session['hops']:
+                started = time.perf_counter()
+                async with client.post(url, data={
+                    'sessionId': f"{session['session_id']}-{i}",
+                    'serviceCode': session['service_code'],
+                    'phoneNumber': session['phone_number'],
+                    'text': text,
+                }) as response:
+                    body = await response.text()
+                latencies.append(time.perf_counter() - started)
+                if body.startswith('END'):
+                    break
+            i += level
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession(connector=connector) as client:
+        await asyncio.gather(*(phone(client, n) for n in range(level)))
+    elapsed = time.perf_counter() - started
+    await server.close()
+    return latencies, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--levels', default='16,64,256', help='comma-separated numbers of concurrent phones')
+    parser.add_argument('--threads', type=int, default=32, help='worker threads in the threaded mode')
+    parser.add_argument('--latency', type=float, default=0.5, help='stand-in upstream latency (s)')
+    parser.add_argument('--jitter', type=float, default=0.1)
+    parser.add_argument('--duration', type=float, default=10, help='seconds per mode and level')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    levels = [int(level) for level in args.levels.split(',')]
+
+    sessions = generate_sessions(1000, args.seed)
+    fake = FakeUpstream(latency=args.latency, jitter=args.jitter, seed=args.seed).start()
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_environment(fake, workdir)
+        from app import create_app
+        from async_app import create_async_app
+
+        print(f"upstream latency {args.latency}s+{args.jitter}s, {args.threads} threads in the threaded mode, "
+              f"{args.duration:.0f}s per run")
+        print(f"{'mode':8s} {'phones':>6s} {'hops/s':>9s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s}")
+        flask_app = create_app()
+        for level in levels:
+            latencies, elapsed = run_threaded(flask_app, sessions, level, args.threads, args.duration)
+            summarize('threaded', level, latencies, elapsed)
+        for level in levels:
+            # A fresh app per run: aiohttp apps are bound to the loop that first serves them
+            latencies, elapsed = asyncio.run(run_async(create_async_app(), sessions, level, args.duration))
+            summarize('async', level, latencies, elapsed)
+        fake.stop()
+
+
+if __name__ == '__main__':
+    main()
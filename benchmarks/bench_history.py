@@ -0,0 +1,84 @@
+"""Observation history: append rate, bytes per row, compaction and query cost.
+
+Fills a fresh history with synthetic 10-minute observations for a number of
+locations over some days, then times the queries the app makes: latest
+observation (offline fallback), a 7-day aggregate, per-day summaries and the
+trend figures used by the advice engine.
+
+Usage: python -m benchmarks.bench_history [--locations 50] [--days 30] [--queries 2000]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault('HISTORY_COMPACT_INTERVAL', str(10 ** 9))  # compact explicitly below
+
+from services.history import ObservationHistory
+
+DESCRIPTIONS = [(800, 'clear sky'), (802, 'scattered clouds'), (500, 'light rain'), (501, 'moderate rain')]
+
+
+def timed(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--locations', type=int, default=50)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--interval', type=int, default=600, help='seconds between observations')
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    keys = [f"{2.5 + i * 0.05:.2f},{32.3 + i * 0.05:.2f}" for i in range(args.locations)]
+    now = time.time()
+    start = now - args.days * 86400
+    with tempfile.TemporaryDirectory() as workdir:
+        history = ObservationHistory(os.path.join(workdir, 'history'), retention_days=max(1, args.days // 2))
+        rows = 0
+        started = time.perf_counter()
+        ts = start
+        while ts < now:
+            for key in keys:
+                condition, description = rng.choice(DESCRIPTIONS)
+                rain = round(rng.uniform(0.1, 4), 2) if condition < 700 else 0.0
+                history.append(key, ts, rng.uniform(16, 32), rng.randint(40, 95), condition, description, rain, 10800)
+                rows += 1
+            ts += args.interval
+        elapsed = time.perf_counter() - started
+        size = sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, names in os.walk(os.path.join(workdir, 'history')) for name in names
+        )
+        print(f"appended {rows} observations in {elapsed:.2f}s ({rows / elapsed:,.0f}/s), "
+              f"{size / rows:.1f} bytes per row on disk")
+
+        started = time.perf_counter()
+        history.compact(now=now)  # retention is half the days: drops the older half
+        print(f"compaction kept {history.stats()['rows']} rows in {(time.perf_counter() - started) * 1000:.1f}ms")
+
+        started = time.perf_counter()
+        ObservationHistory(os.path.join(workdir, 'history')).latest(keys[0])
+        print(f"cold load of the columns by a new process: {(time.perf_counter() - started) * 1000:.1f}ms")
+
+        def pick():
+            return rng.choice(keys)
+
+        print(f"per query, microseconds ({args.queries} queries, random location):")
+        print(f"  latest        {timed(lambda: history.latest(pick()), args.queries):8.1f}")
+        print(f"  aggregate 7d  {timed(lambda: history.aggregate(pick(), now - 7 * 86400, now), args.queries):8.1f}")
+        print(f"  daily 7d      {timed(lambda: history.daily(pick(), 7, now), args.queries // 10):8.1f}")
+        print(f"  trends        {timed(lambda: history.trends(pick(), now), args.queries):8.1f}  (memoized)")
+        history._trend_cache.clear()
+        print(f"  trends cold   {timed(lambda: history.trends(keys[0], now) and history._trend_cache.clear(), 50):8.1f}")
+
+
+if __name__ == '__main__':
+    main()
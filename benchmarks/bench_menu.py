@@ -0,0 +1,52 @@
+"""Microbenchmark of per-hop USSD menu cost (dispatch + render), no I/O.
+
+Usage: python -m benchmarks.bench_menu [--hops N]
+"""
+import argparse
+import time
+from services.advice import AdviceEngine
+from services.menu_engine import MenuEngine
+from services.ussd_state import INITIAL_STATE, replay, step
+
+WEATHER = {
+    'temperature': 27.4,
+    'description': 'light rain',
+    'humidity': 81,
+    'wind_speed': 3.1,
+    'timestamp': '2024-05-01T10:00:00'
+}
+
+# (state before the hop, choice) pairs covering every screen
+HOPS = [
+    (INITIAL_STATE, '1'),                         # language -> main menu
+    (replay('1'), '9'),                           # invalid main menu choice
+    (replay('1'), '1'),                           # weather
+    (replay('2'), '3'),                           # tips (Dholuo)
+    (replay('1*1'), '0'),                         # back to main
+    (replay('1*3'), '00'),                        # global main menu
+]
+
+
+def bench(engine, hops):
+    data_for = {'weather': WEATHER, 'forecast': {'error': 'not benchmarked'}, None: None}
+    started = time.perf_counter()
+    for i in range(hops):
+        state, choice = HOPS[i % len(HOPS)]
+        state, screen = step(state, choice)
+        engine.render(screen, state.language, state.location, data_for[engine.needs(screen)])
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hops', type=int, default=200000)
+    args = parser.parse_args()
+
+    engine = MenuEngine(advice=AdviceEngine().advise)
+    bench(engine, 1000)  # warm up
+    elapsed = bench(engine, args.hops)
+    print(f"{args.hops} hops in {elapsed:.3f}s: {elapsed / args.hops * 1e6:.2f} us/hop, {args.hops / elapsed:.0f} hops/sec")
+
+
+if __name__ == '__main__':
+    main()
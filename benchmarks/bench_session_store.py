@@ -0,0 +1,74 @@
+"""Measure session store throughput for each backend.
+
+Usage: python -m benchmarks.bench_session_store [--sessions N] [--threads T]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from services.session_store import InMemorySessionStore, SQLiteSessionStore, SessionRecord
+
+
+def _run(store, session_ids, op):
+    started = time.perf_counter()
+    for session_id in session_ids:
+        op(store, session_id)
+    return time.perf_counter() - started
+
+
+def _put(store, session_id):
+    store.put(session_id, SessionRecord('+256700000000'))
+
+
+def _hop(store, session_id):
+    # One USSD hop: load the session, update it, write it back
+    record = store.get(session_id)
+    record.current_menu = 'main'
+    store.put(session_id, record)
+
+
+def bench(store, sessions, threads):
+    results = {}
+    ids = [f"ATUid_{i}" for i in range(sessions)]
+    chunks = [ids[i::threads] for i in range(threads)]
+
+    for name, op in (('put', _put), ('get', lambda s, sid: s.get(sid)), ('hop', _hop), ('delete', lambda s, sid: s.delete(sid))):
+        workers = [threading.Thread(target=_run, args=(store, chunk, op)) for chunk in chunks]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        results[name] = sessions / elapsed
+
+    for session_id in ids:
+        _put(store, session_id)
+    started = time.perf_counter()
+    evicted = store.sweep(now=time.time() + store.ttl + 1)
+    results['sweep'] = evicted / (time.perf_counter() - started)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=20000)
+    parser.add_argument('--threads', type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = {
+            'memory': InMemorySessionStore(),
+            'sqlite': SQLiteSessionStore(os.path.join(tmp, 'sessions.sqlite3')),
+        }
+        print(f"{args.sessions} sessions, {args.threads} threads (ops/sec)")
+        print(f"{'backend':<8} {'put':>10} {'get':>10} {'hop':>10} {'delete':>10} {'sweep':>10}")
+        for name, store in backends.items():
+            r = bench(store, args.sessions, args.threads)
+            print(f"{name:<8} {r['put']:>10.0f} {r['get']:>10.0f} {r['hop']:>10.0f} {r['delete']:>10.0f} {r['sweep']:>10.0f}")
+            store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Show request coalescing: N threads hit a cold WeatherService cache at once.
+
+The upstream is stubbed with a slow fake, so this runs offline.
+Usage: python -m benchmarks.bench_singleflight [--threads N] [--latency SECONDS]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+os.environ.setdefault('OPENWEATHERMAP_API_KEY', 'benchmark')
+os.environ.setdefault('GEOCODE_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'bench_geocode.sqlite3'))
+os.environ.setdefault('HISTORY_PATH', '')  # only the upstream calls matter here
+
+from services.weather_service import WeatherService
+
+CURRENT_WEATHER = {
+    'main': {'temp': 26.0, 'humidity': 70},
+    'weather': [{'description': 'scattered clouds'}],
+    'wind': {'speed': 2.5},
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.5)
+    args = parser.parse_args()
+
+    upstream_calls = []
+
+    def slow_upstream(endpoint, params, deadline=None):
+        upstream_calls.append(endpoint)
+        time.sleep(args.latency)
+        return CURRENT_WEATHER
+
+    service = WeatherService()
+    service._get_weather_data = slow_upstream
+
+    barrier = threading.Barrier(args.threads)
+    results = []
+
+    def caller():
+        barrier.wait()
+        results.append(service.get_weather('Gulu'))
+
+    threads = [threading.Thread(target=caller) for _ in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    errors = sum(1 for r in results if 'error' in r)
+    print(f"{args.threads} concurrent callers, {args.latency}s upstream latency")
+    print(f"upstream calls: {len(upstream_calls)}, errors: {errors}, wall time: {elapsed:.2f}s")
+    print(f"coalescing: {service.inflight.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Cold-start cost: import app, create_app() and the first requests, in fresh interpreters.
+
+Each run starts a new Python process (so nothing is already imported),
+pointed at the local upstream stand-in, and times:
+  import      `import app`
+  create_app  building the services and the Flask app
+  first_menu  first USSD hop (language menu, no I/O)
+  first_ussd  first USSD weather screen (geocode + upstream fetch)
+  first_api   first /api/weather call for another district
+
+Usage: python -m benchmarks.bench_startup [--runs 5] [--latency 0.05] [--importtime]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.fake_upstream import FakeUpstream
+
+PROBE = r"""
+import json, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+application = app.create_app()
+t2 = time.perf_counter()
+client = application.test_client()
+hop = {'sessionId': 'startup', 'phoneNumber': '+256700000000'}
+client.post('/ussd', data=dict(hop, text=''))
+t3 = time.perf_counter()
+client.post('/ussd', data=dict(hop, text='1'))  # English -> main menu (untimed)
+t3b = time.perf_counter()
+client.post('/ussd', data=dict(hop, text='1*1'))  # weather for Gulu
+t4 = time.perf_counter()
+client.get('/api/weather', query_string={'location': 'Lira'})
+t5 = time.perf_counter()
+print(json.dumps({
+    'import': t1 - t0, 'create_app': t2 - t1, 'first_menu': t3 - t2,
+    'first_ussd': t4 - t3b, 'first_api': t5 - t4,
+}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.05, help='stand-in upstream latency (s)')
+    parser.add_argument('--importtime', action='store_true', help='print the slowest imports of one run')
+    args = parser.parse_args()
+
+    fake = FakeUpstream(latency=args.latency).start()
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(
+            os.environ,
+            OPENWEATHERMAP_API_KEY='benchmark',
+            OPENWEATHERMAP_BASE_URL=f"{fake.url}/data/2.5",
+            NOMINATIM_DOMAIN=fake.netloc,
+            NOMINATIM_SCHEME='http',
+            AFRICASTALKING_USERNAME='sandbox',
+            AFRICASTALKING_API_KEY='benchmark',
+            GEOCODE_CACHE_PATH=os.path.join(workdir, 'geocode.sqlite3'),
+            HISTORY_PATH=os.path.join(workdir, 'history'),
+            SUBSCRIBER_DB_PATH=os.path.join(workdir, 'subscribers.sqlite3'),
+            PREFETCH_ENABLED='0',  # measure the cold request path, not a background refresh
+        )
+        for _ in range(args.runs):
+            out = subprocess.run([sys.executable, '-c', PROBE], env=env, capture_output=True, text=True, check=True)
+            results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+        if args.importtime:
+            out = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                                 env=env, capture_output=True, text=True, check=True)
+            rows = []
+            for line in out.stderr.splitlines():
+                if line.startswith('import time:') and '|' in line:
+                    _, cumulative, name = line.split('|')
+                    if cumulative.strip().isdigit():
+                        rows.append((int(cumulative), name.rstrip()))
+            print("slowest imports (cumulative ms):")
+            for cumulative, name in sorted(rows, reverse=True)[:15]:
+                print(f"  {cumulative / 1000:8.1f}  {name}")
+    fake.stop()
+
+    print(f"{args.runs} fresh processes, upstream latency {args.latency}s (median / max ms)")
+    for key in ('import', 'create_app', 'first_menu', 'first_ussd', 'first_api'):
+        values = [r[key] * 1000 for r in results]
+        print(f"  {key:<11} {statistics.median(values):8.1f} {max(values):8.1f}")
+
+
+if __name__ == '__main__':
+    main()
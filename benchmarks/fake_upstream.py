@@ -0,0 +1,231 @@
+"""Local stand-in for OpenWeatherMap, Nominatim and Africa's Talking SMS with latency and error injection.
+
+Serves /data/2.5/weather, /data/2.5/forecast and Nominatim's /search with
+plausible payloads for any coordinates, accepts bulk SMS on
+/version1/messaging (recording every recipient), and counts every call.
+
+Usage: python -m benchmarks.fake_upstream [--port 8099] [--latency 0.2] [--error-rate 0.05]
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+SMS_PATH = '/version1/messaging'
+
+CONDITIONS = [
+    (500, 'light rain'),
+    (501, 'moderate rain'),
+    (211, 'thunderstorm'),
+    (800, 'clear sky'),
+    (802, 'scattered clouds'),
+    (804, 'overcast clouds'),
+]
+
+
+def _current_weather(lat, lon, rng):
+    weather_id, description = rng.choice(CONDITIONS)
+    return {
+        'coord': {'lat': lat, 'lon': lon},
+        'weather': [{'id': weather_id, 'main': description.title(), 'description': description}],
+        'main': {
+            'temp': round(rng.uniform(17, 32), 2),
+            'humidity': rng.randint(40, 95),
+            'pressure': 1012,
+        },
+        'wind': {'speed': round(rng.uniform(0.5, 6), 1)},
+        'dt': int(time.time()),
+        'timezone': 10800,
+        'name': 'Stand-in',
+    }
+
+
+def _forecast(lat, lon, rng):
+    start = int(time.time()) // 10800 * 10800 + 10800
+    items = []
+    for i in range(40):
+        dt = start + i * 10800
+        weather_id, description = rng.choice(CONDITIONS)
+        temp = rng.uniform(17, 32)
+        item = {
+            'dt': dt,
+            'dt_txt': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(dt)),
+            'main': {
+                'temp': round(temp, 2),
+                'temp_min': round(temp - rng.uniform(0, 2), 2),
+                'temp_max': round(temp + rng.uniform(0, 2), 2),
+                'humidity': rng.randint(40, 95),
+            },
+            'weather': [{'id': weather_id, 'description': description}],
+            'pop': round(rng.random(), 2),
+        }
+        if weather_id < 600:
+            item['rain'] = {'3h': round(rng.uniform(0.2, 12), 2)}
+        items.append(item)
+    return {
+        'cod': '200',
+        'list': items,
+        'city': {'name': 'Stand-in', 'coord': {'lat': lat, 'lon': lon}, 'timezone': 10800},
+    }
+
+
+class FakeUpstream:
+    """Threaded HTTP server standing in for the weather and geocoding APIs"""
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, error_rate=0.0, seed=None,
+                 sms_failure_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.sms_failure_rate = sms_failure_rate
+        self.counts = Counter()
+        self.sms_received = Counter()  # (number, message) -> times accepted
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def sms_url(self):
+        return f"{self.url}{SMS_PATH}"
+
+    @property
+    def netloc(self):
+        host, port = self._server.server_address[:2]
+        return f"{host}:{port}"
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _start(self, path):
+                """Count the call, apply latency; return an rng or None if an error was injected"""
+                with fake._lock:
+                    fake.counts[path] += 1
+                    delay = fake.latency + fake._rng.uniform(0, fake.jitter)
+                    fail = fake._rng.random() < fake.error_rate
+                    rng = random.Random(fake._rng.random())
+                if delay:
+                    time.sleep(delay)
+                if fail:
+                    with fake._lock:
+                        fake.counts['errors'] += 1
+                    self._send_json(503, {'cod': 503, 'message': 'injected error'})
+                    return None
+                return rng
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                length = int(self.headers.get('Content-Length', 0))
+                form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode()).items()}
+                rng = self._start(url.path)
+                if rng is None:
+                    return
+                if url.path != SMS_PATH:
+                    self._send_json(404, {'message': 'not found'})
+                    return
+                recipients = []
+                with fake._lock:
+                    for number in form.get('to', '').split(','):
+                        ok = rng.random() >= fake.sms_failure_rate
+                        if ok:
+                            fake.sms_received[(number, form.get('message', ''))] += 1
+                        recipients.append({
+                            'number': number,
+                            'status': 'Success' if ok else 'Failed',
+                            'statusCode': 101 if ok else 500,
+                            'cost': 'UGX 30.0000' if ok else '0',
+                            'messageId': f"ATXid_{rng.getrandbits(48):x}"
+                        })
+                    fake.counts['sms_recipients'] += len(recipients)
+                self._send_json(201, {'SMSMessageData': {
+                    'Message': f"Sent to {sum(r['status'] == 'Success' for r in recipients)}/{len(recipients)}",
+                    'Recipients': recipients
+                }})
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                rng = self._start(url.path)
+                if rng is None:
+                    return
+
+                lat = float(query.get('lat', 2.77))
+                lon = float(query.get('lon', 32.29))
+                if url.path.endswith('/weather'):
+                    self._send_json(200, _current_weather(lat, lon, rng))
+                elif url.path.endswith('/forecast'):
+                    self._send_json(200, _forecast(lat, lon, rng))
+                elif url.path == '/search':
+                    name = query.get('q', '')
+                    if name.lower().startswith('nowhere'):
+                        self._send_json(200, [])
+                    else:
+                        self._send_json(200, [{
+                            'lat': str(round(rng.uniform(1.5, 3.5), 4)),
+                            'lon': str(round(rng.uniform(31.0, 34.0), 4)),
+                            'display_name': f"{name}, Uganda",
+                        }])
+                else:
+                    self._send_json(404, {'message': 'not found'})
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-upstream", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def snapshot_counts(self):
+        with self._lock:
+            return dict(self.counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra random seconds per response')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with 503')
+    args = parser.parse_args()
+
+    fake = FakeUpstream(port=args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate)
+    print(f"Serving on {fake.url}")
+    print(f"  OPENWEATHERMAP_BASE_URL={fake.url}/data/2.5")
+    print(f"  NOMINATIM_DOMAIN={fake.netloc} NOMINATIM_SCHEME=http")
+    print(f"  SMS_API_URL={fake.sms_url}")
+    fake.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == '__main__':
+    main()
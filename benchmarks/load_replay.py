@@ -0,0 +1,155 @@
+"""Replay concurrent USSD sessions against the Flask app, fully offline.
+
+Starts the local OpenWeatherMap/Nominatim stand-in, points the app at it,
+then drives generated (or recorded JSONL) sessions through /ussd with a
+thread pool. Reports throughput, hop latency percentiles, upstream call
+counts and how much the session store and process memory grew.
+
+Usage: python -m benchmarks.load_replay [--sessions 2000] [--concurrency 32]
+           [--latency 0.3] [--error-rate 0.02] [--trace sessions.jsonl]
+           [--record sessions.jsonl] [--no-prefetch] [--stateless]
+"""
+import argparse
+import os
+import random
+import resource
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_upstream import FakeUpstream
+from benchmarks.traces import generate_sessions, read_jsonl, write_jsonl
+
+API_LOCATIONS = ['Gulu', 'Kitgum', 'Lira', 'Amuru', 'Awere', 'Patongo', 'Anaka', 'Nowhere Village']
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def configure_environment(fake, args, workdir):
+    """Point the app at the stand-in; must run before the app is imported"""
+    os.environ['OPENWEATHERMAP_API_KEY'] = 'benchmark'
+    os.environ['OPENWEATHERMAP_BASE_URL'] = f"{fake.url}/data/2.5"
+    os.environ['NOMINATIM_DOMAIN'] = fake.netloc
+    os.environ['NOMINATIM_SCHEME'] = 'http'
+    os.environ.setdefault('AFRICASTALKING_USERNAME', 'sandbox')
+    os.environ.setdefault('AFRICASTALKING_API_KEY', 'benchmark')
+    os.environ['GEOCODE_CACHE_PATH'] = os.path.join(workdir, 'geocode.sqlite3')
+    os.environ['SESSION_DB_PATH'] = os.path.join(workdir, 'sessions.sqlite3')
+    os.environ['HISTORY_PATH'] = os.path.join(workdir, 'history')
+    os.environ['SUBSCRIBER_DB_PATH'] = os.path.join(workdir, 'subscribers.sqlite3')
+    os.environ['PREFETCH_ENABLED'] = '0' if args.no_prefetch else '1'
+    os.environ['USSD_STATELESS'] = '1' if args.stateless else '0'
+    # One shortcode carries all the replayed traffic; phone limits still apply
+    os.environ.setdefault('USSD_SERVICE_CODE_RATE', '0')
+
+
+def max_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_session(app, session, latencies, statuses):
+    client = app.test_client()
+    for text in session['hops']:
+        started = time.perf_counter()
+        response = client.post('/ussd', data={
+            'sessionId': session['session_id'],
+            'serviceCode': session['service_code'],
+            'phoneNumber': session['phone_number'],
+            'text': text,
+        })
+        latencies.append(time.perf_counter() - started)
+        body = response.get_data(as_text=True)
+        statuses.append(body[:3])
+        if body.startswith('END'):
+            break
+
+
+def run_api_request(app, location, latencies):
+    client = app.test_client()
+    started = time.perf_counter()
+    client.get('/api/weather', query_string={'location': location})
+    latencies.append(time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--latency', type=float, default=0.3, help='stand-in upstream latency (s)')
+    parser.add_argument('--jitter', type=float, default=0.1)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--api-requests', type=int, default=200, help='/api/weather calls mixed in')
+    parser.add_argument('--trace', help='replay sessions from this JSONL file')
+    parser.add_argument('--record', help='write the generated sessions to this JSONL file')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--no-prefetch', action='store_true')
+    parser.add_argument('--stateless', action='store_true')
+    args = parser.parse_args()
+
+    sessions = read_jsonl(args.trace) if args.trace else generate_sessions(args.sessions, args.seed)
+    if args.record:
+        write_jsonl(sessions, args.record)
+
+    fake = FakeUpstream(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, seed=args.seed).start()
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_environment(fake, args, workdir)
+        from app import create_app
+        app = create_app()
+        ussd_service = app.extensions['ussd_service']
+
+        if ussd_service.prefetcher is not None:
+            # Let the first background refresh land, as it would in production
+            deadline = time.monotonic() + 10
+            while time.monotonic() < deadline and not all(ussd_service.prefetcher.get(loc) for loc in ussd_service.prefetcher.locations):
+                time.sleep(0.05)
+
+        baseline_counts = fake.snapshot_counts()
+        sessions_before = len(ussd_service.sessions) if ussd_service.sessions is not None else 0
+        rss_before = max_rss_kb()
+
+        hop_latencies = []
+        api_latencies = []
+        statuses = []
+        rng = random.Random(args.seed)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            futures = [pool.submit(run_session, app, s, hop_latencies, statuses) for s in sessions]
+            futures += [
+                pool.submit(run_api_request, app, rng.choice(API_LOCATIONS), api_latencies)
+                for _ in range(args.api_requests)
+            ]
+            for future in futures:
+                future.result()
+        elapsed = time.perf_counter() - started
+
+        sessions_after = len(ussd_service.sessions) if ussd_service.sessions is not None else 0
+        rss_after = max_rss_kb()
+        counts = fake.snapshot_counts()
+        rejected = app.extensions['admission'].stats()['rejected']
+        fake.stop()
+
+    upstream = {k: counts.get(k, 0) - baseline_counts.get(k, 0) for k in counts}
+    hop_latencies.sort()
+    api_latencies.sort()
+    mode = 'stateless' if args.stateless else 'stateful'
+    print(f"{len(sessions)} sessions, {len(hop_latencies)} hops, {args.concurrency} concurrent, "
+          f"{mode}, prefetch {'off' if args.no_prefetch else 'on'}, "
+          f"upstream latency {args.latency}s+{args.jitter}s, error rate {args.error_rate}")
+    print(f"throughput: {len(hop_latencies) / elapsed:.1f} hops/s, {len(sessions) / elapsed:.1f} sessions/s ({elapsed:.2f}s)")
+    print("hop latency ms: p50 {:.1f}  p95 {:.1f}  p99 {:.1f}  max {:.1f}".format(
+        *(percentile(hop_latencies, p) * 1000 for p in (0.5, 0.95, 0.99, 1.0))))
+    if api_latencies:
+        print("api latency ms: p50 {:.1f}  p95 {:.1f}  p99 {:.1f}".format(
+            *(percentile(api_latencies, p) * 1000 for p in (0.5, 0.95, 0.99))))
+    print(f"responses: {statuses.count('CON')} CON, {statuses.count('END')} END")
+    print(f"upstream calls: {upstream}; refused by admission control: {rejected}")
+    print(f"sessions stored: {sessions_before} -> {sessions_after}; max RSS grew {(rss_after - rss_before) / 1024:.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Generate, record and load multi-hop USSD session traces.
+
+A trace is one session per JSONL line:
+    {"session_id": ..., "phone_number": ..., "service_code": ..., "hops": ["", "1", "1*2", ...]}
+where each hop is the full accumulated `text` the gateway would send.
+
+Usage: python -m benchmarks.traces --sessions 1000 --out sessions.jsonl
+"""
+import argparse
+import json
+import random
+
+SERVICE_CODE = "*123#"
+
+
+def generate_session(rng, index):
+    """Build one realistic session: language -> main -> 1-3 screens -> exit"""
+    choices = [rng.choices(['1', '2'], weights=[7, 3])[0]]
+    if rng.random() < 0.05:
+        choices.insert(0, '9')  # mistyped language choice
+    for _ in range(rng.choices([1, 2, 3], weights=[5, 3, 2])[0]):
+        choices.append(rng.choices(['1', '2', '3', '7'], weights=[5, 3, 3, 1])[0])
+        if choices[-1] == '7':
+            continue  # invalid main menu choice, stays on main
+        if rng.random() < 0.1:
+            choices.append('5')  # stray key on a content screen redisplays it
+        choices.append(rng.choice(['0', '00']))  # back to the main menu
+    if rng.random() < 0.8:
+        choices.append('0')  # explicit exit; otherwise the user just hangs up
+
+    hops = ['']
+    for i in range(len(choices)):
+        hops.append('*'.join(choices[:i + 1]))
+    return {
+        'session_id': f"ATUid_{index:08d}",
+        'phone_number': f"+2567{rng.randint(0, 99999999):08d}",
+        'service_code': SERVICE_CODE,
+        'hops': hops,
+    }
+
+
+def generate_sessions(count, seed=None):
+    rng = random.Random(seed)
+    return [generate_session(rng, i) for i in range(count)]
+
+
+def write_jsonl(sessions, path):
+    with open(path, 'w') as f:
+        for session in sessions:
+            f.write(json.dumps(session) + '\n')
+
+
+def read_jsonl(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out', required=True)
+    args = parser.parse_args()
+    write_jsonl(generate_sessions(args.sessions, args.seed), args.out)
+
+
+if __name__ == '__main__':
+    main()
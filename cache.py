@@ -0,0 +1,149 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class CacheEntry:
+    """A cached value together with the time it was fetched"""
+    __slots__ = ('value', 'fetched_at', 'expires_at')
+
+    def __init__(self, value, fetched_at, expires_at):
+        self.value = value
+        self.fetched_at = fetched_at
+        self.expires_at = expires_at
+
+    def is_fresh(self, now=None):
+        return (now if now is not None else time.time()) < self.expires_at
+
+
+class TTLCache:
+    """Bounded LRU cache with a per-entry TTL and stale-while-revalidate.
+
+    Once an entry's TTL runs out it keeps being served while a single
+    background thread reloads it. Loaders return None on failure, in which
+    case nothing is stored and any stale entry is kept.
+    """
+
+    def __init__(self, ttl=600, max_entries=512):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def peek(self, key):
+        """Return the entry for key (fresh or stale) without loading or counting"""
+        with self._lock:
+            return self._entries.get(key)
+
+    def put(self, key, value):
+        """Store value under key and return the new entry"""
+        now = time.time()
+        entry = CacheEntry(value, now, now + self.ttl)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def lookup(self, key):
+        """Return (entry or None, whether the caller should start a refresh), counting the lookup.
+
+        A stale entry is handed out for refresh to one caller at a time; that
+        caller must report back with refresh_done().
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, False
+            self._entries.move_to_end(key)
+            if entry.is_fresh():
+                self.hits += 1
+                return entry, False
+            self.stale_hits += 1
+            if key in self._refreshing:
+                return entry, False
+            self._refreshing.add(key)
+            return entry, True
+
+    def refresh_done(self, key, value):
+        """Finish a refresh started via lookup(); value None means it failed"""
+        try:
+            if value is None:
+                self.refresh_failures += 1
+            else:
+                self.put(key, value)
+                self.refreshes += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def fetch(self, key, loader, refresh_loader=None):
+        """Return the entry for key, calling loader() on a miss.
+
+        Stale entries are reloaded in the background with refresh_loader
+        (defaults to loader). Returns None if the key is missing and the
+        loader fails.
+        """
+        entry, start_refresh = self.lookup(key)
+        if entry is None:
+            value = loader()
+            if value is None:
+                return None
+            return self.put(key, value)
+
+        if start_refresh:
+            threading.Thread(
+                target=self._refresh,
+                args=(key, refresh_loader or loader),
+                name="cache-refresh",
+                daemon=True
+            ).start()
+        return entry
+
+    def get(self, key, loader):
+        """Like fetch() but return the cached value itself"""
+        entry = self.fetch(key, loader)
+        return entry.value if entry is not None else None
+
+    def _refresh(self, key, loader):
+        value = None
+        try:
+            value = loader()
+        except Exception as e:
+            logger.warning("Error refreshing cache entry %s: %s", key, e)
+        finally:
+            self.refresh_done(key, value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return hit/miss/stale counters and current size"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'stale_hits': self.stale_hits,
+            'refreshes': self.refreshes,
+            'refresh_failures': self.refresh_failures,
+            'evictions': self.evictions,
+            'size': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl': self.ttl
+        }
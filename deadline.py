@@ -0,0 +1,40 @@
+import os
+import time
+
+USSD_DEADLINE = float(os.getenv('USSD_DEADLINE', '2.0'))  # seconds the gateway gives us per hop
+USSD_DEADLINE_RESERVE = float(os.getenv('USSD_DEADLINE_RESERVE', '0.25'))  # kept back to render and reply
+
+
+class DeadlineExceeded(Exception):
+    """Raised when there is no time budget left for an upstream call"""
+
+
+class Deadline:
+    """A point in (monotonic) time by which a request must be answered"""
+    __slots__ = ('expires_at',)
+
+    def __init__(self, budget):
+        self.expires_at = time.monotonic() + budget
+
+    def reserve(self, seconds):
+        """Return a Deadline that expires `seconds` before this one"""
+        earlier = Deadline(0)
+        earlier.expires_at = self.expires_at - seconds
+        return earlier
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self, reserve=0.0):
+        """True once less than `reserve` seconds are left"""
+        return self.remaining() <= reserve
+
+    def timeout(self, cap=None, reserve=0.0):
+        """Seconds an operation may take: the remaining budget less `reserve`, at most `cap`.
+
+        Raises DeadlineExceeded if nothing is left.
+        """
+        budget = self.remaining() - reserve
+        if budget <= 0:
+            raise DeadlineExceeded("Request deadline exceeded")
+        return min(cap, budget) if cap is not None else budget
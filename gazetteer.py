@@ -0,0 +1,90 @@
+"""Bundled coordinates for the districts and sub-counties we serve.
+
+Coordinates are approximate town/administrative centres, which is well
+within the ~1km grid the weather cache rounds to. Keys are normalized with
+normalize_place_name().
+"""
+
+import re
+
+_SUFFIXES = (', uganda', ' uganda', ' district', ' sub-county', ' subcounty', ' division')
+
+
+def normalize_place_name(name):
+    """Lowercase, collapse whitespace and drop common suffixes"""
+    name = re.sub(r'\s+', ' ', (name or '').strip().lower())
+    changed = True
+    while changed:
+        changed = False
+        for suffix in _SUFFIXES:
+            if name.endswith(suffix) and len(name) > len(suffix):
+                name = name[:-len(suffix)].rstrip(' ,')
+                changed = True
+    return name
+
+
+DISTRICTS = {
+    # Acholi
+    'gulu': (2.7724, 32.2881),
+    'amuru': (2.8139, 31.9386),
+    'nwoya': (2.6342, 32.0013),
+    'omoro': (2.7153, 32.4911),
+    'kitgum': (3.2783, 32.8867),
+    'pader': (2.8787, 33.0869),
+    'agago': (2.9842, 33.3306),
+    'lamwo': (3.5297, 32.8036),
+    # Lango
+    'lira': (2.2499, 32.8999),
+    'apac': (1.9756, 32.5386),
+    'oyam': (2.2350, 32.3850),
+    'kole': (2.4286, 32.8014),
+    'dokolo': (1.9167, 33.1667),
+    'alebtong': (2.2447, 33.2567),
+    'otuke': (2.5000, 33.3333),
+    'amolatar': (1.6333, 32.8333),
+    # West Nile
+    'arua': (3.0201, 30.9111),
+    'adjumani': (3.3779, 31.7909),
+    'moyo': (3.6609, 31.7247),
+    'yumbe': (3.4651, 31.2469),
+    'koboko': (3.4136, 30.9599),
+    'nebbi': (2.4758, 31.0900),
+    'zombo': (2.5135, 30.9088),
+    # Elsewhere
+    'kampala': (0.3476, 32.5825),
+    'entebbe': (0.0512, 32.4637),
+    'jinja': (0.4244, 33.2042),
+    'mbale': (1.0827, 34.1750),
+    'soroti': (1.7146, 33.6111),
+    'masindi': (1.6744, 31.7150),
+    'hoima': (1.4356, 31.3436),
+    'moroto': (2.5345, 34.6666),
+    'kotido': (2.9806, 34.1331),
+    'mbarara': (-0.6072, 30.6545),
+    'fort portal': (0.6710, 30.2750),
+}
+
+SUB_COUNTIES = {
+    # Gulu city divisions and sub-counties
+    'bardege': (2.7900, 32.3000),
+    'laroo': (2.7650, 32.3100),
+    'layibi': (2.7500, 32.2800),
+    'pece': (2.7700, 32.2850),
+    'bungatira': (2.8600, 32.3300),
+    'paicho': (2.7400, 32.1900),
+    'patiko': (2.9500, 32.3300),
+    'awach': (2.9700, 32.5000),
+    'palaro': (3.0200, 32.2800),
+    'unyama': (2.8300, 32.4000),
+    'koro': (2.6300, 32.3300),
+    'bobi': (2.5800, 32.4000),
+    'odek': (2.6300, 32.6000),
+    'lalogi': (2.7700, 32.5400),
+}
+
+PLACES = {**SUB_COUNTIES, **DISTRICTS}
+
+
+def lookup(name):
+    """Return (lat, lon) for a known place name or None"""
+    return PLACES.get(normalize_place_name(name))
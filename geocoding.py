@@ -0,0 +1,142 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from . import gazetteer
+from .instrumentation import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+GEOCODE_CACHE_PATH = os.getenv('GEOCODE_CACHE_PATH', 'geocode_cache.sqlite3')
+GEOCODE_CACHE_TTL = int(os.getenv('GEOCODE_CACHE_TTL', str(30 * 24 * 3600)))  # seconds
+GEOCODE_NEGATIVE_TTL = int(os.getenv('GEOCODE_NEGATIVE_TTL', str(24 * 3600)))  # seconds
+GEOCODE_TIMEOUT = float(os.getenv('GEOCODE_TIMEOUT', '5'))  # seconds
+NOMINATIM_DOMAIN = os.getenv('NOMINATIM_DOMAIN', 'nominatim.openstreetmap.org')
+NOMINATIM_SCHEME = os.getenv('NOMINATIM_SCHEME', 'https')
+
+
+class GeocodeCache:
+    """SQLite-backed geocode cache that survives restarts.
+
+    Stores both hits and misses; misses expire after their own (shorter) TTL.
+    """
+
+    def __init__(self, path=GEOCODE_CACHE_PATH, ttl=GEOCODE_CACHE_TTL, negative_ttl=GEOCODE_NEGATIVE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS geocode ("
+            "query TEXT PRIMARY KEY, lat REAL, lon REAL, found INTEGER NOT NULL, fetched_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, query):
+        """Return (found, lat, lon) for a cached query, or None if missing/expired"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT lat, lon, found, fetched_at FROM geocode WHERE query = ?", (query,)
+            ).fetchone()
+        if row is None:
+            return None
+        lat, lon, found, fetched_at = row
+        ttl = self.ttl if found else self.negative_ttl
+        if time.time() - fetched_at > ttl:
+            return None
+        return bool(found), lat, lon
+
+    def put(self, query, lat, lon):
+        """Cache a result; pass lat/lon of None to record a miss"""
+        found = lat is not None and lon is not None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO geocode (query, lat, lon, found, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (query, lat, lon, int(found), time.time())
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class Geocoder:
+    """Resolve place names: bundled gazetteer, then the on-disk cache, then Nominatim"""
+
+    def __init__(self, cache=None, geolocator=None):
+        self.cache = cache if cache is not None else GeocodeCache()
+        self._geolocator = geolocator
+        self._geolocator_lock = threading.Lock()
+        self.gazetteer_hits = 0
+        self.cache_hits = 0
+        self.negative_hits = 0
+        self.upstream_calls = 0
+
+    @property
+    def geolocator(self):
+        """Nominatim client, created (and geopy imported) only when a lookup needs the network"""
+        if self._geolocator is None:
+            with self._geolocator_lock:
+                if self._geolocator is None:
+                    from geopy.geocoders import Nominatim
+                    self._geolocator = Nominatim(
+                        user_agent="farmer_weather_app", domain=NOMINATIM_DOMAIN, scheme=NOMINATIM_SCHEME
+                    )
+        return self._geolocator
+
+    def lookup(self, location, deadline=None, allow_network=True):
+        """Return (lat, lon) for a location name, or (None, None) if unknown.
+
+        With allow_network=False only the gazetteer and on-disk cache are used.
+        """
+        coords = self.lookup_gazetteer(location)
+        if coords:
+            return coords
+
+        query = gazetteer.normalize_place_name(location)
+        cached = self.cache.get(query)
+        if cached is not None:
+            found, lat, lon = cached
+            if found:
+                self.cache_hits += 1
+                return lat, lon
+            self.negative_hits += 1
+            return None, None
+
+        if not allow_network:
+            return None, None
+
+        self.upstream_calls += 1
+        try:
+            timeout = deadline.timeout(cap=GEOCODE_TIMEOUT) if deadline is not None else GEOCODE_TIMEOUT
+            with STAGE_SECONDS.time('geocode_upstream'):
+                location_data = self.geolocator.geocode(location, timeout=timeout)
+        except Exception as e:
+            # Network/throttling errors are not cached so the next request retries
+            logger.warning("Error getting coordinates for %s: %s", location, e)
+            return None, None
+
+        if location_data:
+            lat, lon = location_data.latitude, location_data.longitude
+        else:
+            lat, lon = None, None
+        self.cache.put(query, lat, lon)
+        return lat, lon
+
+    def lookup_gazetteer(self, location):
+        """(lat, lon) from the bundled gazetteer only (no I/O), or None"""
+        coords = gazetteer.lookup(location)
+        if coords:
+            self.gazetteer_hits += 1
+        return coords
+
+    def stats(self):
+        return {
+            'gazetteer_hits': self.gazetteer_hits,
+            'cache_hits': self.cache_hits,
+            'negative_hits': self.negative_hits,
+            'upstream_calls': self.upstream_calls
+        }
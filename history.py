@@ -0,0 +1,558 @@
+"""Append-only, columnar history of observed weather.
+
+Each column is a flat binary file of fixed-size values (array typecodes), so
+appending an observation is a handful of small writes and loading a column
+is a single read into an array. Location keys and condition descriptions
+are dictionary-encoded into small integer ids.
+
+    <path>/CURRENT          name of the live generation directory
+    <path>/gen-<n>/*.col    one file per column
+    <path>/gen-<n>/dictionary.txt   "<kind>\t<value>" lines; ids are line order per kind
+    <path>/.lock            flock held while appending or compacting
+    <path>/.compactor       flock held by the one process that runs compaction
+
+Each process keeps the rows in memory as per-location column arrays sorted
+by time, so a time window is a contiguous slice and aggregates run over
+array slices. Rows appended by other processes are picked up by reading the
+tail of each column file.
+
+Compaction rewrites the live rows (within the retention window, grouped by
+location and sorted, duplicates dropped) into a new generation and switches
+CURRENT atomically, so readers never see a half-compacted set of columns.
+It runs on a background thread in whichever process holds the compactor
+lock, never inside an append.
+
+Where flock is unavailable (Windows has no fcntl) the file locks are
+skipped and the history must only be used by one process.
+"""
+
+import logging
+import os
+import shutil
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+HISTORY_PATH = os.getenv('HISTORY_PATH', 'weather_history')  # empty = no history
+HISTORY_RETENTION_DAYS = int(os.getenv('HISTORY_RETENTION_DAYS', '60'))
+HISTORY_COMPACT_INTERVAL = int(os.getenv('HISTORY_COMPACT_INTERVAL', '3600'))  # seconds
+HISTORY_SYNC_INTERVAL = float(os.getenv('HISTORY_SYNC_INTERVAL', '1'))  # seconds between checks for other writers
+HISTORY_FALLBACK_MAX_AGE = int(os.getenv('HISTORY_FALLBACK_MAX_AGE', '21600'))  # oldest observation shown offline
+
+COLUMNS = (
+    ('key', 'H'),           # dictionary id of the location key
+    ('observed_at', 'd'),   # epoch seconds (upstream observation time)
+    ('temperature', 'f'),   # degrees C
+    ('humidity', 'B'),      # percent
+    ('condition', 'H'),     # OpenWeatherMap condition id (2xx thunderstorm ... 8xx clouds)
+    ('description', 'H'),   # dictionary id of the description text
+    ('rain_mm', 'f'),       # rain in the last hour, when reported
+    ('utc_offset', 'i'),    # seconds east of UTC at the location, for local days
+)
+TYPECODES = dict(COLUMNS)
+SERIES_COLUMNS = tuple(name for name, _ in COLUMNS if name != 'key')
+ROW_BYTES = sum(array(typecode).itemsize for _, typecode in COLUMNS)
+
+Observation = namedtuple('Observation', ['observed_at', 'temperature', 'humidity', 'condition', 'description', 'rain_mm'])
+
+
+def is_wet(condition, rain_mm):
+    """Thunderstorm, drizzle, rain or snow (OWM ids below 700), or any measured rain"""
+    return condition < 700 or rain_mm > 0
+
+
+def _local_day(ts, utc_offset):
+    return int((ts + utc_offset) // 86400)
+
+
+class ObservationHistory:
+    """Columnar observation store shared by all processes on the host"""
+
+    def __init__(self, path=HISTORY_PATH, retention_days=HISTORY_RETENTION_DAYS,
+                 compact_interval=HISTORY_COMPACT_INTERVAL, sync_interval=HISTORY_SYNC_INTERVAL):
+        self.path = path
+        self.retention = retention_days * 86400
+        self.compact_interval = compact_interval
+        self.sync_interval = sync_interval
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.RLock()
+        self._lock_path = os.path.join(path, '.lock')
+        self._generation = None
+        self._next_sync = 0.0
+        self._torn = False
+        self._trend_cache = {}  # key -> ((rows, day), trends)
+        self._compact_lock = threading.Lock()
+        self._compactor_fd = None
+        self._compactor = None
+        self._stop = threading.Event()
+        self.appended = 0
+        self.compactions = 0
+        with self._file_lock():
+            if self._read_current() is None:
+                self._write_generation(0, {name: array(tc) for name, tc in COLUMNS}, {})
+        self._sync(force=True)
+
+    # -- files -------------------------------------------------------------
+
+    def _file_lock(self):
+        return _FileLock(self._lock_path)
+
+    def _read_current(self):
+        try:
+            with open(os.path.join(self.path, 'CURRENT')) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _column_path(self, name, directory=None):
+        return os.path.join(directory or self._directory, f"{name}.col")
+
+    def _write_generation(self, number, columns, dictionary):
+        name = f"gen-{number}"
+        directory = os.path.join(self.path, name)
+        self._write_columns(directory, columns)
+        self._write_dictionary(directory, dictionary)
+        self._switch_current(name)
+        return name
+
+    def _write_columns(self, directory, columns):
+        os.makedirs(directory, exist_ok=True)
+        for column, _ in COLUMNS:
+            with open(self._column_path(column, directory), 'wb') as f:
+                columns[column].tofile(f)
+
+    def _write_dictionary(self, directory, dictionary):
+        with open(os.path.join(directory, 'dictionary.txt'), 'w') as f:
+            for kind, values in dictionary.items():
+                for value in values:
+                    f.write(f"{kind}\t{value}\n")
+
+    def _switch_current(self, name):
+        tmp = os.path.join(self.path, 'CURRENT.tmp')
+        with open(tmp, 'w') as f:
+            f.write(name)
+        os.replace(tmp, os.path.join(self.path, 'CURRENT'))
+
+    def _read_rows(self, start, end, directory=None):
+        """Rows start..end of each column file, as {column: array}"""
+        chunk = {}
+        for name, tc in COLUMNS:
+            chunk[name] = array(tc)
+            with open(self._column_path(name, directory), 'rb') as f:
+                f.seek(start * array(tc).itemsize)
+                chunk[name].fromfile(f, end - start)
+        return chunk
+
+    # -- in-memory mirror ----------------------------------------------------
+
+    def _reset(self, generation):
+        self._generation = generation
+        self._directory = os.path.join(self.path, generation)
+        self._rows_loaded = 0
+        self._dictionary = {}
+        self._dictionary_offset = 0
+        self._ids = {}
+        self._series = {}  # key id -> {column: array}, sorted by observed_at
+        self._trend_cache.clear()
+
+    def _load_dictionary_tail(self):
+        with open(os.path.join(self._directory, 'dictionary.txt'), 'rb') as f:
+            f.seek(self._dictionary_offset)
+            tail = f.read()
+        end = tail.rfind(b'\n') + 1  # ignore a line still being written
+        for line in tail[:end].decode('utf-8').splitlines():
+            self._add_dictionary_entry(*line.split('\t', 1))
+        self._dictionary_offset += end
+
+    def _add_dictionary_entry(self, kind, value):
+        values = self._dictionary.setdefault(kind, [])
+        self._ids[(kind, value)] = len(values)
+        values.append(value)
+
+    def _sync(self, force=False):
+        """Load rows appended (by any process) since the last sync"""
+        now = time.monotonic()
+        if not force and now < self._next_sync:
+            return
+        with self._lock:
+            self._next_sync = now + self.sync_interval
+            generation = self._read_current()
+            if generation != self._generation:
+                self._reset(generation)
+            try:
+                sizes = [os.path.getsize(self._column_path(name)) // array(tc).itemsize for name, tc in COLUMNS]
+                complete = min(sizes)  # a concurrent append may have written only some columns
+                self._torn = complete != max(sizes)
+                if complete <= self._rows_loaded:
+                    return
+                # Dictionary entries are written before the rows that use them
+                self._load_dictionary_tail()
+                chunk = self._read_rows(self._rows_loaded, complete)
+            except FileNotFoundError:
+                # Compacted away between reading CURRENT and the columns; next sync reloads
+                self._next_sync = 0.0
+                return
+            self._rows_loaded = complete
+            self._distribute(chunk)
+
+    def _distribute(self, chunk):
+        """Add a chunk of rows to the per-location series, one run of equal keys at a time"""
+        keys = chunk['key']
+        i, n = 0, len(keys)
+        while i < n:
+            key_id = keys[i]
+            j = i + 1
+            while j < n and keys[j] == key_id:
+                j += 1
+            self._extend(key_id, {name: chunk[name][i:j] for name in SERIES_COLUMNS})
+            i = j
+
+    def _extend(self, key_id, rows):
+        series = self._series.get(key_id)
+        if series is None:
+            series = self._series[key_id] = {name: array(TYPECODES[name]) for name in SERIES_COLUMNS}
+        timestamps = rows['observed_at']
+        in_order = all(a <= b for a, b in zip(timestamps, timestamps[1:]))
+        if in_order and (not series['observed_at'] or timestamps[0] >= series['observed_at'][-1]):
+            for name in SERIES_COLUMNS:
+                series[name].extend(rows[name])
+            return
+        for row in range(len(timestamps)):  # rare: writers racing with slightly older observations
+            i = bisect_right(series['observed_at'], timestamps[row])
+            for name in SERIES_COLUMNS:
+                series[name].insert(i, rows[name][row])
+
+    # -- writes --------------------------------------------------------------
+
+    def append(self, key, observed_at, temperature, humidity, condition, description, rain_mm=0.0, utc_offset=0):
+        """Record one observation; repeats of the latest one for a key are skipped"""
+        with self._lock, self._file_lock():
+            self._sync(force=True)
+            if self._torn:
+                self._truncate_torn_append()
+            key_id = self._ids.get(('k', key))
+            if key_id is not None:
+                timestamps = self._series.get(key_id, {}).get('observed_at')
+                if timestamps and timestamps[-1] == observed_at:
+                    return False
+            new_entries = []
+            if key_id is None:
+                key_id = len(self._dictionary.get('k', ()))
+                new_entries.append(('k', key))
+            description_id = self._ids.get(('d', description))
+            if description_id is None:
+                description_id = len(self._dictionary.get('d', ()))
+                new_entries.append(('d', description))
+            if new_entries:
+                text = ''.join(f"{kind}\t{value}\n" for kind, value in new_entries).encode('utf-8')
+                with open(os.path.join(self._directory, 'dictionary.txt'), 'ab') as f:
+                    f.write(text)
+                for entry in new_entries:
+                    self._add_dictionary_entry(*entry)
+                self._dictionary_offset += len(text)
+
+            row = {
+                'key': key_id, 'observed_at': observed_at, 'temperature': temperature,
+                'humidity': max(0, min(255, int(round(humidity)))), 'condition': condition,
+                'description': description_id, 'rain_mm': rain_mm or 0.0, 'utc_offset': utc_offset,
+            }
+            for name, tc in COLUMNS:
+                with open(self._column_path(name), 'ab') as f:
+                    array(tc, [row[name]]).tofile(f)
+            # The file lock kept other writers out, so the mirror is exactly one row behind
+            self._rows_loaded += 1
+            self._extend(key_id, {name: array(TYPECODES[name], [row[name]]) for name in SERIES_COLUMNS})
+            self.appended += 1
+            return True
+
+    def _truncate_torn_append(self):
+        # Holding the file lock, so uneven columns mean a writer died mid-append
+        for name, tc in COLUMNS:
+            os.truncate(self._column_path(name), self._rows_loaded * array(tc).itemsize)
+        self._torn = False
+        logger.warning("Dropped a partially written weather history row")
+
+    def compact(self, now=None):
+        """Drop rows past retention and duplicates, and rewrite the columns grouped by location.
+
+        The new generation is built from a copy of the rows without holding
+        any lock. Only carrying over rows appended meanwhile and switching
+        CURRENT happen under the locks, so appends and queries barely wait.
+        """
+        with self._compact_lock:
+            with self._lock:
+                self._sync(force=True)
+                old = self._generation
+                copied_rows = self._rows_loaded
+                series = {key_id: {name: values[:] for name, values in columns.items()}
+                          for key_id, columns in self._series.items()}
+
+            cutoff = (now if now is not None else time.time()) - self.retention
+            columns = {name: array(tc) for name, tc in COLUMNS}
+            kept_series = {}
+            for key_id in sorted(series):
+                timestamps = series[key_id]['observed_at']
+                lo = bisect_left(timestamps, cutoff)
+                keep = range(lo, len(timestamps))
+                if len(set(timestamps[lo:])) != len(keep):
+                    keep = [i for i in keep if i == lo or timestamps[i] != timestamps[i - 1]]
+                if not keep:
+                    continue
+                kept = kept_series[key_id] = {}
+                for name, values in series[key_id].items():
+                    if isinstance(keep, range):
+                        kept[name] = values[lo:]
+                    else:
+                        kept[name] = array(values.typecode, (values[i] for i in keep))
+                    columns[name].extend(kept[name])
+                columns['key'].extend(array('H', [key_id]) * len(keep))
+            name = f"gen-{int(old.split('-')[1]) + 1}"
+            directory = os.path.join(self.path, name)
+            self._write_columns(directory, columns)
+
+            with self._lock, self._file_lock():
+                self._sync(force=True)
+                if self._torn:
+                    self._truncate_torn_append()
+                if self._generation != old:
+                    shutil.rmtree(directory, ignore_errors=True)
+                    logger.warning("Weather history changed generation during compaction; discarded %s", name)
+                    return
+                tail = self._read_rows(copied_rows, self._rows_loaded)
+                for column, _ in COLUMNS:
+                    with open(self._column_path(column, directory), 'ab') as f:
+                        tail[column].tofile(f)
+                self._write_dictionary(directory, self._dictionary)
+                self._switch_current(name)
+                # Adopt the mirror built above rather than reloading the new generation
+                before = self._rows_loaded
+                self._generation, self._directory = name, directory
+                self._series = kept_series
+                self._distribute(tail)
+                self._rows_loaded = len(columns['key']) + len(tail['key'])
+                self._dictionary_offset = os.path.getsize(os.path.join(directory, 'dictionary.txt'))
+                self._trend_cache.clear()
+                self.compactions += 1
+            shutil.rmtree(os.path.join(self.path, old), ignore_errors=True)
+            logger.info("Compacted weather history: %d -> %d rows", before, self._rows_loaded)
+
+    def try_become_compactor(self):
+        """Return True if this process holds (or just took) the host-wide compactor lock"""
+        if self._compactor_fd is not None or fcntl is None:
+            return True
+        fd = os.open(os.path.join(self.path, '.compactor'), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._compactor_fd = fd
+        logger.info("Process %s now compacts the weather history", os.getpid())
+        return True
+
+    def _compact_loop(self):
+        while not self._stop.wait(self.compact_interval):
+            # Other processes retry the lock every interval, so a dead compactor is replaced
+            if not self.try_become_compactor():
+                continue
+            try:
+                self.compact()
+            except Exception as e:
+                logger.warning("Error compacting weather history: %s", e)
+
+    def start_compactor(self):
+        """Compact every compact_interval seconds on a daemon thread (only in the lock-holding process)"""
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        self._stop.clear()
+        self._compactor = threading.Thread(target=self._compact_loop, name="history-compactor", daemon=True)
+        self._compactor.start()
+
+    def close(self):
+        self._stop.set()
+        if self._compactor_fd is not None:
+            os.close(self._compactor_fd)  # releases the flock so another worker can take over
+            self._compactor_fd = None
+
+    # -- queries -------------------------------------------------------------
+
+    def _window(self, key, start=None, end=None):
+        """(series, lo, hi) for key's observations with start <= observed_at <= end"""
+        self._sync()
+        key_id = self._ids.get(('k', key))
+        series = self._series.get(key_id) if key_id is not None else None
+        if not series:
+            return None, 0, 0
+        timestamps = series['observed_at']
+        lo = 0 if start is None else bisect_left(timestamps, start)
+        hi = len(timestamps) if end is None else bisect_right(timestamps, end)
+        return series, lo, hi
+
+    def _observation(self, series, i):
+        descriptions = self._dictionary.get('d', ())
+        description_id = series['description'][i]
+        return Observation(
+            series['observed_at'][i], round(series['temperature'][i], 2), series['humidity'][i],
+            series['condition'][i], descriptions[description_id] if description_id < len(descriptions) else '',
+            round(series['rain_mm'][i], 2)
+        )
+
+    def range(self, key, start=None, end=None):
+        """Observations for key with start <= observed_at <= end, oldest first"""
+        with self._lock:
+            series, lo, hi = self._window(key, start, end)
+            return [self._observation(series, i) for i in range(lo, hi)]
+
+    def latest(self, key):
+        with self._lock:
+            series, _, hi = self._window(key)
+            return self._observation(series, hi - 1) if hi else None
+
+    def aggregate(self, key, start=None, end=None):
+        """Count, min/mean/max temperature, mean humidity, rain total and wet share over a window.
+
+        Rain is summed per hour (largest 1h reading in each hour), since the
+        same hourly figure is reported on every refresh within that hour.
+        """
+        with self._lock:
+            series, lo, hi = self._window(key, start, end)
+            if hi <= lo:
+                return None
+            temps = series['temperature'][lo:hi]
+            rain = series['rain_mm'][lo:hi]
+            hourly_rain = {}
+            for ts, mm in zip(series['observed_at'][lo:hi], rain):
+                if mm > 0:
+                    hour = int(ts // 3600)
+                    hourly_rain[hour] = max(hourly_rain.get(hour, 0.0), mm)
+            count = hi - lo
+            wet = sum(1 for condition, mm in zip(series['condition'][lo:hi], rain) if is_wet(condition, mm))
+            return {
+                'observations': count,
+                'from': series['observed_at'][lo],
+                'to': series['observed_at'][hi - 1],
+                'min_temp': round(min(temps), 1),
+                'max_temp': round(max(temps), 1),
+                'mean_temp': round(sum(temps) / count, 1),
+                'mean_humidity': round(sum(series['humidity'][lo:hi]) / count, 1),
+                'rain_mm': round(sum(hourly_rain.values()), 1),
+                'wet_share': round(wet / count, 2),
+            }
+
+    def daily(self, key, days=7, now=None, utc_offset=None):
+        """Per local day aggregates for the last `days` days (today included), oldest first"""
+        now = now if now is not None else time.time()
+        with self._lock:
+            if utc_offset is None:
+                series, _, hi = self._window(key)
+                utc_offset = series['utc_offset'][hi - 1] if hi else 0
+            today = _local_day(now, utc_offset)
+            result = []
+            for day in range(today - days + 1, today + 1):
+                start = day * 86400 - utc_offset
+                summary = self.aggregate(key, start, start + 86400 - 1e-6)
+                date = time.strftime('%Y-%m-%d', time.gmtime(day * 86400))
+                result.append(dict(summary, date=date) if summary else {'date': date, 'observations': 0})
+            return result
+
+    def trends(self, key, now=None, utc_offset=None):
+        """Rolling aggregates for advice: consecutive dry days up to today, and rain over 7 days.
+
+        The dry streak counts back from today (or yesterday, before today's
+        first observation); a day without observations ends it, since unknown
+        is not dry. Memoized until new observations arrive for the key.
+        """
+        now = now if now is not None else time.time()
+        with self._lock:
+            series, _, hi = self._window(key)
+            if not hi:
+                return None
+            if utc_offset is None:
+                utc_offset = series['utc_offset'][hi - 1]
+            today = _local_day(now, utc_offset)
+            # One entry per key, valid until its next observation or the next local day
+            version = (hi, today)
+            cached = self._trend_cache.get(key)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+
+            timestamps, conditions, rain = series['observed_at'], series['condition'], series['rain_mm']
+            dry_days = 0
+            day = None  # local day being scanned, newest first
+            day_is_dry = False
+            for i in range(hi - 1, -1, -1):
+                observed_day = _local_day(timestamps[i], utc_offset)
+                if observed_day > today:
+                    continue
+                if observed_day != day:
+                    if day is None:
+                        if observed_day < today - 1:
+                            break
+                    else:
+                        dry_days += 1  # finished a day without rain
+                        if observed_day != day - 1:
+                            day_is_dry = False
+                            break
+                    day, day_is_dry = observed_day, True
+                if is_wet(conditions[i], rain[i]):
+                    day_is_dry = False
+                    break
+            if day_is_dry:
+                dry_days += 1  # the oldest day on record was dry too
+
+            week = self.aggregate(key, now - 7 * 86400, now)
+            result = {'dry_days': dry_days, 'rain_week_mm': week['rain_mm'] if week else 0.0}
+            self._trend_cache[key] = (version, result)
+            return result
+
+    def stats(self):
+        with self._lock:
+            self._sync()
+            return {
+                'rows': self._rows_loaded,
+                'locations': len(self._series),
+                'bytes': self._rows_loaded * ROW_BYTES,
+                'appended': self.appended,
+                'compactions': self.compactions,
+                'generation': self._generation,
+            }
+
+
+class _FileLock:
+    """Exclusive flock on a file for the duration of a with-block (a no-op without fcntl)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        if fcntl is None:
+            return self
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._fd is None:
+            return
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+
+
+def create_history(path=HISTORY_PATH):
+    """Return an ObservationHistory when HISTORY_PATH is set, else None"""
+    if not path:
+        return None
+    if fcntl is None:
+        logger.warning("No file locking on this platform: the weather history must not be shared by processes")
+    return ObservationHistory(path)
@@ -0,0 +1,81 @@
+import gzip
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+from .cache import TTLCache
+from .gazetteer import normalize_place_name
+
+GZIP_MIN_BYTES = int(os.getenv('GZIP_MIN_BYTES', '1024'))  # smaller bodies are sent as-is
+GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', '6'))
+ENCODED_BODY_CACHE_TTL = int(os.getenv('ENCODED_BODY_CACHE_TTL', '600'))  # seconds
+ENCODED_BODY_CACHE_MAX_ENTRIES = int(os.getenv('ENCODED_BODY_CACHE_MAX_ENTRIES', '256'))
+
+
+class Validators:
+    """HTTP cache validators for one weather/forecast payload"""
+    __slots__ = ('etag', 'last_modified', 'max_age')
+
+    def __init__(self, etag, last_modified, max_age):
+        self.etag = etag                      # weak ETag, quoted
+        self.last_modified = last_modified    # epoch seconds of the upstream fetch
+        self.max_age = max_age                # seconds until the server-side entry goes stale
+
+    def cache_control(self):
+        return f"public, max-age={self.max_age}"
+
+    def matches(self, if_none_match, if_modified_since=None):
+        """True if the client's copy (per If-None-Match / If-Modified-Since) is current"""
+        if if_none_match:
+            # If-None-Match takes precedence; compare weakly as RFC 9110 requires
+            candidates = {tag.strip() for tag in if_none_match.split(',')}
+            return '*' in candidates or self.etag in candidates or self.etag[2:] in candidates
+        if if_modified_since is not None:
+            return int(self.last_modified) <= int(if_modified_since)
+        return False
+
+
+def validators_for(endpoint, location, data, ttl):
+    """Validators for a formatted weather/forecast response, or None for errors.
+
+    Both are derived from the upstream fetch time carried in data['timestamp'],
+    so a cached entry keeps the same ETag until it is refreshed.
+    """
+    if not data or 'error' in data:
+        return None
+    fetched_at = datetime.fromisoformat(data['timestamp']).timestamp()
+    digest = hashlib.sha1(
+        f"{endpoint}|{normalize_place_name(location)}|{data['timestamp']}".encode()
+    ).hexdigest()[:20]
+    max_age = max(0, int(fetched_at + ttl - time.time()))
+    return Validators(f'W/"{digest}"', fetched_at, max_age)
+
+
+class EncodedBodyCache:
+    """Serialized (and gzipped) response bodies keyed by ETag.
+
+    Repeat requests for unchanged data reuse the bytes instead of
+    re-serializing and re-compressing a full forecast every time.
+    """
+
+    def __init__(self, ttl=ENCODED_BODY_CACHE_TTL, max_entries=ENCODED_BODY_CACHE_MAX_ENTRIES,
+                 min_bytes=GZIP_MIN_BYTES, level=GZIP_LEVEL):
+        self.bodies = TTLCache(ttl=ttl, max_entries=max_entries)
+        self.min_bytes = min_bytes
+        self.level = level
+
+    def encode(self, etag, data, accept_encoding=''):
+        """Return (body bytes, content encoding or None) for data"""
+        gzip_ok = 'gzip' in (accept_encoding or '').lower()
+        entry = self.bodies.peek(etag) if etag else None
+        if entry is None or not entry.is_fresh():
+            raw = json.dumps(data, separators=(',', ':')).encode()
+            compressed = gzip.compress(raw, self.level) if len(raw) >= self.min_bytes else None
+            if not etag:
+                return (compressed, 'gzip') if gzip_ok and compressed else (raw, None)
+            entry = self.bodies.put(etag, (raw, compressed))
+        raw, compressed = entry.value
+        if gzip_ok and compressed is not None:
+            return compressed, 'gzip'
+        return raw, None
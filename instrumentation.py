@@ -0,0 +1,240 @@
+"""Low-overhead counters and latency histograms with Prometheus text output.
+
+Each thread writes to its own shard (a plain dict), so recording a value
+takes no lock; shards are only summed when /metrics is scraped.
+"""
+
+import threading
+import time
+import weakref
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Seconds; tuned for USSD hops (sub-ms cache hits up to multi-second upstream calls)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _ShardHolder:
+    """Thread-local owner of a shard; collected when its thread exits"""
+    __slots__ = ('shard', '__weakref__')
+
+    def __init__(self, shard):
+        self.shard = shard
+
+
+class _Sharded(ABC):
+    """Per-thread dicts registered centrally so a scrape can merge them.
+
+    When a thread exits its shard is folded into a shared base, so short-lived
+    threads (refresh workers, batch fan-out) don't grow the shard list forever.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._base = {}
+        # Re-entrant: a retiring shard's finalizer may run on a thread that already holds it
+        self._lock = threading.RLock()
+
+    def _shard(self):
+        holder = getattr(self._local, 'holder', None)
+        if holder is None:
+            shard = {}
+            holder = self._local.holder = _ShardHolder(shard)
+            with self._lock:
+                self._shards.append(shard)
+            weakref.finalize(holder, self._retire, shard)
+        return holder.shard
+
+    def _retire(self, shard):
+        with self._lock:
+            for labels, value in shard.items():
+                # Replace rather than update values in place, so earlier snapshots stay consistent
+                self._base[labels] = self._combine(self._base.get(labels), value)
+            self._shards = [s for s in self._shards if s is not shard]
+
+    @abstractmethod
+    def _combine(self, total, value):
+        """Merge a retired shard's value for one label set into the base total (None if absent)"""
+
+    def _snapshots(self):
+        with self._lock:
+            base = dict(self._base)
+            shards = list(self._shards)
+        # dict() copies are atomic under the GIL, so no writer needs to lock
+        return [base] + [dict(shard) for shard in shards]
+
+
+class Counter(_Sharded):
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__()
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def inc(self, amount=1, *labelvalues):
+        shard = self._shard()
+        shard[labelvalues] = shard.get(labelvalues, 0) + amount
+
+    def _combine(self, total, value):
+        return value if total is None else total + value
+
+    def values(self):
+        totals = {}
+        for shard in self._snapshots():
+            for labels, value in shard.items():
+                totals[labels] = totals.get(labels, 0) + value
+        return totals
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.values().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Sharded):
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__()
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labelvalues):
+        shard = self._shard()
+        row = shard.get(labelvalues)
+        if row is None:
+            # [per-bucket counts..., +Inf count, sum]
+            row = shard[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+        row[bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    def _combine(self, total, row):
+        return list(row) if total is None else [a + b for a, b in zip(total, row)]
+
+    @contextmanager
+    def time(self, *labelvalues):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labelvalues)
+
+    def collect(self):
+        merged = {}
+        for shard in self._snapshots():
+            for labels, row in shard.items():
+                total = merged.setdefault(labels, [0] * len(row))
+                for i, value in enumerate(row):
+                    total[i] += value
+
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, row in sorted(merged.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), row[:-1]):
+                cumulative += count
+                le = bound if bound == '+Inf' else _format_value(bound)
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames + ('le',), labels + (le,))} {cumulative}"
+                )
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(row[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class CallbackGauge:
+    """Gauge whose value(s) are read from a callback at scrape time.
+
+    The callback returns a number, or a dict mapping label-value tuples to numbers.
+    """
+
+    def __init__(self, name, documentation, callback, labelnames=(), metric_type='gauge'):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.labelnames = tuple(labelnames)
+        self.metric_type = metric_type
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        values = self.callback()
+        if values is None:
+            return lines
+        if not isinstance(values, dict):
+            values = {(): values}
+        for labels, value in sorted(values.items()):
+            if value is not None:
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in zip(names, values)
+    )
+    return '{' + pairs + '}'
+
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None and type(existing) is type(metric) and not isinstance(metric, CallbackGauge):
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge_callback(self, name, documentation, callback, labelnames=(), metric_type='gauge'):
+        """Register (or replace) a metric computed by callback() on every scrape"""
+        return self._register(CallbackGauge(name, documentation, callback, labelnames, metric_type))
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.collect())
+            except Exception:
+                # One broken callback must not take the whole scrape down
+                continue
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# Shared hot-path metrics
+STAGE_SECONDS = REGISTRY.histogram(
+    'fwis_stage_seconds',
+    'Time spent in each stage of handling a request',
+    ['stage']
+)
+USSD_HOPS = REGISTRY.counter(
+    'fwis_ussd_hops_total',
+    'USSD hops answered, by screen shown',
+    ['screen']
+)
@@ -0,0 +1,100 @@
+"""USSD text catalog for each supported language.
+
+Entries ending in '_tpl' are str.format templates; everything else is
+static text. Add a language by adding a block with the same keys.
+"""
+
+DEFAULT_LANGUAGE = 'en'
+
+LANGUAGE_MENU = """CON Select Language / Yer Dhok:
+1. English
+2. Dholuo
+0. Exit / Wuok"""
+LANGUAGE_INVALID = "Invalid selection. Please try again."
+
+CATALOG = {
+    'en': {
+        'main_menu': """CON Main Menu (Gulu):
+1. Today's Weather
+2. 3-Day Forecast
+3. Farming Tips
+0. Exit""",
+        'invalid_selection': "Invalid selection. Try again.",
+        'goodbye': "END Thank you for using Farmer Weather Service!",
+        'technical_error': "END A technical error occurred. Please try again later.",
+        'back_option': "0. Main Menu",
+        'weather_error': "CON Error getting weather data.\n",
+        'tips_error': "CON Error getting weather data.\n",
+        'forecast_error': "CON Error getting forecast data.\n",
+        'no_forecast': "No forecast data available.\n",
+        'try_again': "CON Weather data is taking too long. Please try again.\n",
+        'rate_limited': "END Too many requests. Please wait a minute and dial again.",
+        'as_of_tpl': "(as of {time})\n",
+        'weather_tpl': (
+            "Weather in {location} Today:\n"
+            "Temperature: {temperature}°C\n"
+            "Conditions: {description}\n"
+            "Humidity: {humidity}%\n"
+        ),
+        'wind_tpl': "Wind: {wind_speed} m/s\n",
+        'forecast_title_tpl': "3-Day Forecast ({location}):\n",
+        'forecast_day_tpl': "{date}: Temp: {min_temp:.0f}°C-{max_temp:.0f}°C, {condition}\n",
+        'alert_thunderstorm_tpl': (
+            "Weather alert for {location}: thunderstorms expected from {when}. "
+            "Keep livestock sheltered and stay out of open fields."
+        ),
+        'alert_heavy_rain_tpl': (
+            "Weather alert for {location}: heavy rain (about {rain_mm:.0f} mm) expected from {when}. "
+            "Clear drainage channels and delay spraying or fertilizer."
+        ),
+        'day_names': {},
+    },
+    'luo': {
+        'main_menu': """CON Meny mar Loch (Gulu):
+1. Nen Piny Kawuono
+2. Nen Piny Ndege Adek
+3. Puonj mag Puro
+0. Wuok""",
+        'invalid_selection': "Tic mogo. Tem kendo.",
+        'goodbye': "END Aparo pi tiyo kodwa. Med ameda maber!",
+        'technical_error': "END A technical error occurred. Please try again later.",
+        'back_option': "0. Wuok",
+        'weather_error': "CON Tye bal e neno piny.\n",
+        'tips_error': "CON Tye bal ka yudo wach piny.\n",
+        'forecast_error': "CON Tye bal e yudo wach piny ma odiechieng.\n",
+        'no_forecast': "Dongruok mar piny onge.\n",
+        'try_again': "CON Tye bal e neno piny. Tem kendo.\n",
+        'rate_limited': "END Kwayo ochwalore mang'eny. Rit dakika achiel, eka tem kendo.",
+        'as_of_tpl': "(kaka ne chal {time})\n", # (as it was at {time})
+        'weather_tpl': (
+            "Piny e {location} Kawuono:\n"
+            "Liet: {temperature}°C\n"
+            "Kit Piny: {description}\n"
+            "Um: {humidity}%\n"
+        ),
+        'wind_tpl': "Yamo: {wind_speed} m/s\n",
+        'forecast_title_tpl': "Piny Ndege Adek ({location}):\n",
+        'forecast_day_tpl': "{date}: Liet: {min_temp:.0f}°C-{max_temp:.0f}°C, {condition}\n",
+        # Weather alert for {location}: thunderstorms from {when}. Shelter livestock, stay out of open fields.
+        'alert_thunderstorm_tpl': (
+            "Siem mar piny ne {location}: koth gi mil polo biro chakore {when}. "
+            "Kan jamni kama opondo kendo kik ibed e puodho maonge kar pondo."
+        ),
+        # Weather alert for {location}: heavy rain (about {rain_mm} mm) from {when}. Clear drainage, delay spraying/fertilizer.
+        'alert_heavy_rain_tpl': (
+            "Siem mar piny ne {location}: koth mang'eny (madirom {rain_mm:.0f} mm) biro chakore {when}. "
+            "Los yore mag pi kendo rit kiko yath kata keto mbolea."
+        ),
+        'day_names': {
+            'Mon': 'Wuok Tich',
+            'Tue': 'Tich Ariyo',
+            'Wed': 'Tich Adek',
+            'Thu': 'Tich Angwen',
+            'Fri': 'Tich Abich',
+            'Sat': 'Ngeso',
+            'Sun': 'Jumapil'
+        },
+    },
+}
+
+SUPPORTED_LANGUAGES = tuple(CATALOG)
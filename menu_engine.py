@@ -0,0 +1,115 @@
+from datetime import date
+from .localization import CATALOG, DEFAULT_LANGUAGE, LANGUAGE_INVALID, LANGUAGE_MENU
+
+# Which weather data a dynamic screen needs fetched before it can be rendered
+SCREEN_NEEDS = {
+    'weather': 'weather',
+    'forecast': 'forecast',
+    'tips': 'weather',
+}
+
+
+def _strip_con(text):
+    return text[4:] if text.startswith("CON ") else text
+
+
+class MenuEngine:
+    """Renders USSD screens from the localization catalog.
+
+    Static screens are rendered once per language at construction; dynamic
+    screens (weather, forecast, tips) are filled in from pre-bound templates.
+    `advice` is called as advice(weather_data, language, location) for the tips text.
+    """
+
+    def __init__(self, advice, catalog=CATALOG):
+        self.advice = advice
+        self.catalog = catalog
+        self.static = {}
+        self.templates = {}
+        for lang, entries in catalog.items():
+            self.templates[lang] = {
+                key[:-len('_tpl')]: value.format
+                for key, value in entries.items() if key.endswith('_tpl')
+            }
+            self.static[('language_menu', lang)] = LANGUAGE_MENU
+            self.static[('language_invalid', lang)] = f"CON {LANGUAGE_INVALID}\n\n{_strip_con(LANGUAGE_MENU)}"
+            self.static[('main_menu', lang)] = entries['main_menu']
+            self.static[('main_invalid', lang)] = f"CON {entries['invalid_selection']}\n\n{_strip_con(entries['main_menu'])}"
+            self.static[('goodbye', lang)] = entries['goodbye']
+            self.static[('technical_error', lang)] = entries['technical_error']
+            self.static[('rate_limited', lang)] = entries['rate_limited']
+            self.static[('try_again', lang)] = entries['try_again'] + entries['back_option']
+        self.renderers = {
+            'weather': self._render_weather,
+            'forecast': self._render_forecast,
+            'tips': self._render_tips,
+        }
+
+    def needs(self, screen):
+        """Return 'weather', 'forecast' or None for the data a screen needs"""
+        return SCREEN_NEEDS.get(screen)
+
+    def render(self, screen, lang, location=None, data=None, as_of=None):
+        """Return the full USSD response (CON/END ...) for a screen.
+
+        as_of (an 'HH:MM' string) marks the data as a last-known snapshot.
+        """
+        if lang not in self.catalog:
+            lang = DEFAULT_LANGUAGE
+        text = self.static.get((screen, lang))
+        if text is not None:
+            return text
+        text = self.renderers[screen](lang, location, data)
+        if as_of and text.startswith("CON "):
+            text = "CON " + self.templates[lang]['as_of'](time=as_of) + text[4:]
+        return text
+
+    def _render_weather(self, lang, location, weather_data):
+        entries = self.catalog[lang]
+        if 'error' in weather_data:
+            return entries['weather_error'] + entries['back_option']
+
+        templates = self.templates[lang]
+        response_text = templates['weather'](
+            location=location,
+            temperature=weather_data.get('temperature', 'N/A'),
+            description=weather_data.get('description', 'N/A'),
+            humidity=weather_data.get('humidity', 'N/A')
+        )
+        if 'wind_speed' in weather_data:
+            response_text += templates['wind'](wind_speed=weather_data['wind_speed'])
+        response_text += "\n" + self.advice(weather_data, lang, location)
+        return "CON " + response_text + "\n" + entries['back_option']
+
+    def _render_tips(self, lang, location, weather_data):
+        entries = self.catalog[lang]
+        if 'error' in weather_data:
+            return entries['tips_error'] + entries['back_option']
+        return "CON " + self.advice(weather_data, lang, location) + "\n" + entries['back_option']
+
+    def _render_forecast(self, lang, location, forecast_data):
+        entries = self.catalog[lang]
+        if 'error' in forecast_data or not forecast_data.get('daily'):
+            return entries['forecast_error'] + entries['back_option']
+
+        templates = self.templates[lang]
+        day_names = entries['day_names']
+        response_text = templates['forecast_title'](location=location)
+
+        # Rows are precomputed by weather_service.summarize_forecast at fetch time
+        days = forecast_data.get('daily') or ()
+        for day in days[:3]:
+            day_date = date.fromisoformat(day['date'])
+            day_abbrev = day_date.strftime('%a')
+            formatted_date = f"{day_names.get(day_abbrev, day_abbrev)}, {day_date.strftime('%b %d')}"
+            response_text += templates['forecast_day'](
+                date=formatted_date,
+                min_temp=day['min_temp'],
+                max_temp=day['max_temp'],
+                condition=day['condition'].capitalize()
+            )
+
+        if not days:
+            response_text += entries['no_forecast']
+
+        return "CON " + response_text + "\n" + entries['back_option']
@@ -0,0 +1,123 @@
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+from types import MappingProxyType
+from .gazetteer import normalize_place_name
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_ENABLED = os.getenv('PREFETCH_ENABLED', '1').lower() not in ('0', 'false', 'no')
+PREFETCH_LOCATIONS = [loc.strip() for loc in os.getenv('PREFETCH_LOCATIONS', 'Gulu').split(',') if loc.strip()]
+PREFETCH_INTERVAL = int(os.getenv('PREFETCH_INTERVAL', '300'))  # seconds
+
+WeatherSnapshot = namedtuple(
+    'WeatherSnapshot',
+    ['location', 'weather', 'forecast', 'refreshed_at', 'refresh_duration']
+)
+
+
+def _freeze(value):
+    """Recursively convert dicts/lists into read-only equivalents"""
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class PrefetchScheduler:
+    """Refreshes weather and forecast for a fixed set of locations in the background.
+
+    Each refresh publishes an immutable WeatherSnapshot; readers get the
+    latest one with a single dict lookup and never touch the network.
+    With a shared_store (see shared_snapshots.py) snapshots live in a file
+    mapped by every worker and only the process holding its refresher lock
+    calls the upstream; the others take over if that process goes away.
+    """
+
+    def __init__(self, weather_service, locations=None, interval=PREFETCH_INTERVAL, shared_store=None):
+        self.weather_service = weather_service
+        self.locations = list(locations if locations is not None else PREFETCH_LOCATIONS)
+        self.interval = interval
+        self.shared_store = shared_store
+        self._snapshots = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def get(self, location):
+        """Return the latest snapshot for location, or None if it isn't prefetched yet"""
+        if self.shared_store is not None:
+            return self.shared_store.get(location)
+        return self._snapshots.get(normalize_place_name(location))
+
+    def refresh(self, location):
+        """Fetch fresh data for one location and publish a new snapshot"""
+        previous = self.get(location)
+        started = time.perf_counter()
+        weather = self.weather_service.get_weather(location, refresh=True)
+        forecast = self.weather_service.get_forecast(location, refresh=True)
+        duration = time.perf_counter() - started
+
+        # Keep serving the last good data for whichever half failed
+        if previous is not None:
+            if 'error' in weather and 'error' not in previous.weather:
+                weather = previous.weather
+            if 'error' in forecast and 'error' not in previous.forecast:
+                forecast = previous.forecast
+
+        snapshot = WeatherSnapshot(
+            location=location,
+            weather=_freeze(weather),
+            forecast=_freeze(forecast),
+            refreshed_at=time.time(),
+            refresh_duration=duration
+        )
+        if self.shared_store is not None:
+            self.shared_store.put(snapshot)
+        else:
+            self._snapshots[normalize_place_name(location)] = snapshot
+        return snapshot
+
+    def refresh_all(self):
+        for location in self.locations:
+            try:
+                self.refresh(location)
+            except Exception as e:
+                logger.warning("Error prefetching weather for %s: %s", location, e)
+
+    def _run(self):
+        while not self._stop.is_set():
+            # Non-refreshers retry the lock every interval, so a dead refresher is replaced
+            if self.shared_store is None or self.shared_store.try_become_refresher():
+                self.refresh_all()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """Start the background refresh thread (first refresh runs immediately)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="weather-prefetch", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def status(self):
+        """Return when each location was last refreshed and how long it took"""
+        result = {}
+        for location in self.locations:
+            snapshot = self.get(location)
+            result[location] = {
+                'refreshed_at': datetime.fromtimestamp(snapshot.refreshed_at).isoformat() if snapshot else None,
+                'refresh_duration_ms': round(snapshot.refresh_duration * 1000, 1) if snapshot else None,
+                'weather_ok': bool(snapshot) and 'error' not in snapshot.weather,
+                'forecast_ok': bool(snapshot) and 'error' not in snapshot.forecast
+            }
+        return result
@@ -0,0 +1,209 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+SESSION_STORE = os.getenv('SESSION_STORE', 'memory')  # 'memory' or 'sqlite'
+SESSION_DB_PATH = os.getenv('SESSION_DB_PATH', 'ussd_sessions.sqlite3')
+SESSION_TTL = int(os.getenv('SESSION_TTL', '1800'))  # seconds of inactivity before eviction
+SESSION_SWEEP_INTERVAL = int(os.getenv('SESSION_SWEEP_INTERVAL', '60'))  # seconds
+
+
+class SessionRecord:
+    """Compact per-session state; timestamps are epoch seconds"""
+    __slots__ = (
+        'phone_number', 'current_menu', 'selected_location',
+        'session_start', 'last_activity', 'language', 'language_selected'
+    )
+
+    def __init__(self, phone_number, current_menu='language', selected_location='Gulu',
+                 session_start=None, last_activity=None, language='en', language_selected=False):
+        now = time.time()
+        self.phone_number = phone_number
+        self.current_menu = current_menu
+        self.selected_location = selected_location
+        self.session_start = session_start if session_start is not None else now
+        self.last_activity = last_activity if last_activity is not None else now
+        self.language = language
+        self.language_selected = language_selected
+
+    def to_tuple(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    @classmethod
+    def from_tuple(cls, values):
+        return cls(*values)
+
+
+class SessionStore(ABC):
+    """Interface for USSD session storage with inactivity expiry"""
+
+    def __init__(self, ttl=SESSION_TTL):
+        self.ttl = ttl
+        self._sweeper = None
+        self._stop = threading.Event()
+
+    @abstractmethod
+    def get(self, session_id):
+        """Return the SessionRecord for session_id, or None if missing/expired"""
+        ...
+
+    @abstractmethod
+    def put(self, session_id, record):
+        """Store record and push its expiry out to now + ttl"""
+        ...
+
+    @abstractmethod
+    def delete(self, session_id):
+        ...
+
+    @abstractmethod
+    def sweep(self, now=None):
+        """Evict expired sessions and return how many were removed"""
+        ...
+
+    @abstractmethod
+    def __len__(self):
+        ...
+
+    def _sweep_loop(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.warning("Error sweeping sessions: %s", e)
+
+    def start_sweeper(self, interval=SESSION_SWEEP_INTERVAL):
+        """Run sweep() every interval seconds on a daemon thread"""
+        if self._sweeper is not None and self._sweeper.is_alive():
+            return
+        self._stop.clear()
+        self._sweeper = threading.Thread(
+            target=self._sweep_loop, args=(interval,), name="session-sweeper", daemon=True
+        )
+        self._sweeper.start()
+
+    def close(self):
+        self._stop.set()
+
+
+class InMemorySessionStore(SessionStore):
+    """Per-process store; sessions are kept in expiry order for O(1) eviction.
+
+    Every put() uses the same TTL, so moving a session to the end of the
+    OrderedDict keeps the dict sorted by expiry and sweep() only ever looks
+    at the head.
+    """
+
+    def __init__(self, ttl=SESSION_TTL):
+        super().__init__(ttl)
+        self._sessions = OrderedDict()  # session_id -> (expires_at, record)
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        item = self._sessions.get(session_id)
+        if item is None:
+            return None
+        expires_at, record = item
+        if expires_at <= time.time():
+            self.delete(session_id)
+            return None
+        return record
+
+    def put(self, session_id, record):
+        with self._lock:
+            self._sessions[session_id] = (time.time() + self.ttl, record)
+            self._sessions.move_to_end(session_id)
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def sweep(self, now=None):
+        now = now if now is not None else time.time()
+        removed = 0
+        with self._lock:
+            while self._sessions:
+                session_id, (expires_at, _) = next(iter(self._sessions.items()))
+                if expires_at > now:
+                    break
+                del self._sessions[session_id]
+                removed += 1
+        return removed
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Shared store for several worker processes on one host (SQLite in WAL mode)"""
+
+    def __init__(self, path=SESSION_DB_PATH, ttl=SESSION_TTL):
+        super().__init__(ttl)
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)")
+        conn.commit()
+
+    def _conn(self):
+        # One connection per thread; WAL lets readers proceed while another worker writes
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id):
+        row = self._conn().execute(
+            "SELECT data FROM sessions WHERE session_id = ? AND expires_at > ?",
+            (session_id, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        return SessionRecord.from_tuple(json.loads(row[0]))
+
+    def put(self, session_id, record):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO sessions (session_id, data, expires_at) VALUES (?, ?, ?)",
+            (session_id, json.dumps(record.to_tuple(), separators=(',', ':')), time.time() + self.ttl)
+        )
+
+    def delete(self, session_id):
+        self._conn().execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def sweep(self, now=None):
+        now = now if now is not None else time.time()
+        cursor = self._conn().execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+        return cursor.rowcount
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def close(self):
+        super().close()
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def create_session_store(backend=SESSION_STORE):
+    """Build the session store selected by SESSION_STORE"""
+    if backend == 'memory':
+        return InMemorySessionStore()
+    if backend == 'sqlite':
+        return SQLiteSessionStore()
+    raise ValueError(f"Unknown session store backend: {backend}")
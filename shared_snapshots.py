@@ -0,0 +1,259 @@
+"""Weather snapshots shared by all worker processes through a memory-mapped file.
+
+One process (whichever holds an flock on "<path>.lock") runs the prefetch
+refresh and writes snapshots; every worker maps the same file and decodes
+records straight out of the mapping.
+
+File layout (little-endian): a 64-byte header followed by one fixed-size
+slot per prefetched location. Each slot starts with a 64-bit sequence
+number used as a seqlock: the writer makes it odd, writes the record, then
+makes it even again. Readers retry (yielding the CPU between attempts) until
+they see the same even number before and after decoding, so they never
+return a torn record.
+"""
+
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from datetime import date, datetime
+from .gazetteer import normalize_place_name
+from .scheduler import WeatherSnapshot, _freeze
+
+logger = logging.getLogger(__name__)
+
+SHARED_SNAPSHOT_PATH = os.getenv('SHARED_SNAPSHOT_PATH', '')  # empty = per-process snapshots
+
+MAGIC = b'FWSS'
+FORMAT_VERSION = 1
+MAX_DAYS = 6  # a 5-day, 3-hourly forecast touches at most 6 local dates
+READ_RETRIES = 100
+
+_HEADER = struct.Struct('<4sHHII')  # magic, version, max_days, slot_count, slot_size
+HEADER_SIZE = 64
+_SEQ = struct.Struct('<Q')
+# location, refreshed_at, refresh_duration,
+# weather: ok, fetched_at, temperature, humidity, wind_speed, int flags, description,
+# forecast: ok, fetched_at, city, day count
+_RECORD = struct.Struct('<48sdd?ddddB40s?d48sB')
+# date ordinal, min_temp, max_temp, rain_probability, condition, rain_mm
+_DAY = struct.Struct('<Iddd40sd')
+SLOT_SIZE = (_SEQ.size + _RECORD.size + MAX_DAYS * _DAY.size + 7) // 8 * 8
+
+# Bits in the flags byte: which weather numbers were ints upstream, so they render identically
+_INT_TEMPERATURE, _INT_HUMIDITY, _INT_WIND = 1, 2, 4
+
+
+def _encode_text(value, size):
+    return str(value).encode('utf-8')[:size]
+
+
+def _decode_text(raw):
+    return raw.rstrip(b'\0').decode('utf-8', errors='ignore')
+
+
+def _fetched_at(data):
+    return datetime.fromisoformat(data['timestamp']).timestamp()
+
+
+class SharedSnapshotStore:
+    """Fixed-layout, seqlocked snapshot slots in a memory-mapped file"""
+
+    def __init__(self, path, locations):
+        self.path = path
+        self.locations = list(locations)
+        self._slots = {normalize_place_name(loc): i for i, loc in enumerate(self.locations)}
+        self._size = HEADER_SIZE + len(self.locations) * SLOT_SIZE
+        self._write_lock = threading.Lock()
+        self._decoded = {}  # slot index -> (seq, WeatherSnapshot) last decoded by this process
+        self._refresher_fd = None
+
+        import fcntl  # POSIX only; create_shared_store() checks for it
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                self._initialize(fd)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            self._map = mmap.mmap(fd, self._size)
+        finally:
+            os.close(fd)
+
+    def _initialize(self, fd):
+        """Create or reset the file if it is missing or laid out for another config"""
+        header = os.pread(fd, _HEADER.size, 0)
+        expected = _HEADER.pack(MAGIC, FORMAT_VERSION, MAX_DAYS, len(self.locations), SLOT_SIZE)
+        if header == expected and os.fstat(fd).st_size >= self._size:
+            return
+        os.ftruncate(fd, 0)
+        os.ftruncate(fd, self._size)
+        os.pwrite(fd, expected, 0)
+
+    def try_become_refresher(self):
+        """Return True if this process holds (or just took) the single-writer lock"""
+        if self._refresher_fd is not None:
+            return True
+        import fcntl
+        fd = os.open(self.path + '.lock', os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._refresher_fd = fd
+        logger.info("Process %s is now the shared snapshot refresher", os.getpid())
+        return True
+
+    @property
+    def is_refresher(self):
+        return self._refresher_fd is not None
+
+    def _offset(self, index):
+        return HEADER_SIZE + index * SLOT_SIZE
+
+    def put(self, snapshot):
+        """Publish a snapshot (refresher only); unknown locations are ignored"""
+        index = self._slots.get(normalize_place_name(snapshot.location))
+        if index is None:
+            return
+        weather, forecast = snapshot.weather, snapshot.forecast
+        weather_ok = 'error' not in weather
+        forecast_ok = 'error' not in forecast
+        flags = 0
+        if weather_ok:
+            flags |= _INT_TEMPERATURE if isinstance(weather['temperature'], int) else 0
+            flags |= _INT_HUMIDITY if isinstance(weather['humidity'], int) else 0
+            flags |= _INT_WIND if isinstance(weather['wind_speed'], int) else 0
+        days = tuple(forecast['daily'])[:MAX_DAYS] if forecast_ok else ()
+
+        record = _RECORD.pack(
+            _encode_text(snapshot.location, 48), snapshot.refreshed_at, snapshot.refresh_duration,
+            weather_ok,
+            _fetched_at(weather) if weather_ok else 0.0,
+            weather['temperature'] if weather_ok else 0.0,
+            weather['humidity'] if weather_ok else 0.0,
+            weather['wind_speed'] if weather_ok else 0.0,
+            flags,
+            _encode_text(weather['description'], 40) if weather_ok else b'',
+            forecast_ok,
+            _fetched_at(forecast) if forecast_ok else 0.0,
+            _encode_text(forecast['city'], 48) if forecast_ok else b'',
+            len(days)
+        )
+        rows = b''.join(
+            _DAY.pack(
+                date.fromisoformat(day['date']).toordinal(), day['min_temp'], day['max_temp'],
+                day['rain_probability'], _encode_text(day['condition'], 40), day['rain_mm']
+            )
+            for day in days
+        )
+
+        offset = self._offset(index)
+        with self._write_lock:
+            (seq,) = _SEQ.unpack_from(self._map, offset)
+            seq += seq & 1  # a previous refresher died mid-write
+            _SEQ.pack_into(self._map, offset, seq + 1)  # odd: write in progress
+            start = offset + _SEQ.size
+            self._map[start:start + len(record)] = record
+            self._map[start + len(record):start + len(record) + len(rows)] = rows
+            _SEQ.pack_into(self._map, offset, seq + 2)
+
+    def get(self, location):
+        """Return the latest snapshot for location, or None if none was published yet"""
+        index = self._slots.get(normalize_place_name(location))
+        if index is None:
+            return None
+        offset = self._offset(index)
+        cached = self._decoded.get(index)
+        for _ in range(READ_RETRIES):
+            (seq,) = _SEQ.unpack_from(self._map, offset)
+            if seq & 1:
+                time.sleep(0)  # let a writer that was preempted mid-record finish
+                continue
+            if seq == 0:
+                return None
+            if cached is not None and cached[0] == seq:
+                return cached[1]
+            try:
+                snapshot = self._decode(offset)
+            except ValueError:
+                time.sleep(0)
+                continue  # torn mid-write; the sequence check below would reject it anyway
+            if _SEQ.unpack_from(self._map, offset)[0] == seq:
+                self._decoded[index] = (seq, snapshot)
+                return snapshot
+            time.sleep(0)
+        # A writer is stuck mid-record (or very busy); the last good decode beats nothing
+        return cached[1] if cached is not None else None
+
+    def _decode(self, offset):
+        start = offset + _SEQ.size
+        (location, refreshed_at, refresh_duration,
+         weather_ok, weather_fetched_at, temperature, humidity, wind_speed, flags, description,
+         forecast_ok, forecast_fetched_at, city, day_count) = _RECORD.unpack_from(self._map, start)
+
+        if weather_ok:
+            weather = {
+                'temperature': int(temperature) if flags & _INT_TEMPERATURE else temperature,
+                'description': _decode_text(description),
+                'humidity': int(humidity) if flags & _INT_HUMIDITY else humidity,
+                'wind_speed': int(wind_speed) if flags & _INT_WIND else wind_speed,
+                'timestamp': datetime.fromtimestamp(weather_fetched_at).isoformat()
+            }
+        else:
+            weather = {'error': 'Failed to get weather data'}
+
+        if forecast_ok:
+            daily = []
+            day_offset = start + _RECORD.size
+            for _ in range(min(day_count, MAX_DAYS)):
+                ordinal, min_temp, max_temp, rain_probability, condition, rain_mm = _DAY.unpack_from(
+                    self._map, day_offset
+                )
+                daily.append({
+                    'date': date.fromordinal(ordinal).isoformat(),
+                    'min_temp': min_temp,
+                    'max_temp': max_temp,
+                    'condition': _decode_text(condition),
+                    'rain_probability': rain_probability,
+                    'rain_mm': rain_mm
+                })
+                day_offset += _DAY.size
+            # The raw 3-hourly list is not shared; USSD screens only use the daily rows
+            forecast = {
+                'city': _decode_text(city),
+                'forecast': [],
+                'daily': daily,
+                'timestamp': datetime.fromtimestamp(forecast_fetched_at).isoformat()
+            }
+        else:
+            forecast = {'error': 'Failed to get forecast data'}
+
+        return WeatherSnapshot(
+            location=_decode_text(location),
+            weather=_freeze(weather),
+            forecast=_freeze(forecast),
+            refreshed_at=refreshed_at,
+            refresh_duration=refresh_duration
+        )
+
+    def close(self):
+        self._map.close()
+        if self._refresher_fd is not None:
+            os.close(self._refresher_fd)  # releases the flock so another worker can take over
+            self._refresher_fd = None
+
+
+def create_shared_store(locations, path=SHARED_SNAPSHOT_PATH):
+    """Return a SharedSnapshotStore when SHARED_SNAPSHOT_PATH is set and flock is available, else None"""
+    if not path:
+        return None
+    try:
+        import fcntl  # noqa: F401
+    except ImportError:  # Windows
+        logger.warning("SHARED_SNAPSHOT_PATH needs flock, which this platform lacks; snapshots stay per process")
+        return None
+    return SharedSnapshotStore(path, locations)
@@ -0,0 +1,117 @@
+import asyncio
+import functools
+import threading
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one execution.
+
+    The first caller for a key runs fn(); callers arriving while it is in
+    flight wait for it and get the same result (or exception).
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.deduplicated = 0
+
+    def do(self, key, fn, timeout=None):
+        """Run fn() for key, or wait up to timeout seconds for the in-flight call.
+
+        Raises TimeoutError if a waiter gives up before the leader finishes.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.deduplicated += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+                leader = True
+
+        if not leader:
+            if not call.event.wait(timeout):
+                raise TimeoutError(f"Timed out waiting for in-flight call {key}")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def in_flight(self):
+        return len(self._calls)
+
+    def stats(self):
+        return {
+            'executions': self.executions,
+            'deduplicated': self.deduplicated,
+            'in_flight': len(self._calls)
+        }
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines running on one event loop.
+
+    fn is a coroutine function, run as its own task; every caller for the key
+    (the first one included) awaits that task through a shield, so a caller
+    that is cancelled or times out never cancels the call the others wait on.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.executions = 0
+        self.deduplicated = 0
+
+    async def do(self, key, fn, timeout=None):
+        """Await fn() for key, or wait up to timeout seconds for the in-flight call.
+
+        Raises TimeoutError if a waiter gives up before the call finishes.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = self._calls[key] = asyncio.get_running_loop().create_task(fn())
+            task.add_done_callback(functools.partial(self._finished, key))
+            self.executions += 1
+            return await asyncio.shield(task)
+
+        self.deduplicated += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Timed out waiting for in-flight call {key}") from None
+
+    def _finished(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved: every caller may have given up
+
+    def in_flight(self):
+        return len(self._calls)
+
+    def stats(self):
+        return {
+            'executions': self.executions,
+            'deduplicated': self.deduplicated,
+            'in_flight': len(self._calls)
+        }
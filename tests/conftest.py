@@ -0,0 +1,8 @@
+import os
+import tempfile
+
+# Settings are read when the modules are imported: keep the tests out of the working directory
+_workdir = tempfile.mkdtemp(prefix='fwis-tests-')
+os.environ.setdefault('HISTORY_PATH', '')
+os.environ.setdefault('GEOCODE_CACHE_PATH', os.path.join(_workdir, 'geocode.sqlite3'))
+os.environ.setdefault('OPENWEATHERMAP_API_KEY', 'test')
@@ -0,0 +1,79 @@
+from services.admission import AdmissionController, TokenBuckets
+
+
+def test_burst_then_refuse():
+    buckets = TokenBuckets(rate=1, burst=3)
+    assert [buckets.take('a', now=0.0) for _ in range(4)] == [True, True, True, False]
+    assert buckets.take('b', now=0.0)  # buckets are per key
+
+
+def test_refill_at_rate():
+    buckets = TokenBuckets(rate=2, burst=3)
+    for _ in range(3):
+        buckets.take('a', now=0.0)
+    assert not buckets.take('a', now=0.25)  # half a token
+    assert buckets.take('a', now=0.5)
+    assert not buckets.take('a', now=0.5)
+
+
+def test_refill_is_capped_at_burst():
+    buckets = TokenBuckets(rate=1, burst=2, sweep_interval=10 ** 6)
+    buckets.take('a', now=0.0)
+    buckets.take('a', now=0.0)
+    results = [buckets.take('a', now=100.0) for _ in range(3)]
+    assert results == [True, True, False]
+
+
+def test_zero_rate_means_no_limit():
+    buckets = TokenBuckets(rate=0, burst=1)
+    assert all(buckets.take('a', now=0.0) for _ in range(100))
+    assert len(buckets) == 0
+
+
+def test_sweep_drops_refilled_buckets_only():
+    buckets = TokenBuckets(rate=1, burst=5, sweep_interval=10)
+    buckets.take('idle', now=0.0)
+    for _ in range(5):
+        buckets.take('busy', now=5.0)
+    assert buckets.sweep(now=5.5) == 1  # 'idle' refilled after one second
+    assert len(buckets) == 1
+    assert buckets.evictions == 1
+
+
+def test_inline_sweep_runs_every_interval():
+    buckets = TokenBuckets(rate=1, burst=2, sweep_interval=10)
+    for i in range(50):
+        buckets.take(f"phone-{i}", now=0.0)
+    assert len(buckets) == 50
+    buckets.take('late', now=10.0)
+    assert len(buckets) == 1
+
+
+def test_bound_evicts_oldest_half_when_all_busy():
+    buckets = TokenBuckets(rate=0.001, burst=2, max_buckets=10, sweep_interval=10 ** 6)
+    for i in range(12):
+        buckets.take(f"phone-{i}", now=float(i))
+    # The 12th key found 11 > 10 buckets, none idle: the oldest ones were dropped
+    assert len(buckets) <= 10
+    assert 'phone-0' not in buckets._buckets
+    assert 'phone-11' in buckets._buckets
+    assert buckets.evictions > 0
+
+
+def test_admit_names_the_limit_hit():
+    controller = AdmissionController(phone_rate=1, phone_burst=1, service_code_rate=1, service_code_burst=2)
+    assert controller.admit('+256700000001', '*384#') is None
+    assert controller.admit('+256700000001', '*384#') == 'phone'
+    assert controller.admit('+256700000002', '*384#') is None
+    assert controller.admit('+256700000003', '*384#') == 'service_code'
+
+
+def test_refused_hop_takes_no_tokens():
+    controller = AdmissionController(phone_rate=0.001, phone_burst=2, service_code_rate=0.001, service_code_burst=1)
+    assert controller.admit('+256700000001', '*384#') is None
+    # The shortcode is out of tokens: the phone keeps its remaining one
+    assert controller.admit('+256700000001', '*384#') == 'service_code'
+    assert controller.admit('+256700000001', '*385#') is None
+    assert controller.admit('+256700000001', '*386#') == 'phone'
+    # ...and a phone-limited hop leaves the shortcode's allowance alone
+    assert controller.admit('+256700000002', '*386#') is None
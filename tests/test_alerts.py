@@ -0,0 +1,76 @@
+import threading
+import time
+
+from services.alerts import Alert, SmsDispatcher, evaluate_forecast
+
+HOUR = 3600
+NOW = 1700000000
+
+
+class RecordingSender:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def send(self, message, recipients):
+        time.sleep(self.delay)
+        with self._lock:
+            self.sent.extend(recipients)
+        return set(recipients)
+
+
+class FailingSender:
+    def send(self, message, recipients):
+        raise ConnectionError('provider down')
+
+
+def slot(dt, weather_id=800, rain=0.0):
+    item = {'dt': dt, 'weather': [{'id': weather_id}]}
+    if rain:
+        item['rain'] = {'3h': rain}
+    return item
+
+
+def make_dispatcher(tmp_path, sender):
+    return SmsDispatcher(sender, path=str(tmp_path / 'alerts.sqlite3'), rate_limit=0, max_retries=0, backoff=0)
+
+
+def test_storm_window_covers_consecutive_slots():
+    forecast = {'forecast': [slot(NOW + 3 * HOUR), slot(NOW + 6 * HOUR, 211), slot(NOW + 9 * HOUR, 202),
+                             slot(NOW + 12 * HOUR)]}
+    (alert,) = evaluate_forecast(forecast, 'Gulu', now=NOW)
+    assert (alert.rule, alert.starts_at, alert.ends_at) == ('thunderstorm', NOW + 6 * HOUR, NOW + 12 * HOUR)
+
+
+def test_concurrent_workers_send_each_number_once(tmp_path):
+    sender = RecordingSender(delay=0.05)
+    numbers = [f"+2567{i:08d}" for i in range(200)]
+    workers = [make_dispatcher(tmp_path, sender) for _ in range(4)]
+    threads = [threading.Thread(target=worker.dispatch, args=('storm', 'Storm', numbers)) for worker in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(sender.sent) == numbers
+
+
+def test_failed_numbers_are_released_for_the_next_run(tmp_path):
+    numbers = ['+256700000001', '+256700000002']
+    assert make_dispatcher(tmp_path, FailingSender()).dispatch('storm', 'Storm', numbers) == 0
+    sender = RecordingSender()
+    assert make_dispatcher(tmp_path, sender).dispatch('storm', 'Storm', numbers) == 2
+    assert make_dispatcher(tmp_path, sender).dispatch('storm', 'Storm', numbers) == 0
+
+
+def test_ongoing_event_keeps_its_key_across_midnight(tmp_path):
+    dispatcher = make_dispatcher(tmp_path, RecordingSender())
+    evening = Alert('thunderstorm', 'Gulu', NOW, 0.0, NOW + 6 * HOUR)
+    # Three hours later the first slot has passed; the storm now runs past midnight
+    later = Alert('thunderstorm', 'gulu', NOW + 3 * HOUR, 0.0, NOW + 27 * HOUR)
+    assert dispatcher.event_key(later) == dispatcher.event_key(evening)
+    # A storm after a dry gap is a new event; so is another rule
+    assert dispatcher.event_key(Alert('thunderstorm', 'Gulu', NOW + 48 * HOUR, 0.0, NOW + 51 * HOUR)) != \
+        dispatcher.event_key(evening)
+    assert dispatcher.event_key(Alert('heavy_rain', 'Gulu', NOW, 30.0, NOW + 6 * HOUR)) != \
+        dispatcher.event_key(evening)
@@ -0,0 +1,63 @@
+import threading
+
+from services.history import ObservationHistory
+
+DAY = 86400
+NOW = 1700000000.0
+
+
+def make_history(path):
+    return ObservationHistory(str(path), retention_days=7, compact_interval=10 ** 6, sync_interval=0)
+
+
+def test_compaction_drops_rows_past_retention(tmp_path):
+    history = make_history(tmp_path)
+    for i in range(10):
+        history.append('gulu', NOW - i * DAY, 25.0, 60, 800, 'clear sky')
+    history.append('lira', NOW - DAY, 24.0, 70, 500, 'light rain', rain_mm=1.5)
+    history.compact(now=NOW)
+
+    assert [o.observed_at for o in history.range('gulu')] == [NOW - i * DAY for i in range(7, -1, -1)]
+    assert history.latest('lira').description == 'light rain'
+    assert history.stats()['generation'] == 'gen-1'
+    # Another process picks up the new generation from the files
+    assert make_history(tmp_path).range('gulu') == history.range('gulu')
+
+
+def test_appends_during_compaction_are_kept(tmp_path):
+    history = make_history(tmp_path)
+    for i in range(2000):
+        history.append(f"loc-{i % 50}", NOW - DAY + i, 20.0, 50, 800, 'clear sky')
+    stop = threading.Event()
+    appended = []
+
+    def append():
+        i = 0
+        while not stop.is_set():
+            history.append(f"new-{i % 7}", NOW + i, 21.0, 55, 800, f"sky {i % 3}")
+            appended.append(i)
+            i += 1
+
+    writer = threading.Thread(target=append)
+    writer.start()
+    try:
+        for _ in range(5):
+            history.compact(now=NOW)
+    finally:
+        stop.set()
+        writer.join()
+
+    assert history.stats()['rows'] == 2000 + len(appended)
+    reread = make_history(tmp_path)
+    assert reread.stats()['rows'] == 2000 + len(appended)
+    assert sum(len(reread.range(f"new-{k}")) for k in range(7)) == len(appended)
+    assert reread.latest('new-1').description.startswith('sky ')
+
+
+def test_trend_cache_keeps_one_entry_per_key(tmp_path):
+    history = make_history(tmp_path)
+    for i in range(20):
+        history.append('gulu', NOW - 20 * 3600 + i * 3600, 25.0, 60, 800, 'clear sky')
+        history.trends('gulu', now=NOW)
+    assert len(history._trend_cache) == 1
+    assert history.trends('gulu', now=NOW)['dry_days'] >= 1
@@ -0,0 +1,108 @@
+import threading
+from datetime import datetime
+
+from services.scheduler import WeatherSnapshot
+from services.shared_snapshots import _SEQ, SharedSnapshotStore
+
+FETCHED_AT = datetime(2024, 3, 1, 9, 0).isoformat()
+
+
+def make_snapshot(location='Gulu', temperature=27.5, refreshed_at=1709280000.0):
+    weather = {'temperature': temperature, 'description': 'light rain', 'humidity': 71,
+               'wind_speed': 3.1, 'timestamp': FETCHED_AT}
+    forecast = {
+        'city': location,
+        'forecast': [],
+        'daily': [
+            {'date': '2024-03-01', 'min_temp': 19.5, 'max_temp': 29.0, 'condition': 'light rain',
+             'rain_probability': 0.8, 'rain_mm': 4.5},
+            {'date': '2024-03-02', 'min_temp': 18.0, 'max_temp': 30.5, 'condition': 'clear sky',
+             'rain_probability': 0.1, 'rain_mm': 0.0},
+        ],
+        'timestamp': FETCHED_AT,
+    }
+    return WeatherSnapshot(location, weather, forecast, refreshed_at, 0.25)
+
+
+def as_plain(value):
+    """Undo _freeze (read-only mappings and tuples) for comparison"""
+    if hasattr(value, 'items'):
+        return {k: as_plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [as_plain(v) for v in value]
+    return value
+
+
+def test_round_trip(tmp_path):
+    store = SharedSnapshotStore(str(tmp_path / 'snapshots'), ['Gulu', 'Kitgum'])
+    assert store.get('Gulu') is None
+    snapshot = make_snapshot()
+    store.put(snapshot)
+
+    read = store.get('gulu')
+    assert read.location == 'Gulu'
+    assert read.refreshed_at == snapshot.refreshed_at
+    assert as_plain(read.weather) == snapshot.weather
+    assert as_plain(read.forecast) == snapshot.forecast
+    assert store.get('Kitgum') is None
+    assert store.get('Nowhere') is None
+
+
+def test_other_process_mapping_sees_writes(tmp_path):
+    path = str(tmp_path / 'snapshots')
+    writer = SharedSnapshotStore(path, ['Gulu'])
+    reader = SharedSnapshotStore(path, ['Gulu'])
+    writer.put(make_snapshot(temperature=20))
+    assert reader.get('Gulu').weather['temperature'] == 20
+    writer.put(make_snapshot(temperature=21))
+    assert reader.get('Gulu').weather['temperature'] == 21
+
+
+def test_errors_round_trip(tmp_path):
+    store = SharedSnapshotStore(str(tmp_path / 'snapshots'), ['Gulu'])
+    store.put(WeatherSnapshot('Gulu', {'error': 'x'}, {'error': 'y'}, 1.0, 0.0))
+    read = store.get('Gulu')
+    assert 'error' in read.weather and 'error' in read.forecast
+
+
+def test_reader_never_returns_a_write_in_progress(tmp_path):
+    store = SharedSnapshotStore(str(tmp_path / 'snapshots'), ['Gulu'])
+    store.put(make_snapshot(temperature=20))
+    assert store.get('Gulu').weather['temperature'] == 20
+
+    # A writer that died (or stalled) mid-record leaves the sequence odd
+    offset = store._offset(0)
+    (seq,) = _SEQ.unpack_from(store._map, offset)
+    _SEQ.pack_into(store._map, offset, seq + 1)
+    assert store.get('Gulu').weather['temperature'] == 20  # last good decode
+    assert SharedSnapshotStore(str(tmp_path / 'snapshots'), ['Gulu']).get('Gulu') is None
+
+    # The next writer completes the sequence again
+    store.put(make_snapshot(temperature=22))
+    assert _SEQ.unpack_from(store._map, offset)[0] % 2 == 0
+    assert store.get('Gulu').weather['temperature'] == 22
+
+
+def test_concurrent_reads_are_never_torn(tmp_path):
+    path = str(tmp_path / 'snapshots')
+    writer = SharedSnapshotStore(path, ['Gulu'])
+    reader = SharedSnapshotStore(path, ['Gulu'])
+    writer.put(make_snapshot(temperature=0, refreshed_at=0.0))
+    stop = threading.Event()
+
+    def write():
+        i = 0
+        while not stop.is_set():
+            i += 1
+            writer.put(make_snapshot(temperature=i, refreshed_at=float(i)))
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    try:
+        for _ in range(2000):
+            snapshot = reader.get('Gulu')
+            # Every field of one record comes from the same put()
+            assert snapshot.weather['temperature'] == snapshot.refreshed_at
+    finally:
+        stop.set()
+        thread.join()
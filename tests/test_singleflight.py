@@ -0,0 +1,140 @@
+import asyncio
+import threading
+import time
+
+from services.singleflight import AsyncSingleFlight, SingleFlight
+from services.weather_service import WeatherService
+
+THREADS = 16
+
+
+def run_concurrently(fn, count=THREADS):
+    start = threading.Barrier(count)
+    results = [None] * count
+
+    def worker(i):
+        start.wait()
+        results[i] = fn()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class SlowUpstream:
+    """Stands in for UpstreamClient.get_json; counts calls"""
+
+    def __init__(self, delay=0.2):
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def get_json(self, url, params=None, deadline=None):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return {'main': {'temp': 25, 'humidity': 60}, 'weather': [{'description': 'clear sky'}],
+                'wind': {'speed': 2}, 'dt': 1700000000}
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return 'value'
+
+    results = run_concurrently(lambda: flight.do('key', slow))
+    assert results == ['value'] * THREADS
+    assert len(calls) == 1
+    assert flight.stats() == {'executions': 1, 'deduplicated': THREADS - 1, 'in_flight': 0}
+
+
+def test_waiters_get_the_leaders_exception():
+    flight = SingleFlight()
+
+    def failing():
+        time.sleep(0.2)
+        raise ValueError('upstream broke')
+
+    def call():
+        try:
+            flight.do('key', failing)
+        except ValueError as e:
+            return str(e)
+
+    assert run_concurrently(call) == ['upstream broke'] * THREADS
+    assert flight.in_flight() == 0
+
+
+def test_waiter_timeout():
+    flight = SingleFlight()
+    started = threading.Event()
+
+    def slow():
+        started.set()
+        time.sleep(0.3)
+        return 'value'
+
+    leader = threading.Thread(target=flight.do, args=('key', slow))
+    leader.start()
+    started.wait()
+    try:
+        flight.do('key', slow, timeout=0.01)
+    except TimeoutError:
+        pass
+    else:
+        raise AssertionError('waiter did not time out')
+    leader.join()
+
+
+def test_weather_cache_misses_make_one_upstream_call():
+    service = WeatherService()
+    upstream = service.upstream = SlowUpstream()
+
+    results = run_concurrently(lambda: service._get_cached_weather_data('weather', 2.77, 32.3))
+    assert upstream.calls == 1
+    assert all(entry is not None and entry.value['main']['temp'] == 25 for entry in results)
+    assert service.inflight.stats()['deduplicated'] == THREADS - 1
+
+
+def test_async_callers_share_one_execution():
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def slow():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return 'value'
+
+    async def main():
+        return await asyncio.gather(*(flight.do('key', slow) for _ in range(THREADS)))
+
+    assert asyncio.run(main()) == ['value'] * THREADS
+    assert len(calls) == 1
+    assert flight.stats() == {'executions': 1, 'deduplicated': THREADS - 1, 'in_flight': 0}
+
+
+def test_cancelled_async_leader_does_not_cancel_waiters():
+    flight = AsyncSingleFlight()
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        return 'value'
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do('key', slow))
+        await asyncio.sleep(0)  # let the leader start the call
+        waiters = [asyncio.ensure_future(flight.do('key', slow)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()  # e.g. the leader's client disconnected
+        results = await asyncio.gather(*waiters)
+        return leader.cancelled(), results
+
+    assert asyncio.run(main()) == (True, ['value'] * 3)
+    assert flight.in_flight() == 0
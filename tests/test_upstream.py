@@ -0,0 +1,174 @@
+import requests
+
+from services.upstream import CircuitBreaker, CircuitOpenError, UpstreamClient
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class StubResponse:
+    def __init__(self, status_code=200, body=None, error=None):
+        self.status_code = status_code
+        self.body = body
+        self.error = error
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code}", response=self)
+
+    def json(self):
+        if self.error is not None:
+            raise self.error
+        return self.body
+
+
+class StubSession:
+    """Replays a list of responses (or exceptions to raise) for successive get() calls"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def get(self, url, params=None, timeout=None):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+
+def make_breaker(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr('services.upstream.time.monotonic', clock)
+    return CircuitBreaker(failure_rate=0.5, window=4, min_calls=4, reset_timeout=30), clock
+
+
+def open_breaker(breaker):
+    for _ in range(4):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def make_client(breaker, *outcomes):
+    client = UpstreamClient(max_retries=0, breaker=breaker)
+    client._session = StubSession(*outcomes)
+    return client
+
+
+def test_opens_once_failure_rate_is_reached(monkeypatch):
+    breaker, _ = make_breaker(monkeypatch)
+    for _ in range(3):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED  # below min_calls
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.rejected == 1
+
+
+def test_half_open_lets_one_trial_through(monkeypatch):
+    breaker, clock = make_breaker(monkeypatch)
+    open_breaker(breaker)
+    clock.now += 30
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # the trial is still in flight
+
+
+def test_trial_success_closes(monkeypatch):
+    breaker, clock = make_breaker(monkeypatch)
+    open_breaker(breaker)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.stats()['recent_calls'] == 0
+
+
+def test_trial_failure_reopens(monkeypatch):
+    breaker, clock = make_breaker(monkeypatch)
+    open_breaker(breaker)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.times_opened == 2
+    clock.now += 29
+    assert not breaker.allow()
+
+
+def test_client_records_success_and_failure(monkeypatch):
+    breaker, _ = make_breaker(monkeypatch)
+    client = make_client(breaker, StubResponse(body={'ok': True}), requests.exceptions.ConnectionError('down'))
+    assert client.get_json('http://upstream/weather') == {'ok': True}
+    try:
+        client.get_json('http://upstream/weather')
+    except requests.exceptions.ConnectionError:
+        pass
+    assert breaker.stats()['recent_calls'] == 2
+    assert breaker.stats()['recent_failures'] == 1
+
+
+def test_client_error_status_is_not_an_outage(monkeypatch):
+    breaker, _ = make_breaker(monkeypatch)
+    client = make_client(breaker, StubResponse(status_code=404))
+    try:
+        client.get_json('http://upstream/weather')
+    except requests.exceptions.HTTPError:
+        pass
+    assert breaker.stats()['recent_failures'] == 0
+
+
+def test_open_client_does_not_call_upstream(monkeypatch):
+    breaker, _ = make_breaker(monkeypatch)
+    open_breaker(breaker)
+    client = make_client(breaker)
+    try:
+        client.get_json('http://upstream/weather')
+    except CircuitOpenError:
+        pass
+    else:
+        raise AssertionError('open breaker let a call through')
+    assert client._session.calls == 0
+
+
+def trial_after_error(monkeypatch, outcome, expected):
+    breaker, clock = make_breaker(monkeypatch)
+    open_breaker(breaker)
+    clock.now += 30
+    client = make_client(breaker, outcome)
+    try:
+        client.get_json('http://upstream/weather')
+    except expected:
+        pass
+    else:
+        raise AssertionError('the trial call did not fail')
+    return breaker, clock
+
+
+def test_bad_body_on_trial_reopens_instead_of_wedging(monkeypatch):
+    bad_body = StubResponse(error=requests.exceptions.JSONDecodeError('Expecting value', '<html>', 0))
+    breaker, clock = trial_after_error(monkeypatch, bad_body, requests.exceptions.JSONDecodeError)
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 30
+    assert breaker.allow()  # a new trial is possible once the reset timeout passes again
+
+
+def test_other_requests_error_on_trial_reopens(monkeypatch):
+    broken = requests.exceptions.ChunkedEncodingError('connection broken')
+    breaker, clock = trial_after_error(monkeypatch, broken, requests.exceptions.ChunkedEncodingError)
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 30
+    assert breaker.allow()
+
+
+def test_unexpected_error_on_trial_releases_it(monkeypatch):
+    breaker, _ = trial_after_error(monkeypatch, KeyError('surprise'), KeyError)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()  # not wedged waiting for a trial that will never report back
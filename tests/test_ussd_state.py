@@ -0,0 +1,50 @@
+import random
+import sys
+
+from services.ussd_state import INITIAL_STATE, replay, step
+
+CHOICES = ('0', '1', '2', '3', '9', '00', '', 'x')
+
+
+def replay_by_step(history):
+    """What a stateful session would hold after each hop of history"""
+    state = INITIAL_STATE
+    if history:
+        for choice in history.split('*'):
+            state, _ = step(state, choice)
+    return state
+
+
+def test_empty_history_is_the_initial_state():
+    assert replay('') == INITIAL_STATE
+
+
+def test_language_choice():
+    assert replay('2').language == 'luo'
+    assert replay('2').menu == 'main'
+    assert replay('1*1').menu == 'weather'
+    assert replay('1*0').menu == 'ended'
+
+
+def test_replay_matches_stateful_steps():
+    rng = random.Random(5)
+    for _ in range(5000):
+        history = '*'.join(rng.choice(CHOICES) for _ in range(rng.randint(1, 10)))
+        assert replay(history) == replay_by_step(history), history
+
+
+def test_hop_by_hop_matches_stateful_session():
+    rng = random.Random(7)
+    for _ in range(200):
+        state = INITIAL_STATE
+        history = ''
+        for hop in range(rng.randint(1, 12)):
+            choice = rng.choice(CHOICES)
+            history = f"{history}*{choice}" if hop else choice
+            state, _ = step(state, choice)
+            assert replay(history) == state, history
+
+
+def test_long_history_does_not_recurse():
+    history = '*'.join(['1'] + ['1', '0'] * (sys.getrecursionlimit() * 2))
+    assert replay(history) == replay_by_step(history)
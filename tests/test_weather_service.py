@@ -0,0 +1,48 @@
+import threading
+
+from services.deadline import Deadline
+from services.weather_service import WeatherService
+
+
+def test_caller_without_deadline_does_not_inherit_a_deadline_failure():
+    service = WeatherService()
+    leader_started = threading.Event()
+    release_leader = threading.Event()
+
+    def get_weather_data(endpoint, params, deadline=None):
+        if deadline is not None:
+            # The USSD leader runs out of time and gets nothing
+            leader_started.set()
+            release_leader.wait(5)
+            return None
+        return {'main': {'temp': 25.0}}
+
+    service._get_weather_data = get_weather_data
+    results = {}
+    leader = threading.Thread(target=lambda: results.update(
+        ussd=service._get_cached_weather_data('weather', 2.77, 32.3, deadline=Deadline(5))
+    ))
+    leader.start()
+    assert leader_started.wait(5)
+    try:
+        entry = service._get_cached_weather_data('weather', 2.77, 32.3)
+    finally:
+        release_leader.set()
+        leader.join(5)
+
+    assert entry.value == {'main': {'temp': 25.0}}
+    assert results['ussd'] is None
+    assert service.inflight.stats()['deduplicated'] == 0
+
+
+def test_batch_answers_every_spelling_with_one_lookup():
+    service = WeatherService()
+    looked_up = []
+    service._peek = lambda endpoint, location: None
+    service.get_weather = lambda location, deadline=None: looked_up.append(location) or {'location': location}
+
+    results = service.get_weather_many(['Gulu', 'Lira', ' gulu', '', 'GULU'])
+
+    assert looked_up.count('Gulu') == 1 and len(looked_up) == 2
+    assert list(results) == ['Gulu', 'Lira', ' gulu', 'GULU']
+    assert results[' gulu'] == results['GULU'] == {'location': 'Gulu'}
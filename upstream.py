@@ -0,0 +1,237 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+from .deadline import DeadlineExceeded
+
+UPSTREAM_POOL_CONNECTIONS = int(os.getenv('UPSTREAM_POOL_CONNECTIONS', '4'))  # distinct hosts kept pooled
+UPSTREAM_POOL_MAXSIZE = int(os.getenv('UPSTREAM_POOL_MAXSIZE', '32'))  # keep-alive connections per host
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv('UPSTREAM_CONNECT_TIMEOUT', '3.05'))  # seconds
+UPSTREAM_READ_TIMEOUT = float(os.getenv('UPSTREAM_READ_TIMEOUT', '10'))  # seconds
+UPSTREAM_MAX_RETRIES = int(os.getenv('UPSTREAM_MAX_RETRIES', '2'))
+UPSTREAM_BACKOFF = float(os.getenv('UPSTREAM_BACKOFF', '0.2'))  # seconds, base of exponential backoff
+BREAKER_FAILURE_RATE = float(os.getenv('BREAKER_FAILURE_RATE', '0.5'))
+BREAKER_WINDOW = int(os.getenv('BREAKER_WINDOW', '20'))  # most recent calls considered
+BREAKER_MIN_CALLS = int(os.getenv('BREAKER_MIN_CALLS', '5'))
+BREAKER_RESET_TIMEOUT = float(os.getenv('BREAKER_RESET_TIMEOUT', '30'))  # seconds open before a trial call
+
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the upstream while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Error-rate circuit breaker over a sliding window of recent calls.
+
+    closed -> open once the failure rate in the window crosses the threshold;
+    open -> half_open after reset_timeout, letting one trial call through;
+    half_open -> closed on success, back to open on failure.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_rate=BREAKER_FAILURE_RATE, window=BREAKER_WINDOW,
+                 min_calls=BREAKER_MIN_CALLS, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self._outcomes = deque(maxlen=window)  # True = failure
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.times_opened = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self):
+        """Return True if a call may go to the upstream now"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+            if self._state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._outcomes.append(False)
+            if self._state == self.HALF_OPEN:
+                self._state = self.CLOSED
+                self._trial_in_flight = False
+                self._outcomes.clear()
+
+    def release(self):
+        """Give back a call allowed by allow() that never reached the upstream"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._outcomes.append(True)
+            if self._state == self.HALF_OPEN:
+                self._open()
+                return
+            if self._state == self.CLOSED and len(self._outcomes) >= self.min_calls:
+                if sum(self._outcomes) / len(self._outcomes) >= self.failure_rate:
+                    self._open()
+
+    def _open(self):
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._trial_in_flight = False
+        self.times_opened += 1
+
+    def stats(self):
+        with self._lock:
+            recent = len(self._outcomes)
+            failures = sum(self._outcomes)
+        return {
+            'state': self.state,
+            'recent_calls': recent,
+            'recent_failures': failures,
+            'rejected': self.rejected,
+            'times_opened': self.times_opened
+        }
+
+
+class UpstreamClient:
+    """Pooled keep-alive HTTP client with bounded, jittered retries and a circuit breaker"""
+
+    def __init__(self, pool_connections=UPSTREAM_POOL_CONNECTIONS, pool_maxsize=UPSTREAM_POOL_MAXSIZE,
+                 max_retries=UPSTREAM_MAX_RETRIES, backoff=UPSTREAM_BACKOFF,
+                 timeout=(UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_READ_TIMEOUT), breaker=None):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self._session = None
+        self._session_lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+
+    @property
+    def session(self):
+        """Pooled requests.Session, created (and requests imported) on the first call"""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+                    session = requests.Session()
+                    # Retries are handled here (with jitter), so the adapter itself never retries
+                    adapter = HTTPAdapter(
+                        pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize, max_retries=0
+                    )
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session = session
+        return self._session
+
+    def _sleep_before_retry(self, attempt, deadline=None):
+        # Full jitter: spreads retries from many workers instead of synchronizing them
+        delay = random.uniform(0, self.backoff * (2 ** attempt))
+        if deadline is not None:
+            delay = min(delay, deadline.remaining())
+        time.sleep(delay)
+        self.retries += 1
+
+    def _attempt_timeout(self, timeout, deadline):
+        connect, read = timeout
+        if deadline is None:
+            return connect, read
+        return deadline.timeout(cap=connect), deadline.timeout(cap=read)
+
+    def get_json(self, url, params=None, timeout=None, deadline=None):
+        """GET url and return the decoded JSON body.
+
+        Each attempt's timeout is capped by the deadline's remaining budget and
+        no retry is started once it runs out. Raises CircuitOpenError without
+        touching the network while the breaker is open, DeadlineExceeded if
+        there was no budget for even one attempt, or the last requests
+        exception once retries are used up.
+        """
+        import requests
+
+        if deadline is not None and deadline.expired():
+            raise DeadlineExceeded(f"No time left to call {url}")
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {url}")
+
+        last_error = None
+        recorded = False
+        try:
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    self._sleep_before_retry(attempt - 1, deadline)
+                try:
+                    attempt_timeout = self._attempt_timeout(timeout or self.timeout, deadline)
+                except DeadlineExceeded:
+                    break
+                self.requests += 1
+                try:
+                    response = self.session.get(url, params=params, timeout=attempt_timeout)
+                except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                    last_error = e
+                    continue
+
+                if response.status_code in RETRY_STATUSES:
+                    last_error = requests.exceptions.HTTPError(
+                        f"{response.status_code} from upstream", response=response
+                    )
+                    continue
+                try:
+                    response.raise_for_status()
+                except requests.exceptions.HTTPError:
+                    # Other 4xx errors are our fault, not an upstream outage
+                    recorded = True
+                    self.breaker.record_success()
+                    raise
+                data = response.json()  # a bad body raises requests' JSONDecodeError
+                recorded = True
+                self.breaker.record_success()
+                return data
+
+            if last_error is None:
+                # Budget ran out before the first attempt; says nothing about upstream health
+                raise DeadlineExceeded(f"No time left to call {url}")
+            recorded = True
+            self.breaker.record_failure()
+            raise last_error
+        except requests.exceptions.RequestException:
+            # Bad bodies, redirect loops, broken chunking...: the upstream call failed
+            if not recorded:
+                recorded = True
+                self.breaker.record_failure()
+            raise
+        finally:
+            if not recorded:
+                # Never reached an outcome (no budget, or an unexpected error): free a half-open trial
+                self.breaker.release()
+
+    def stats(self):
+        return {
+            'breaker': self.breaker.stats(),
+            'requests': self.requests,
+            'retries': self.retries
+        }
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
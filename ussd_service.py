@@ -1,324 +1,275 @@
-import africastalking
+import asyncio
+import logging
 import os
-from datetime import datetime, timedelta
-from collections import Counter # For forecast condition summarization
+import time
+from collections import namedtuple
+from datetime import datetime
 from .weather_service import WeatherService
+from .scheduler import PrefetchScheduler, PREFETCH_ENABLED, PREFETCH_LOCATIONS
+from .shared_snapshots import create_shared_store
+from .session_store import SessionRecord, create_session_store
+from .ussd_state import ENDED, INITIAL_STATE, UssdState, replay, step
+from .menu_engine import MenuEngine
+from .advice import AdviceEngine
+from .deadline import USSD_DEADLINE_RESERVE
+from .localization import DEFAULT_LANGUAGE
+from .instrumentation import STAGE_SECONDS, USSD_HOPS
+
+logger = logging.getLogger(__name__)
+
+# Outcome of the menu step for one hop: a finished response, or a screen to render for state.
+# session is the stored SessionRecord to save afterwards (None in stateless mode).
+Hop = namedtuple('Hop', ['response', 'screen', 'state', 'session'])
+
+USSD_STATELESS = os.getenv('USSD_STATELESS', '0').lower() in ('1', 'true', 'yes')
 
 class USSDService:
-    def __init__(self):
-        self.session_data = {}
-        self.weather_service = WeatherService()
-        username = os.getenv('AFRICASTALKING_USERNAME')
-        api_key = os.getenv('AFRICASTALKING_API_KEY')
-        if not username or not api_key:
+    def __init__(self, session_store=None, stateless=USSD_STATELESS, weather_service=None, subscribers=None):
+        self.stateless = stateless
+        self.sessions = None
+        if not stateless:
+            self.sessions = session_store if session_store is not None else create_session_store()
+            self.sessions.start_sweeper()
+        self.subscribers = subscribers  # SubscriberRegistry for SMS alerts, optional
+        self.advice = AdviceEngine()
+        self.degraded_responses = 0
+        self.menu = MenuEngine(advice=self.advice.advise)
+        self.weather_service = weather_service if weather_service is not None else WeatherService()
+        self.prefetcher = None
+        if PREFETCH_ENABLED:
+            self.prefetcher = PrefetchScheduler(
+                self.weather_service, shared_store=create_shared_store(PREFETCH_LOCATIONS)
+            )
+            self.prefetcher.start()
+        self.africastalking_username = os.getenv('AFRICASTALKING_USERNAME')
+        self.africastalking_api_key = os.getenv('AFRICASTALKING_API_KEY')
+        if not self.africastalking_username or not self.africastalking_api_key:
             raise ValueError('AfricasTalking credentials not found in environment variables')
-        africastalking.initialize(username=username, api_key=api_key)
-        self.ussd = africastalking.USSD
+        self._ussd = None
+
+    @property
+    def ussd(self):
+        """Africa's Talking USSD client; the SDK is imported and initialized on first use"""
+        if self._ussd is None:
+            import africastalking
+            africastalking.initialize(
+                username=self.africastalking_username, api_key=self.africastalking_api_key
+            )
+            self._ussd = africastalking.USSD
+        return self._ussd
+
+    def _current_data(self, needs, location, deadline=None):
+        """Latest weather or forecast, from the prefetched snapshot when available.
+
+        Without a snapshot the upstream is called under whatever is left of the
+        deadline; if that is already (nearly) used up no call is made.
+        """
+        snapshot = self.prefetcher.get(location) if self.prefetcher else None
+        if snapshot is not None:
+            return snapshot.weather if needs == 'weather' else snapshot.forecast
+        if deadline is not None:
+            if deadline.expired(USSD_DEADLINE_RESERVE):
+                return {"error": "Request deadline exceeded"}
+            deadline = deadline.reserve(USSD_DEADLINE_RESERVE)
+        if needs == 'weather':
+            return self.weather_service.get_weather(location, deadline=deadline)
+        return self.weather_service.get_forecast(location, deadline=deadline)
+
+    async def _current_data_async(self, needs, location, weather_service, deadline=None):
+        """_current_data awaiting an AsyncWeatherService instead of blocking on the upstream"""
+        snapshot = self.prefetcher.get(location) if self.prefetcher else None
+        if snapshot is not None:
+            return snapshot.weather if needs == 'weather' else snapshot.forecast
+        if deadline is not None:
+            if deadline.expired(USSD_DEADLINE_RESERVE):
+                return {"error": "Request deadline exceeded"}
+            deadline = deadline.reserve(USSD_DEADLINE_RESERVE)
+        if needs == 'weather':
+            return await weather_service.get_weather(location, deadline=deadline)
+        return await weather_service.get_forecast(location, deadline=deadline)
+
+    def _last_known_data(self, needs, location):
+        """Last cached weather or forecast, else the last recorded observation, without network I/O"""
+        if needs == 'weather':
+            return (self.weather_service.peek_weather(location)
+                    or self.weather_service.last_observed_weather(location))
+        return self.weather_service.peek_forecast(location)
+
+    def _with_trends(self, data, location):
+        """Add rolling aggregates from the observation history (for trend-based advice)"""
+        trends = self.weather_service.weather_trends(location)
+        return dict(data, trends=trends) if trends else data
 
     def _initialize_session(self, session_id, phone_number):
-        print(f"[DEBUG] Initializing session for {phone_number}, ID: {session_id}")
-        self.session_data[session_id] = {
-            'phone_number': phone_number,
-            'current_menu': 'language', # Start with language selection
-            'selected_location': 'Gulu', # Default location
-            'session_start': datetime.now(),
-            'last_activity': datetime.now(),
-            'language': 'en', # Default language
-            'language_selected': False
-        }
-
-    def handle_ussd(self, session_id, phone_number, text):
-        """Handle USSD session requests"""
-        print(f"[DEBUG] USSD Request - Session: {session_id}, Phone: {phone_number}, Text: '{text}'")
-
-        if session_id not in self.session_data:
+        logger.debug("Initializing session for %s, ID: %s", phone_number, session_id)
+        session = SessionRecord(phone_number) # Starts at language selection, Gulu, English
+        self.sessions.put(session_id, session)
+        return session
+
+    def handle_ussd(self, session_id, phone_number, text, deadline=None):
+        """Handle USSD session requests.
+
+        deadline (a Deadline) bounds any upstream work; when it runs out the
+        reply falls back to the last known data or a short "try again" screen.
+        """
+        hop = self._advance(session_id, phone_number, text)
+        if hop.response is not None:
+            return hop.response
+        return self._finish(session_id, hop, self._render(hop.screen, hop.state, deadline))
+
+    async def handle_ussd_async(self, session_id, phone_number, text, weather_service, deadline=None):
+        """handle_ussd for the async serving mode.
+
+        Menu steps and sessions are exactly those of handle_ussd; the weather
+        is awaited from weather_service (an AsyncWeatherService) and the
+        session store, subscriber registry and history are used on the
+        default executor, so a slow disk or lock never stalls the loop.
+        """
+        loop = asyncio.get_running_loop()
+        hop = await loop.run_in_executor(None, self._advance, session_id, phone_number, text)
+        if hop.response is not None:
+            return hop.response
+        response = await self._render_async(hop.screen, hop.state, weather_service, deadline)
+        return await loop.run_in_executor(None, self._finish, session_id, hop, response)
+
+    def _advance(self, session_id, phone_number, text):
+        """Apply the hop's input to the session (or replayed history) and return a Hop"""
+        logger.debug("USSD Request - Session: %s, Phone: %s, Text: '%s'", session_id, phone_number, text)
+
+        if self.stateless:
+            return self._advance_stateless(phone_number, text)
+
+        with STAGE_SECONDS.time('session_lookup'):
+            session = self.sessions.get(session_id)
+        if session is None:
             self._initialize_session(session_id, phone_number)
-            return self._get_language_menu()
+            USSD_HOPS.inc(1, 'language_menu')
+            return Hop(self.menu.render('language_menu', DEFAULT_LANGUAGE), None, None, None)
 
-        self.session_data[session_id]['last_activity'] = datetime.now()
-        session_start_time = self.session_data[session_id]['session_start']
-        if (datetime.now() - session_start_time).total_seconds() > 1800: # 30 minutes timeout
-            print(f"[DEBUG] Session {session_id} timed out. Re-initializing.")
+        now = time.time()
+        session.last_activity = now
+        if now - session.session_start > 1800: # 30 minutes timeout
+            logger.debug("Session %s timed out. Re-initializing.", session_id)
             self._initialize_session(session_id, phone_number) # Reset to language selection
-            # Notify user of timeout and show language menu
-            timeout_msg_en = "CON Session timed out. Please select your language again.\n"
-            timeout_msg_luo = "CON Kinde mar tiyo gi wach otum. Bed iyer dho ki.\n" # Luo for session timeout
-            # We don't know the language yet, so show a generic part of language menu or a combined message
-            # For simplicity, just restart the language menu
-            return self._get_language_menu()
-
-        current_menu = self.session_data[session_id].get('current_menu', 'language')
-        lang = self.session_data[session_id].get('language', 'en')
+            # We don't know the language yet, so just restart the language menu
+            USSD_HOPS.inc(1, 'language_menu')
+            return Hop(self.menu.render('language_menu', DEFAULT_LANGUAGE), None, None, None)
 
         full_input_string = text.strip() if text else ""
-        input_parts = full_input_string.split('*')
-        current_choice = input_parts[-1] if input_parts else ""
-
-        # Handle global navigation first if language is selected
-        if self.session_data[session_id].get('language_selected', False):
-            if current_choice == "00" or current_choice == "*0":
-                print(f"[DEBUG] Global navigation to main menu for session {session_id}")
-                self.session_data[session_id]['current_menu'] = 'main'
-                return self._show_main_menu(lang)
-        
-        # If language not selected, force to language selection (unless already there)
-        if not self.session_data[session_id].get('language_selected', False) and current_menu != 'language':
-            print(f"[DEBUG] Language not selected, forcing to language menu for session {session_id}")
-            self.session_data[session_id]['current_menu'] = 'language'
-            current_menu = 'language' # Update current_menu for routing below
-            if not full_input_string: # If it was an empty string that led here, show menu
-                 return self._get_language_menu()
-
-        try:
-            if current_menu == 'language':
-                return self._handle_language_selection(session_id, current_choice)
-            elif current_menu == 'main':
-                return self._process_main_menu_selection(session_id, current_choice)
-            elif current_menu == 'weather':
-                return self._show_weather(session_id, current_choice)
-            elif current_menu == 'forecast':
-                return self._show_forecast(session_id, current_choice)
-            elif current_menu == 'tips':
-                return self._show_farming_tips(session_id, current_choice)
-            else:
-                # Fallback for unknown state
-                print(f"[WARN] Unknown menu state '{current_menu}'. Resetting to language menu.")
-                self.session_data[session_id]['current_menu'] = 'language'
-                return self._get_language_menu(show_invalid=True)
-        except Exception as e:
-            print(f"[CRITICAL] Error in USSD handler: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            # Generic error message, as language might not be set or be incorrect
-            return "END A technical error occurred. Please try again later."
-
-    def _get_language_menu(self, show_invalid=False):
-        response = """CON Select Language / Yer Dhok:
-1. English
-2. Dholuo
-0. Exit / Wuok"""
-        if show_invalid:
-            # Generic invalid message as language isn't confirmed
-            response = "CON Invalid selection. Please try again.\n\n" + response 
+        current_choice = full_input_string.rpartition('*')[2]
+        state = UssdState(
+            menu=session.current_menu,
+            language=session.language,
+            language_selected=session.language_selected,
+            location=session.selected_location
+        )
+        state, screen = step(state, current_choice)
+        session.current_menu = state.menu
+        session.language = state.language
+        session.language_selected = state.language_selected
+        if self.subscribers is not None and state.language_selected:
+            self.subscribers.record(phone_number, state.language, state.location)
+        return Hop(None, screen, state, session)
+
+    def _finish(self, session_id, hop, response):
+        """Store or drop the session once the hop's screen is rendered"""
+        if hop.session is None:
+            return response
+        if hop.state.menu == ENDED:
+            self._end_session(session_id)
+        elif not response.startswith("END"):
+            with STAGE_SECONDS.time('session_save'):
+                self.sessions.put(session_id, hop.session)
         return response
 
-    def _handle_language_selection(self, session_id, text):
-        if text == "1":
-            self.session_data[session_id]['language'] = 'en'
-            self.session_data[session_id]['language_selected'] = True
-            self.session_data[session_id]['current_menu'] = 'main'
-            return self._show_main_menu('en')
-        elif text == "2":
-            self.session_data[session_id]['language'] = 'luo'
-            self.session_data[session_id]['language_selected'] = True
-            self.session_data[session_id]['current_menu'] = 'main'
-            return self._show_main_menu('luo')
-        elif text == "0":
-            return self._end_session(session_id) # Will use default or last lang
-        else:
-            return self._get_language_menu(show_invalid=True)
-
-    def _show_main_menu(self, lang):
-        if lang == 'luo':
-            response = """CON Meny mar Loch (Gulu):
-1. Nen Piny Kawuono
-2. Nen Piny Ndege Adek
-3. Puonj mag Puro
-0. Wuok"""
-        else:
-            response = """CON Main Menu (Gulu):
-1. Today's Weather
-2. 3-Day Forecast
-3. Farming Tips
-0. Exit"""
-        return response
-
-    def _process_main_menu_selection(self, session_id, text):
-        lang = self.session_data[session_id]['language']
-        if text == "1":
-            self.session_data[session_id]['current_menu'] = 'weather'
-            return self._show_weather(session_id, "") # Pass empty text for initial display
-        elif text == "2":
-            self.session_data[session_id]['current_menu'] = 'forecast'
-            return self._show_forecast(session_id, "") # Pass empty text
-        elif text == "3":
-            self.session_data[session_id]['current_menu'] = 'tips'
-            return self._show_farming_tips(session_id, "") # Pass empty text
-        elif text == "0":
-            return self._end_session(session_id)
-        else:
-            # Invalid selection, show main menu again with error message
-            error_msg = "CON Tic mogo. Tem kendo.\n\n" if lang == 'luo' else "CON Invalid selection. Try again.\n\n"
-            return error_msg + self._show_main_menu(lang)
-
-    def _get_farming_advice(self, weather_data, language='en'):
-        temp = weather_data.get('temperature', 0)
-        humidity = weather_data.get('humidity', 0)
-        description = weather_data.get('description', '').lower()
-        advice_list = []
-
-        if language == 'luo':
-            advice_intro = "PUONJ MAG PURO:\n" # FARMING TIPS
-            if 'rain' in description or 'drizzle' in description or 'thunderstorm' in description:
-                advice_list.append("- Kinde koth: Pidho cham kod povrigo. Ket laro ne pi.") # Rainy season: Plant crops and vegetables. Manage water runoff.
-                advice_list.append("- Kinde koth: Ng'i kodi pile mondo kik two mar koth ogogi.") # Rainy season: Monitor crops regularly for rain-related diseases.
-            elif temp > 28 or 'sun' in description or 'clear' in description:
-                advice_list.append("- Kinde oro: Keyo cham mochek. Pwodhi kodi odhiambo kata gokinyi.") # Sunny/Dry season: Harvest mature crops. Irrigate in the evening or early morning.
-                advice_list.append("- Kinde oro: Bed motang' gi kute/kuodi. Tim chenro mag kweroogi.") # Sunny/Dry season: Watch for pests. Implement pest control.
-            else:
-                advice_list.append("- Tim pur motegno. Luw chenro mar puro ni mondo iyud keyo mang'eny.") # General: Farm diligently. Follow your farming schedule for good yields.
-
-            if humidity > 75 and not any('Piny obo' in adv for adv in advice_list):
-                advice_list.append("- Piny obo ahinya. Ng'i kodi maber mondo two fungal kik donji.") # High humidity: Watch for fungal diseases.
-            if temp < 18 and not ('rain' in description or 'drizzle' in description or 'thunderstorm' in description) and not any('Piny ng\'ich' in adv for adv in advice_list):
-                advice_list.append("- Piny ng'ich matin. Rit kodi moko ma yotnegi koyo.") # Cool weather: Protect sensitive crops from cold.
-            
-            if not advice_list:
-                advice_list.append("- Tim pur maber kendo luw puonj mag puro mapile.") # Default: Farm well and follow regular farming advice.
-            return advice_intro + '\n'.join(advice_list)
-        else: # English
-            advice_intro = "FARMING TIPS:\n"
-            if 'rain' in description or 'drizzle' in description or 'thunderstorm' in description:
-                advice_list.append("- Rainy Season: Plant suitable crops and vegetables. Ensure good drainage.")
-                advice_list.append("- Rainy Season: Monitor crops for diseases common in wet conditions.")
-            elif temp > 28 or 'sun' in description or 'clear' in description:
-                advice_list.append("- Sunny/Dry Season: Harvest mature crops. Irrigate efficiently, preferably in the evening or early morning.")
-                advice_list.append("- Sunny/Dry Season: Implement pest control measures as needed.")
-            else:
-                advice_list.append("- General Conditions: Maintain your farm. Follow your planting and harvesting schedule.")
-
-            if humidity > 75 and not any('High humidity' in adv for adv in advice_list):
-                advice_list.append("- High humidity: Be vigilant for fungal diseases.")
-            if temp < 18 and not ('rain' in description or 'drizzle' in description or 'thunderstorm' in description) and not any('Cool weather' in adv for adv in advice_list):
-                advice_list.append("- Cool weather: Protect sensitive crops from potential cold damage.")
-
-            if not advice_list:
-                advice_list.append("- Practice good farming based on current conditions and your specific crop needs.")
-            return advice_intro + '\n'.join(advice_list)
-        
-    def _show_farming_tips(self, session_id, text):
-        lang = self.session_data[session_id]['language']
-        if text == "0":
-            self.session_data[session_id]['current_menu'] = 'main'
-            return self._show_main_menu(lang)
+    def reject(self, session_id, text, limit):
+        """END reply for a hop refused by admission control; no store or upstream work.
 
-        location = "Gulu"
-        weather_data = self.weather_service.get_weather(location)
-        back_option = "0. Wuok" if lang == 'luo' else "0. Main Menu"
+        The language is replayed from the input history, so a refused hop never
+        touches the session store; a stored session simply expires with its TTL.
+        """
+        language = replay((text or '').strip().rpartition('*')[0]).language
+        logger.debug("USSD hop for session %s refused (%s limit)", session_id, limit)
+        USSD_HOPS.inc(1, 'rate_limited')
+        return self.menu.render('rate_limited', language)
 
-        if 'error' in weather_data:
-            error_msg = "CON Tye bal ka yudo wach piny.\n" if lang == 'luo' else "CON Error getting weather data.\n"
-            return error_msg + back_option
-
-        farming_advice = self._get_farming_advice(weather_data, lang)
-        return "CON " + farming_advice + "\n" + back_option
-
-    def _show_weather(self, session_id, text):
-        lang = self.session_data[session_id]['language']
-        if text == "0":
-            self.session_data[session_id]['current_menu'] = 'main'
-            return self._show_main_menu(lang)
-
-        location = "Gulu"
-        weather_data = self.weather_service.get_weather(location)
-        back_option = "0. Wuok" if lang == 'luo' else "0. Main Menu"
-
-        if 'error' in weather_data:
-            error_msg = "CON Tye bal e neno piny.\n" if lang == 'luo' else "CON Error getting weather data.\n"
-            return error_msg + back_option
-
-        farming_advice = self._get_farming_advice(weather_data, lang)
-        
-        if lang == 'luo':
-            response_text = f"Piny e Gulu Kawuono:\n"
-            response_text += f"Liet: {weather_data.get('temperature', 'N/A')}°C\n"
-            response_text += f"Kit Piny: {weather_data.get('description', 'N/A')}\n"
-            response_text += f"Um: {weather_data.get('humidity', 'N/A')}%\n"
-            if 'wind_speed' in weather_data:
-                response_text += f"Yamo: {weather_data['wind_speed']} m/s\n"
-            response_text += f"\n{farming_advice}"
-        else:
-            response_text = f"Weather in {location} Today:\n"
-            response_text += f"Temperature: {weather_data.get('temperature', 'N/A')}°C\n"
-            response_text += f"Conditions: {weather_data.get('description', 'N/A')}\n"
-            response_text += f"Humidity: {weather_data.get('humidity', 'N/A')}%\n"
-            if 'wind_speed' in weather_data:
-                response_text += f"Wind: {weather_data['wind_speed']} m/s\n"
-            response_text += f"\n{farming_advice}"
-        
-        return "CON " + response_text + "\n" + back_option
-
-    def _show_forecast(self, session_id, text):
-        lang = self.session_data[session_id]['language']
-        if text == "0":
-            self.session_data[session_id]['current_menu'] = 'main'
-            return self._show_main_menu(lang)
-
-        location = "Gulu"
-        forecast_data = self.weather_service.get_forecast(location)
-        back_option = "0. Wuok" if lang == 'luo' else "0. Main Menu"
-
-        if 'error' in forecast_data or not forecast_data.get('forecast'):
-            error_msg = "CON Tye bal e yudo wach piny ma odiechieng.\n" if lang == 'luo' else "CON Error getting forecast data.\n"
-            return error_msg + back_option
-
-        response_text = f"Piny Ndege Adek ({location}):\n" if lang == 'luo' else f"3-Day Forecast ({location}):\n"
-        
-        processed_dates = set()
-        days_shown = 0
-
-        for forecast_item in forecast_data['forecast']:
-            if days_shown >= 3: break
-            
-            dt_obj = datetime.strptime(forecast_item['dt_txt'], '%Y-%m-%d %H:%M:%S')
-            current_date = dt_obj.date()
-
-            if current_date in processed_dates:
-                continue # Already processed this date
-            
-            # Filter forecasts for this specific day
-            day_forecasts = [f for f in forecast_data['forecast'] if datetime.strptime(f['dt_txt'], '%Y-%m-%d %H:%M:%S').date() == current_date]
-            if not day_forecasts: continue
-
-            min_temp = min(f['main']['temp_min'] for f in day_forecasts)
-            max_temp = max(f['main']['temp_max'] for f in day_forecasts)
-            
-            conditions = Counter(f['weather'][0]['description'] for f in day_forecasts)
-            most_common_condition = conditions.most_common(1)[0][0].capitalize()
-            
-            day_name_en = dt_obj.strftime('%a, %b %d') # English day name
-            day_name_luo_map = {
-                'Mon': 'Wuok Tich',
-                'Tue': 'Tich Ariyo',
-                'Wed': 'Tich Adek',
-                'Thu': 'Tich Angwen',
-                'Fri': 'Tich Abich',
-                'Sat': 'Ngeso',
-                'Sun': 'Jumapil'
-            }
-            day_abbrev_en = dt_obj.strftime('%a')
-            day_name_luo_prefix = day_name_luo_map.get(day_abbrev_en, day_abbrev_en)
-            day_name_luo = f"{day_name_luo_prefix}, {dt_obj.strftime('%b %d')}" # Luo day name format
-
-            formatted_date = day_name_luo if lang == 'luo' else day_name_en
-            temp_label = "Liet" if lang == 'luo' else "Temp"
-
-            response_text += f"{formatted_date}: {temp_label}: {min_temp:.0f}°C-{max_temp:.0f}°C, {most_common_condition}\n"
-            processed_dates.add(current_date)
-            days_shown += 1
-            
-        if days_shown == 0:
-            response_text += "Dongruok mar piny onge.\n" if lang == 'luo' else "No forecast data available.\n"
+    def _advance_stateless(self, phone_number, text):
+        """Rebuild the menu state from the input history, then apply the latest choice"""
+        full_input_string = text.strip() if text else ""
+        if not full_input_string:
+            USSD_HOPS.inc(1, 'language_menu')
+            return Hop(self.menu.render('language_menu', DEFAULT_LANGUAGE), None, None, None)
+
+        history, _, current_choice = full_input_string.rpartition('*')
+        with STAGE_SECONDS.time('session_lookup'):
+            state = replay(history)
+        if state.menu == ENDED:
+            state = INITIAL_STATE
+        state, screen = step(state, current_choice)
+        if self.subscribers is not None and state.language_selected:
+            self.subscribers.record(phone_number, state.language, state.location)
+        return Hop(None, screen, state, None)
+
+    def _render(self, screen, state, deadline=None):
+        """Fetch whatever data the screen needs and render it"""
+        USSD_HOPS.inc(1, screen)
+        try:
+            needs = self.menu.needs(screen)
+            data = self._current_data(needs, state.location, deadline) if needs else None
+            return self._render_data(screen, state, needs, data, deadline)
+        except Exception as e:
+            logger.exception("Error in USSD handler: %s", e)
+            return self.menu.render('technical_error', state.language)
 
-        return "CON " + response_text + "\n" + back_option
+    async def _render_async(self, screen, state, weather_service, deadline=None):
+        """_render with the data awaited from an AsyncWeatherService"""
+        USSD_HOPS.inc(1, screen)
+        try:
+            needs = self.menu.needs(screen)
+            if needs is None:
+                return self._render_data(screen, state, needs, None, deadline)
+            data = await self._current_data_async(needs, state.location, weather_service, deadline)
+            # Trends and last known data come from the history and geocode cache
+            return await asyncio.get_running_loop().run_in_executor(
+                None, self._render_data, screen, state, needs, data, deadline
+            )
+        except Exception as e:
+            logger.exception("Error in USSD handler: %s", e)
+            return self.menu.render('technical_error', state.language)
+
+    def _render_data(self, screen, state, needs, data, deadline=None):
+        if needs is None:
+            with STAGE_SECONDS.time('render'):
+                return self.menu.render(screen, state.language)
+        if 'error' in data:
+            out_of_time = deadline is not None and deadline.expired(USSD_DEADLINE_RESERVE)
+            degraded = self._render_degraded(screen, state, needs, out_of_time)
+            if degraded is not None:
+                return degraded
+        elif needs == 'weather':
+            data = self._with_trends(data, state.location)
+        with STAGE_SECONDS.time('render'):
+            return self.menu.render(screen, state.language, state.location, data)
+
+    def _render_degraded(self, screen, state, needs, out_of_time=True):
+        """Upstream failed or out of time: show the last known data marked with its time.
+
+        Without any, ask to try again when out of time; otherwise return None so
+        the screen's usual error is shown.
+        """
+        data = self._last_known_data(needs, state.location)
+        if not data:
+            if not out_of_time:
+                return None
+            self.degraded_responses += 1
+            return self.menu.render('try_again', state.language)
+        self.degraded_responses += 1
+        if needs == 'weather':
+            data = self._with_trends(data, state.location)
+        as_of = datetime.fromisoformat(data['timestamp']).strftime('%H:%M')
+        return self.menu.render(screen, state.language, state.location, data, as_of=as_of)
 
     def _end_session(self, session_id):
-        lang = self.session_data.get(session_id, {}).get('language', 'en') # Safely get language
-        if session_id in self.session_data:
-            del self.session_data[session_id]
-            print(f"[DEBUG] Session {session_id} ended and removed.")
-        
-        if lang == 'luo':
-            return "END Aparo pi tiyo kodwa. Med ameda maber!"
-        else:
-            return "END Thank you for using Farmer Weather Service!"
\ No newline at end of file
+        if self.sessions is not None:
+            self.sessions.delete(session_id)
+            logger.debug("Session %s ended and removed.", session_id)
@@ -0,0 +1,103 @@
+"""USSD menu graph: states, transitions and deterministic replay.
+
+Africa's Talking sends the whole '*'-separated input history on every hop,
+so the menu position can either be stored per session or rebuilt by
+replaying that history through step().
+"""
+
+import threading
+from collections import OrderedDict, namedtuple
+
+REPLAY_CACHE_SIZE = 4096
+
+UssdState = namedtuple('UssdState', ['menu', 'language', 'language_selected', 'location'])
+
+# menu: state to move to; screen: what to render; language: set when the choice picks one
+Transition = namedtuple('Transition', ['menu', 'screen', 'language'])
+
+INITIAL_STATE = UssdState(menu='language', language='en', language_selected=False, location='Gulu')
+ENDED = 'ended'
+GLOBAL_MAIN_MENU_CHOICES = ("00", "*0")
+
+TRANSITIONS = {
+    ('language', '1'): Transition('main', 'main_menu', 'en'),
+    ('language', '2'): Transition('main', 'main_menu', 'luo'),
+    ('language', '0'): Transition(ENDED, 'goodbye', None),
+    ('main', '1'): Transition('weather', 'weather', None),
+    ('main', '2'): Transition('forecast', 'forecast', None),
+    ('main', '3'): Transition('tips', 'tips', None),
+    ('main', '0'): Transition(ENDED, 'goodbye', None),
+    ('weather', '0'): Transition('main', 'main_menu', None),
+    ('forecast', '0'): Transition('main', 'main_menu', None),
+    ('tips', '0'): Transition('main', 'main_menu', None),
+}
+
+# Any other input: menus show an error, content screens are simply shown again
+FALLBACKS = {
+    'language': Transition('language', 'language_invalid', None),
+    'main': Transition('main', 'main_invalid', None),
+    'weather': Transition('weather', 'weather', None),
+    'forecast': Transition('forecast', 'forecast', None),
+    'tips': Transition('tips', 'tips', None),
+}
+UNKNOWN_MENU = Transition('language', 'language_invalid', None)
+
+
+def step(state, choice):
+    """Apply one menu choice and return (new_state, screen_name)"""
+    if state.language_selected and choice in GLOBAL_MAIN_MENU_CHOICES:
+        return state._replace(menu='main'), 'main_menu'
+
+    # Nothing but the language menu is reachable until a language is chosen
+    if not state.language_selected and state.menu != 'language':
+        state = state._replace(menu='language')
+        if not choice:
+            return state, 'language_menu'
+
+    transition = TRANSITIONS.get((state.menu, choice)) or FALLBACKS.get(state.menu, UNKNOWN_MENU)
+    if transition.language:
+        state = state._replace(menu=transition.menu, language=transition.language, language_selected=True)
+    elif transition.menu != state.menu:
+        state = state._replace(menu=transition.menu)
+    return state, transition.screen
+
+
+def next_state(state, choice):
+    """Return the state after one menu choice"""
+    return step(state, choice)[0]
+
+
+_replay_cache = OrderedDict()  # history -> state, least recently used first
+_replay_lock = threading.Lock()
+
+
+def replay(history):
+    """Return the state after replaying a '*'-separated input history.
+
+    Walks back to the longest already replayed prefix, then steps forward
+    from it, so a hop only costs one transition on top of the previous hop's
+    (cached) state, and a very long history never recurses.
+    """
+    state = None
+    choices = []
+    prefix = history
+    with _replay_lock:
+        while prefix:
+            state = _replay_cache.get(prefix)
+            if state is not None:
+                _replay_cache.move_to_end(prefix)
+                break
+            prefix, _, choice = prefix.rpartition('*')
+            choices.append(choice)
+    if state is None:
+        state = INITIAL_STATE
+    if not choices:
+        return state
+
+    for choice in reversed(choices):
+        state = next_state(state, choice)
+    with _replay_lock:
+        _replay_cache[history] = state
+        if len(_replay_cache) > REPLAY_CACHE_SIZE:
+            _replay_cache.popitem(last=False)
+    return state
@@ -1,115 +1,379 @@
-import requests
+import logging
 import os
-from datetime import datetime
-from geopy.geocoders import Nominatim
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime, timezone
+from .cache import TTLCache
+from .geocoding import Geocoder
+from .singleflight import SingleFlight
+from .upstream import CircuitOpenError, UpstreamClient
+from .deadline import DeadlineExceeded
+from .gazetteer import normalize_place_name
+from .instrumentation import STAGE_SECONDS
+from .history import HISTORY_FALLBACK_MAX_AGE, create_history
+
+logger = logging.getLogger(__name__)
 
 OPENWEATHERMAP_API_KEY = os.getenv('OPENWEATHERMAP_API_KEY')
+OPENWEATHERMAP_BASE_URL = os.getenv('OPENWEATHERMAP_BASE_URL', 'https://api.openweathermap.org/data/2.5')
+WEATHER_CACHE_TTL = int(os.getenv('WEATHER_CACHE_TTL', '600'))  # seconds
+WEATHER_CACHE_MAX_ENTRIES = int(os.getenv('WEATHER_CACHE_MAX_ENTRIES', '512'))
+WEATHER_UNITS = 'metric'
+WEATHER_BATCH_WORKERS = int(os.getenv('WEATHER_BATCH_WORKERS', '32'))  # matches UPSTREAM_POOL_MAXSIZE
+WEATHER_BATCH_MAX_LOCATIONS = int(os.getenv('WEATHER_BATCH_MAX_LOCATIONS', '100'))
+
+
+def summarize_forecast(forecast):
+    """Collapse OpenWeatherMap's 3-hourly forecast list into per-day rows in one pass.
+
+    Days are local to the forecast city (using its UTC offset). Each row has
+    the date, min/max temperature, the most common condition, the highest
+    chance of rain and the total rain in mm.
+    """
+    offset = forecast.get('city', {}).get('timezone', 0)
+    days = {}
+    for item in forecast.get('list', []):
+        day_key = datetime.fromtimestamp(item['dt'] + offset, timezone.utc).date()
+        day = days.get(day_key)
+        if day is None:
+            day = days[day_key] = {
+                'min_temp': item['main']['temp_min'],
+                'max_temp': item['main']['temp_max'],
+                'conditions': Counter(),
+                'rain_probability': 0.0,
+                'rain_mm': 0.0
+            }
+        else:
+            day['min_temp'] = min(day['min_temp'], item['main']['temp_min'])
+            day['max_temp'] = max(day['max_temp'], item['main']['temp_max'])
+        day['conditions'][item['weather'][0]['description']] += 1
+        day['rain_probability'] = max(day['rain_probability'], item.get('pop', 0.0))
+        day['rain_mm'] += item.get('rain', {}).get('3h', 0.0)
+
+    return [
+        {
+            'date': day_key.isoformat(),
+            'min_temp': day['min_temp'],
+            'max_temp': day['max_temp'],
+            'condition': day['conditions'].most_common(1)[0][0],
+            'rain_probability': day['rain_probability'],
+            'rain_mm': round(day['rain_mm'], 1)
+        }
+        for day_key, day in days.items()
+    ]
+
+
+# Derived data computed once per upstream fetch and cached with the raw response
+_POSTPROCESSORS = {
+    'forecast': lambda forecast: dict(forecast, daily=summarize_forecast(forecast)),
+}
+
+
+def _by_spelling(locations, unique, results):
+    """Batch results keyed by every requested spelling (results is keyed by the spellings in unique)"""
+    return {
+        location: results[unique[normalize_place_name(location)]]
+        for location in locations if location and location.strip()
+    }
+
 
 class WeatherService:
-    def __init__(self):
-        self.base_url = "https://api.openweathermap.org/data/2.5"
-        self.geolocator = Nominatim(user_agent="farmer_weather_app")
-        self.weather_cache = {}
+    def __init__(self, history=None):
+        self.base_url = OPENWEATHERMAP_BASE_URL
+        self.geocoder = Geocoder()
+        self.weather_cache = TTLCache(ttl=WEATHER_CACHE_TTL, max_entries=WEATHER_CACHE_MAX_ENTRIES)
+        self.inflight = SingleFlight()
+        self.upstream = UpstreamClient()
+        # Every current-weather fetch is appended here (None when HISTORY_PATH is empty)
+        self.history = history if history is not None else create_history()
+        if self.history is not None:
+            self.history.start_compactor()
+        self._batch_pool = None
+        self._batch_pool_lock = threading.Lock()
         
-    def _get_coordinates(self, location):
+    def _get_coordinates(self, location, deadline=None, allow_network=True):
         """Get latitude and longitude from location name"""
-        try:
-            location_data = self.geolocator.geocode(location)
-            if location_data:
-                return location_data.latitude, location_data.longitude
-            return None, None
-        except Exception as e:
-            print(f"Error getting coordinates: {e}")
-            return None, None
+        with STAGE_SECONDS.time('geocode'):
+            return self.geocoder.lookup(location, deadline, allow_network)
 
-    def _get_weather_data(self, endpoint, params):
+    def _get_weather_data(self, endpoint, params, deadline=None):
         """Make request to OpenWeatherMap API with enhanced error handling"""
+        import requests  # deferred with the HTTP session; free after the first call
+
         try:
             if not OPENWEATHERMAP_API_KEY:
-                print("ERROR: OpenWeatherMap API key is not configured")
+                logger.error("OpenWeatherMap API key is not configured")
                 return None
                 
-            # Add timeout to prevent hanging (10 seconds for connect, 30 seconds for read)
-            response = requests.get(
-                endpoint, 
-                params=params,
-                timeout=(10, 30)  # 10s connect timeout, 30s read timeout
-            )
-            response.raise_for_status()
-            return response.json()
+            # Pooled keep-alive session with retries; fails fast while the breaker is open
+            return self.upstream.get_json(endpoint, params=params, deadline=deadline)
             
+        except DeadlineExceeded:
+            logger.warning("No time left in the request budget for the weather API")
+            return None
+        except CircuitOpenError:
+            logger.warning("Weather API circuit breaker is open, skipping upstream call")
+            return None
         except requests.exceptions.Timeout:
-            print("ERROR: Request to weather API timed out")
+            logger.warning("Request to weather API timed out")
             return None
         except requests.exceptions.HTTPError as http_err:
-            print(f"HTTP error occurred: {http_err}")
+            logger.warning("HTTP error occurred: %s", http_err)
             return None
         except requests.exceptions.RequestException as req_err:
-            print(f"Request error occurred: {req_err}")
+            logger.warning("Request error occurred: %s", req_err)
             return None
         except Exception as e:
-            print(f"Unexpected error in _get_weather_data: {e}")
+            logger.exception("Unexpected error in _get_weather_data: %s", e)
             return None
 
-    def get_weather(self, location):
-        """Get current weather for a location"""
-        if not location:
-            return {"error": "No location provided"}
-            
-        print(f"Getting weather for location: {location}")
-        lat, lon = self._get_coordinates(location)
-        if not lat or not lon:
-            return {"error": f"Could not find coordinates for location: {location}"}
-            
+    def _cache_key(self, endpoint, lat, lon, units=WEATHER_UNITS):
+        """Cache key for an upstream call; ~1km rounding so nearby lookups share an entry"""
+        return (endpoint, round(lat, 2), round(lon, 2), units)
+
+    def _flight_key(self, key, deadline=None):
+        """Single-flight key: calls with and without a deadline are coalesced separately"""
+        return key + ('deadline',) if deadline is not None else key
+
+    def _get_cached_weather_data(self, endpoint, lat, lon, refresh=False, deadline=None):
+        """Fetch an OpenWeatherMap endpoint through the weather cache.
+
+        With refresh=True the upstream is always called and the cache updated;
+        the last cached entry is returned if that call fails. A deadline bounds
+        the caller's upstream call (or wait on someone else's), but not the
+        background refresh of stale entries.
+        Returns the cache entry (raw JSON in .value) or None on failure.
+        """
         params = {
             'lat': lat,
             'lon': lon,
             'appid': OPENWEATHERMAP_API_KEY,
-            'units': 'metric'
+            'units': WEATHER_UNITS
         }
-        
-        current_weather = self._get_weather_data(
-            f"{self.base_url}/weather",
-            params
-        )
-        
-        if not current_weather:
-            return {"error": "Failed to get weather data"}
-            
+        key = self._cache_key(endpoint, lat, lon)
+        postprocess = _POSTPROCESSORS.get(endpoint)
+
+        def fetch(deadline=None):
+            with STAGE_SECONDS.time('upstream_fetch'):
+                data = self._get_weather_data(f"{self.base_url}/{endpoint}", params, deadline)
+            if data is not None and endpoint == 'weather' and self.history is not None:
+                self._record_observation(lat, lon, data)
+            if data is not None and postprocess is not None:
+                data = postprocess(data)
+            return data
+
+        def loader():
+            # Concurrent misses/refreshes for the same key share one upstream call.
+            # A deadline-bound call can give up early, so callers without a
+            # deadline never wait on one (and inherit its failure).
+            try:
+                return self.inflight.do(
+                    self._flight_key(key, deadline),
+                    lambda: fetch(deadline),
+                    timeout=deadline.remaining() if deadline is not None else None
+                )
+            except TimeoutError:
+                logger.warning("Timed out waiting for in-flight %s request", endpoint)
+                return None
+
+        if refresh:
+            value = loader()
+            if value is None:
+                return self.weather_cache.peek(key)
+            return self.weather_cache.put(key, value)
+        return self.weather_cache.fetch(key, loader, lambda: self.inflight.do(key, fetch))
+
+    def _history_key(self, lat, lon):
+        """History key for a location; same rounding as the cache key"""
+        return f"{round(lat, 2)},{round(lon, 2)}"
+
+    def _record_observation(self, lat, lon, current_weather):
+        try:
+            with STAGE_SECONDS.time('history_append'):
+                self.history.append(
+                    self._history_key(lat, lon),
+                    current_weather.get('dt') or time.time(),
+                    current_weather['main']['temp'],
+                    current_weather['main']['humidity'],
+                    current_weather['weather'][0].get('id', 800),
+                    current_weather['weather'][0]['description'],
+                    current_weather.get('rain', {}).get('1h', 0.0),
+                    current_weather.get('timezone', 0)
+                )
+        except Exception as e:
+            # History is a side channel; never fail the weather request over it
+            logger.exception("Error recording weather history: %s", e)
+
+    def upstream_status(self):
+        """Return circuit breaker state and retry counters for the weather API"""
+        return self.upstream.stats()
+
+    def cache_stats(self):
+        """Return weather cache hit/miss/stale counters and request coalescing counts"""
+        stats = self.weather_cache.stats()
+        stats['coalesced'] = self.inflight.stats()
+        return stats
+
+    def _format_weather(self, entry):
+        current_weather = entry.value
         return {
             "temperature": current_weather['main']['temp'],
             "description": current_weather['weather'][0]['description'],
             "humidity": current_weather['main']['humidity'],
             "wind_speed": current_weather['wind']['speed'],
-            "timestamp": datetime.now().isoformat()
+            "timestamp": datetime.fromtimestamp(entry.fetched_at).isoformat()
+        }
+
+    def _format_forecast(self, entry):
+        forecast = entry.value
+        return {
+            "city": forecast['city']['name'],
+            "forecast": forecast['list'],
+            "daily": forecast['daily'],
+            "utc_offset": forecast['city'].get('timezone', 0),
+            "timestamp": datetime.fromtimestamp(entry.fetched_at).isoformat()
         }
 
-    def get_forecast(self, location):
+    def get_weather(self, location, refresh=False, deadline=None):
+        """Get current weather for a location"""
+        if not location:
+            return {"error": "No location provided"}
+            
+        logger.debug("Getting weather for location: %s", location)
+        lat, lon = self._get_coordinates(location, deadline)
+        if not lat or not lon:
+            return {"error": f"Could not find coordinates for location: {location}"}
+            
+        entry = self._get_cached_weather_data('weather', lat, lon, refresh, deadline)
+        if not entry:
+            return {"error": "Failed to get weather data"}
+        return self._format_weather(entry)
+
+    def get_forecast(self, location, refresh=False, deadline=None):
         """Get 5-day weather forecast"""
         if not location:
             return {"error": "No location provided"}
             
-        print(f"Getting forecast for location: {location}")
-        lat, lon = self._get_coordinates(location)
+        logger.debug("Getting forecast for location: %s", location)
+        lat, lon = self._get_coordinates(location, deadline)
         if not lat or not lon:
             return {"error": f"Could not find coordinates for location: {location}"}
             
-        params = {
-            'lat': lat,
-            'lon': lon,
-            'appid': OPENWEATHERMAP_API_KEY,
-            'units': 'metric'
-        }
-        
-        forecast = self._get_weather_data(
-            f"{self.base_url}/forecast",
-            params
-        )
-        
-        if not forecast:
+        entry = self._get_cached_weather_data('forecast', lat, lon, refresh, deadline)
+        if not entry:
             return {"error": "Failed to get forecast data"}
-            
+        return self._format_forecast(entry)
+
+    def _get_batch_pool(self):
+        with self._batch_pool_lock:
+            if self._batch_pool is None:
+                self._batch_pool = ThreadPoolExecutor(
+                    max_workers=WEATHER_BATCH_WORKERS, thread_name_prefix="weather-batch"
+                )
+            return self._batch_pool
+
+    def get_weather_many(self, locations, deadline=None):
+        """Get current weather for several locations at once.
+
+        Locations are deduplicated by normalized name, so "Gulu" and "gulu"
+        cost one lookup. Those already cached are answered immediately; the
+        rest are fetched concurrently on a bounded pool, so a batch takes about
+        as long as its slowest miss. Returns {location: weather or {"error": ...}}
+        with an entry for every spelling requested, in request order.
+        """
+        unique = {}
+        for location in locations:
+            if location and location.strip():
+                unique.setdefault(normalize_place_name(location), location)
+
+        results = {}
+        pending = {}
+        for location in unique.values():
+            if self._peek('weather', location) is not None:
+                # Fresh or stale: served from the cache without blocking
+                results[location] = self.get_weather(location, deadline=deadline)
+            else:
+                pending[location] = self._get_batch_pool().submit(self.get_weather, location, deadline=deadline)
+
+        for location, future in pending.items():
+            try:
+                results[location] = future.result(timeout=deadline.remaining() if deadline is not None else None)
+            except FutureTimeoutError:
+                results[location] = {"error": "Timed out getting weather data"}
+            except Exception as e:
+                logger.exception("Error getting weather for %s in batch: %s", location, e)
+                results[location] = {"error": "Failed to get weather data"}
+        return _by_spelling(locations, unique, results)
+
+    def _peek(self, endpoint, location):
+        lat, lon = self._get_coordinates(location, allow_network=False)
+        if not lat or not lon:
+            return None
+        return self.weather_cache.peek(self._cache_key(endpoint, lat, lon))
+
+    def peek_weather(self, location):
+        """Last cached current weather (fresh or stale) without any network I/O, or None"""
+        entry = self._peek('weather', location)
+        return self._format_weather(entry) if entry else None
+
+    def _history_lookup(self, location, allow_network=False):
+        if self.history is None:
+            return None
+        lat, lon = self._get_coordinates(location, allow_network=allow_network)
+        if not lat or not lon:
+            return None
+        return self._history_key(lat, lon)
+
+    def last_observed_weather(self, location, max_age=HISTORY_FALLBACK_MAX_AGE):
+        """Latest observation from the history (offline fallback), or None if none is recent enough"""
+        key = self._history_lookup(location)
+        observation = self.history.latest(key) if key else None
+        if observation is None or time.time() - observation.observed_at > max_age:
+            return None
         return {
-            "city": forecast['city']['name'],
-            "forecast": forecast['list'][:5]  # Get first 5 days
+            "temperature": observation.temperature,
+            "description": observation.description,
+            "humidity": observation.humidity,
+            "timestamp": datetime.fromtimestamp(observation.observed_at).isoformat()
+        }
+
+    def weather_trends(self, location):
+        """Rolling aggregates from the history (dry_days, rain_week_mm) without any network I/O, or None"""
+        key = self._history_lookup(location)
+        return self.history.trends(key) if key else None
+
+    def get_history(self, location, days=7):
+        """Per-day summaries and a window summary of the observations recorded for a location"""
+        if not location:
+            return {"error": "No location provided"}
+        key = self._history_lookup(location, allow_network=True)
+        if key is None:
+            return {"error": f"No weather history for location: {location}"}
+        now = time.time()
+        summary = self.history.aggregate(key, now - days * 86400, now)
+        if summary is None:
+            return {"error": f"No weather history for location: {location}"}
+        return {
+            "location": location,
+            "summary": summary,
+            "days": self.history.daily(key, days, now),
+            "trends": self.history.trends(key, now)
+        }
+
+    def peek_forecast(self, location):
+        """Last cached forecast (fresh or stale) without any network I/O, or None"""
+        entry = self._peek('forecast', location)
+        return self._format_forecast(entry) if entry else None
+
+    def get_daily_forecast(self, location, days=3, refresh=False, deadline=None):
+        """Get per-day forecast summaries (min/max, dominant condition, rain chance)"""
+        forecast = self.get_forecast(location, refresh, deadline)
+        if 'error' in forecast:
+            return forecast
+        return {
+            "city": forecast['city'],
+            "days": forecast['daily'][:days],
+            "timestamp": forecast['timestamp']
         }